@@ -2,6 +2,7 @@
 
 
 import asyncio
+import copy
 import datetime
 import hashlib
 import json
@@ -96,6 +97,10 @@ class DetectionPoint:
         data = DetectionPointModel.parse_raw(value)
         return DetectionPoint.from_dict(data.dict(), detection_point)
 
+    def copy(self) -> "DetectionPoint":
+        """Returns a copy of this DetectionPoint."""
+        return DetectionPoint(self.description, copy.deepcopy(self.details))
+
     def __str__(self):
         return "DetectionPoint({})".format(self.description)
 
@@ -346,6 +351,10 @@ class AnalysisModuleType:
         assert isinstance(value, str)
         return AnalysisModuleType.from_dict(AnalysisModuleTypeModel.parse_raw(value).dict())
 
+    def copy(self) -> "AnalysisModuleType":
+        """Returns a copy of this AnalysisModuleType."""
+        return AnalysisModuleType(**asdict(self))
+
     # ========================================================================
 
     def version_matches(self, amt) -> bool:
@@ -357,7 +366,12 @@ class AnalysisModuleType:
         """Returns True if the given amt is the same version as this amt."""
         return self.name == amt.name and self.version == amt.version and self.extended_version == amt.extended_version
 
-    async def accepts(self, observable: Observable, system: "ace.system.ACESystem") -> bool:
+    async def accepts(
+        self, observable: Observable, system: "ace.system.ACESystem", condition_buffers: Optional[dict] = None
+    ) -> bool:
+        """Returns True if this analysis module type accepts the given observable.
+        condition_buffers is an optional dict used to share the rendered regex condition buffers
+        between calls (see condition_satisfied.)"""
         assert isinstance(observable, Observable)
         from ace.system import ACESystem
 
@@ -408,7 +422,7 @@ class AnalysisModuleType:
 
         # AND
         for condition in self.conditions:
-            if not self.condition_satisfied(condition, observable):
+            if not self.condition_satisfied(condition, observable, condition_buffers):
                 return False
 
         # has this observable been limited to specific analysis modules?
@@ -423,31 +437,64 @@ class AnalysisModuleType:
 
         return True
 
-    def condition_satisfied(self, condition: str, observable: "Observable") -> bool:
+    def condition_satisfied(
+        self, condition: str, observable: "Observable", condition_buffers: Optional[dict] = None
+    ) -> bool:
         """Returns True if the given conditino is satisfied by the observable, False otherwise.
-        TODO link to condition documentation."""
+        TODO link to condition documentation.
+
+        Supported condition types are
+        re: a regular expression matched against the entire (pretty-printed) root
+        re_value: a regular expression matched against the value of the observable
+        re_tag: a regular expression matched against each tag of the observable
+
+        Rendering the entire root is expensive. If condition_buffers is passed in then the rendered root is
+        stored there (key = (root uuid, root version)) and reused by the other calls that use the same dict.
+        The dict should only be shared while the root is not modified (for example during a single processing
+        pass over the observables of a root.)"""
 
         # condition format is type:value
         _type, _value = condition.split(":", 1)
 
-        # regular expression condition
-        if _type == "re":
-            # compile regex if we haven't already
-            if condition not in self.compiled_conditions:
-                try:
-                    self.compiled_conditions[condition] = re.compile(_value)
-                except Exception as e:
-                    self.compiled_conditions[condition] = False
-                    get_logger().error(f"regex condition {_value} from type {self.name} compliation failure: {e}")
-
-            # if we failed to compile then the condition fails
-            if not self.compiled_conditions[condition]:
-                return False
+        if _type not in ("re", "re_value", "re_tag"):
+            get_logger().error(f"unknown condition type {_type} from type {self.name}")
+            return False
+
+        # compile regex if we haven't already
+        if condition not in self.compiled_conditions:
+            try:
+                self.compiled_conditions[condition] = re.compile(_value)
+            except Exception as e:
+                self.compiled_conditions[condition] = False
+                get_logger().error(f"regex condition {_value} from type {self.name} compliation failure: {e}")
+
+        # if we failed to compile then the condition fails
+        if not self.compiled_conditions[condition]:
+            return False
+
+        if _type == "re_value":
+            return bool(self.compiled_conditions[condition].search(str(observable.value)))
+
+        if _type == "re_tag":
+            return any([self.compiled_conditions[condition].search(tag) for tag in observable.tags])
+
+        # regular expression condition against the entire root
+        # the buffer to scan with the regex is the pretty-printed dict of the root
+        if condition_buffers is None:
+            target_buffer = render_condition_buffer(observable.root)
+        else:
+            key = (observable.root.uuid, observable.root.version)
+            target_buffer = condition_buffers.get(key)
+            if target_buffer is None:
+                target_buffer = condition_buffers[key] = render_condition_buffer(observable.root)
+
+        return self.compiled_conditions[condition].search(target_buffer, re.S)
+
 
-            # to buffer to scan with the regex is the pretty-printed dict of the root
-            pp = pprint.PrettyPrinter(indent=4, sort_dicts=True)
-            target_buffer = pp.pformat(observable.root.to_dict())
-            return self.compiled_conditions[condition].search(target_buffer, re.S)
+def render_condition_buffer(root: "RootAnalysis") -> str:
+    """Returns the buffer the re: conditions of analysis module types are matched against."""
+    pp = pprint.PrettyPrinter(indent=4, sort_dicts=True)
+    return pp.pformat(root.to_dict())
 
 
 class Analysis(TaggableObject, DetectableObject, MergableObject):
@@ -644,6 +691,27 @@ class Analysis(TaggableObject, DetectableObject, MergableObject):
         assert isinstance(value, str)
         return Analysis.from_dict(AnalysisModel.parse_raw(value).dict(), root, analysis)
 
+    def _copy_to(self, target: "Analysis", root: "RootAnalysis") -> "Analysis":
+        """Copies the properties of this Analysis into the target Analysis which belongs to the given root.
+        The result is the same as loading the target from the to_dict() output of this Analysis."""
+        target._tags = self._tags[:]
+        target._detections = [_.copy() for _ in self._detections]
+        target.type = self.type
+        target.observable_ids = self.observable_ids[:]
+        target.observable_id = self.observable_id
+        target._summary = self._summary
+        target.uuid = self.uuid
+
+        if self._details is not None:
+            target._details = copy.deepcopy(self._details)
+            target._details_loaded = False
+            target._details_modified = True
+
+        target.error_message = self.error_message
+        target.stack_trace = self.stack_trace
+        target.root = root
+        return target
+
     # =========================================================================
 
     @property
@@ -974,6 +1042,29 @@ class Observable(TaggableObject, DetectableObject, MergableObject):
 
         return Observable.from_dict(ObservableModel.parse_raw(value).dict(), root, observable)
 
+    def _copy(self, root: "RootAnalysis") -> "Observable":
+        """Returns a copy of this Observable that belongs to the given root.
+        The result is the same as loading the Observable from the to_dict() output of this Observable."""
+        result = create_observable(self._type, self._value, root=root)
+        result._tags = self._tags[:]
+        result._detections = [_.copy() for _ in self._detections]
+        result.uuid = self.uuid
+        result._time = self._time
+        result.context = self.context
+        result._analysis = {
+            name: analysis._copy_to(Analysis(root=root), root) for name, analysis in self._analysis.items()
+        }
+        result._directives = self._directives[:]
+        result._redirection = self._redirection
+        result._links = self._links[:]
+        result._limited_analysis = self._limited_analysis[:]
+        result._excluded_analysis = self._excluded_analysis[:]
+        result._requested_analysis = self._requested_analysis[:]
+        result._relationships = {name: uuids[:] for name, uuids in self._relationships.items()}
+        result._grouping_target = self._grouping_target
+        result._request_tracking = self._request_tracking.copy()
+        return result
+
     # ========================================================================
 
     @property
@@ -983,7 +1074,7 @@ class Observable(TaggableObject, DetectableObject, MergableObject):
     @type.setter
     def type(self, value: str):
         assert isinstance(value, str)
-        self._type = value
+        self._set_indexed_property("_type", value)
 
     @property
     def value(self) -> str:
@@ -992,7 +1083,7 @@ class Observable(TaggableObject, DetectableObject, MergableObject):
     @value.setter
     def value(self, value: str):
         assert isinstance(value, str)
-        self._value = value
+        self._set_indexed_property("_value", value)
 
     @property
     def time(self) -> Union[datetime.datetime, None]:
@@ -1001,20 +1092,32 @@ class Observable(TaggableObject, DetectableObject, MergableObject):
     @time.setter
     def time(self, value: Union[datetime.datetime, str, None]):
         if value is None:
-            self._time = None
+            self._set_indexed_property("_time", None)
         elif isinstance(value, datetime.datetime):
             # if we didn't specify a timezone then we use the timezone of the local system
             if value.tzinfo is None:
                 value = ace.LOCAL_TIMEZONE.localize(value)
-            self._time = value
+            self._set_indexed_property("_time", value)
         elif isinstance(value, str):
-            self._time = parse_datetime_string(value)
+            self._set_indexed_property("_time", parse_datetime_string(value))
         else:
             raise ValueError(
                 "time must be a datetime.datetime object or a string in the format "
                 "%Y-%m-%d %H:%M:%S %z but you passed {}".format(type(value).__name__)
             )
 
+    def _set_indexed_property(self, name: str, value: Any):
+        """Sets a property that is part of the key the RootAnalysis uses to index this observable."""
+        # NOTE the root is not set yet when this is called from the constructor
+        root = getattr(self, "root", None)
+        if root is None:
+            setattr(self, name, value)
+            return
+
+        root.unindex_observable(self)
+        setattr(self, name, value)
+        root.index_observable(self)
+
     @property
     def directives(self) -> list[str]:
         return self._directives
@@ -1663,6 +1766,13 @@ class RootAnalysis(Analysis, MergableObject):
         # all of the Observables discovered during analysis go into the observable_store
         self._observable_store = {}  # key = uuid, value = Observable object
 
+        # hash index of the observable_store (see index_observable)
+        self._observable_index = {}  # key = (type, value, time), value = Observable object
+
+        # set to True if any observable in the store overrides _compare_value
+        # in which case the index can't be used to determine equality
+        self._observable_index_inexact = False
+
         # set to True to cancel any outstanding analysis for this root
         self._analysis_cancelled = False
 
@@ -1754,7 +1864,7 @@ class RootAnalysis(Analysis, MergableObject):
         root._analysis_cancelled = data.analysis_cancelled
         root._analysis_cancelled_reason = data.analysis_cancelled_reason
         root._expires = data.expires
-        root._state = data.state
+        root.state = data.state or {}
         return root
 
     @staticmethod
@@ -1764,8 +1874,52 @@ class RootAnalysis(Analysis, MergableObject):
 
     def copy(self) -> "RootAnalysis":
         """Returns a copy of this RootAnalysis object."""
-        # similar to copy.deepcopy but uses the json serialization to do it
-        return RootAnalysis.from_dict(self.to_dict(), system=self.system)
+        # this copies the object graph directly which is equivalent to (but
+        # much faster than) RootAnalysis.from_dict(self.to_dict())
+        # NOTE analysis module types are treated as immutable and are shared between copies
+        return self._copy_with_observables(self.observable_store.values())
+
+    def copy_subset(self, observables: list[Observable]) -> "RootAnalysis":
+        """Returns a copy of this RootAnalysis that only contains the given observables.
+        Any references to observables outside of the subset are dropped from the copy."""
+        uuids = {_.uuid for _ in observables}
+        root = self._copy_with_observables([_ for _ in self.observable_store.values() if _.uuid in uuids])
+        root.observable_ids = [_ for _ in root.observable_ids if _ in uuids]
+        for observable in root.observable_store.values():
+            for analysis in observable.analysis.values():
+                analysis.observable_ids = [_ for _ in analysis.observable_ids if _ in uuids]
+
+            if observable._redirection not in uuids:
+                observable._redirection = None
+
+            observable._links = [_ for _ in observable._links if _ in uuids]
+            observable._relationships = {
+                name: [_ for _ in targets if _ in uuids] for name, targets in observable._relationships.items()
+            }
+
+        return root
+
+    def _copy_with_observables(self, observables) -> "RootAnalysis":
+        root = RootAnalysis(system=self.system)
+        root.observable_store = {observable.uuid: observable._copy(root) for observable in observables}
+        self._copy_to(root, root)
+
+        root._analysis_mode = self._analysis_mode
+        root._uuid = self._uuid
+        root._version = self._version
+        root._tool = self._tool
+        root._tool_instance = self._tool_instance
+        root._alert_type = self._alert_type
+        root._description = self._description
+        root._event_time = self._event_time
+        root._name = self._name
+        root._queue = self._queue
+        root._instructions = self._instructions
+        root._analysis_cancelled = self._analysis_cancelled
+        root._analysis_cancelled_reason = self._analysis_cancelled_reason
+        root._expires = self._expires
+        root.state = copy.deepcopy(self.state)
+        return root
 
     # ========================================================================
 
@@ -1891,14 +2045,15 @@ class RootAnalysis(Analysis, MergableObject):
         assert isinstance(value, bool)
         self._expires = value
 
+    def may_expire(self) -> bool:
+        """Returns True if this root is set to expire and does not have any detection points.
+        Such a root expires once there are no outstanding analysis requests for it (see is_expired)."""
+        return self.expires and not self.has_detection_points()
+
     async def is_expired(self):
         """Returns True if this root has expired."""
-        # is it set to expire
-        if not self.expires:
-            return False
-
-        # does it have any detection points?
-        if self.has_detection_points():
+        # is it set to expire (and not kept by detection points)
+        if not self.may_expire():
             return False
 
         # are there any outstanding analysis requests?
@@ -1926,6 +2081,44 @@ class RootAnalysis(Analysis, MergableObject):
     def observable_store(self, value):
         assert isinstance(value, dict)
         self._observable_store = value
+        self._observable_index = {}
+        self._observable_index_inexact = False
+        for observable in value.values():
+            self.index_observable(observable)
+
+    @staticmethod
+    def _observable_key(observable: Observable) -> tuple:
+        return (observable.type, observable.value, observable.time)
+
+    def index_observable(self, observable: Observable):
+        """Adds the given observable to the hash index. The observable must already be in the observable_store."""
+        if self._observable_store.get(observable.uuid) is not observable:
+            return
+
+        if type(observable)._compare_value is not Observable._compare_value:
+            self._observable_index_inexact = True
+
+        self._observable_index.setdefault(self._observable_key(observable), observable)
+
+    def unindex_observable(self, observable: Observable):
+        """Removes the given observable from the hash index."""
+        key = self._observable_key(observable)
+        if self._observable_index.get(key) is observable:
+            del self._observable_index[key]
+
+    def _find_indexed_observable(self, observable: Observable) -> Union[Observable, None]:
+        """Returns the observable in the observable_store that is equal to the given observable, or None."""
+        result = self._observable_index.get(self._observable_key(observable))
+        if result is not None:
+            return result
+
+        # fall back to a full scan when we can't rely on the index
+        if self._observable_index_inexact or type(observable)._compare_value is not Observable._compare_value:
+            for o in self.observable_store.values():
+                if o == observable:
+                    return o
+
+        return None
 
     @property
     def storage_dir(self):
@@ -1995,18 +2188,18 @@ class RootAnalysis(Analysis, MergableObject):
         Returns the new one if recorded or the existing one if not."""
         assert isinstance(observable, Observable)
 
-        # XXX gross this is probably pretty inefficient
-        for o in self.observable_store.values():
-            if o == observable:
-                get_logger().debug(
-                    "returning existing observable {} ({}) [{}] <{}> for {} ({}) [{}] <{}>".format(
-                        o, id(o), o.uuid, o.type, observable, id(observable), observable.uuid, observable.type
-                    )
+        o = self.observable_store.get(observable.uuid) or self._find_indexed_observable(observable)
+        if o is not None:
+            get_logger().debug(
+                "returning existing observable {} ({}) [{}] <{}> for {} ({}) [{}] <{}>".format(
+                    o, id(o), o.uuid, o.type, observable, id(observable), observable.uuid, observable.type
                 )
-                return o
+            )
+            return o
 
         observable.root = self
         self.observable_store[observable.uuid] = observable
+        self.index_observable(observable)
         get_logger().debug("recorded observable {} with id {}".format(observable, observable.uuid))
         return observable
 
@@ -2015,14 +2208,36 @@ class RootAnalysis(Analysis, MergableObject):
         if not await self.system.track_root_analysis(self):
             return False
 
-        for analysis in self.all_analysis:
-            if analysis is not self:
-                await analysis.save()
+        # save the details of all the analysis (including our own) that were modified in a single call
+        modified_analysis = [_ for _ in self.all_analysis if _ is not self and _._details_modified]
+        if self._details_modified:
+            modified_analysis.append(self)
+
+        if modified_analysis:
+            tracked = await self.system.track_analysis_details_bulk(
+                self, {_.uuid: _._details for _ in modified_analysis}
+            )
+            for analysis in modified_analysis:
+                if analysis.uuid in tracked:
+                    analysis._details_modified = False
 
-        # save our own details
-        await Analysis.save(self)
         return True
 
+    async def preload_details(self) -> int:
+        """Loads the details of all the analysis of this root (including the root itself) that
+        have not been loaded (or set) yet in a single call. Returns the number of details loaded."""
+        targets = [_ for _ in self.all_analysis if _._details is None and not _._details_modified]
+        if not targets:
+            return 0
+
+        details = await self.system.get_analysis_details_bulk([_.uuid for _ in targets])
+        for analysis in targets:
+            if analysis.uuid in details:
+                analysis._details = details[analysis.uuid]
+                analysis._details_modified = False
+
+        return len(details)
+
     async def update(self) -> bool:
         """Loads and merges any changes made to this root. Returns True if successful, False otherwise."""
         existing_root = await self.system.get_root_analysis(self)
@@ -2167,9 +2382,7 @@ class RootAnalysis(Analysis, MergableObject):
             return self.observable_store[observable.uuid]
         except KeyError:
             # otherwise we try to match based on the type, value and time
-            return self.find_observable(
-                lambda o: o.type == observable.type and o.value == observable.value and o.time == observable.time
-            )
+            return self._observable_index.get(self._observable_key(observable))
 
     @property
     def all_detection_points(self):
@@ -130,9 +130,15 @@ class AceAPI:
     async def get_analysis_details(self, uuid: str) -> Any:
         raise NotImplementedError()
 
+    async def get_analysis_details_bulk(self, uuids: list[str]) -> dict[str, Any]:
+        raise NotImplementedError()
+
     async def track_analysis_details(self, root: RootAnalysis, uuid: str, value: Any) -> bool:
         raise NotImplementedError()
 
+    async def track_analysis_details_bulk(self, root: RootAnalysis, details: dict[str, Any]) -> list[str]:
+        raise NotImplementedError()
+
     async def delete_analysis_details(self, uuid: str) -> bool:
         raise NotImplementedError()
 
@@ -192,12 +198,17 @@ class AceAPI:
     async def get_content_bytes(self, sha256: str) -> Union[bytes, None]:
         raise NotImplementedError()
 
-    async def iter_content(self, sha256: str, buffer_size: int) -> Union[AsyncGenerator[bytes, None], None]:
+    async def iter_content(
+        self, sha256: str, buffer_size: int, offset: int = 0, length: Optional[int] = None
+    ) -> Union[AsyncGenerator[bytes, None], None]:
         raise NotImplementedError()
 
     async def get_content_meta(self, sha256: str) -> Union[ContentMetadata, None]:
         raise NotImplementedError()
 
+    async def content_exists(self, sha256: str) -> bool:
+        raise NotImplementedError()
+
     async def delete_content(self, sha256: str) -> bool:
         raise NotImplementedError()
 
@@ -235,3 +246,14 @@ class AceAPI:
         extended_version: Optional[dict[str, str]] = [],
     ) -> Union[AnalysisRequest, None]:
         raise NotImplementedError()
+
+    async def get_next_analysis_requests(
+        self,
+        owner_uuid: str,
+        amt: Union[AnalysisModuleType, str],
+        count: int,
+        timeout: Optional[int] = 0,
+        version: Optional[str] = None,
+        extended_version: Optional[dict[str, str]] = [],
+    ) -> list[AnalysisRequest]:
+        raise NotImplementedError()
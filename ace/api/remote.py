@@ -1,7 +1,9 @@
 # vim: ts=4:sw=4:et:cc=120
 #
 
+import asyncio
 import contextlib
+import importlib.util
 import io
 import json
 import os.path
@@ -13,6 +15,7 @@ import ace.data_model
 
 from ace.data_model import (
     AlertListModel,
+    AnalysisDetailsQueryModel,
     AnalysisRequestQueryModel,
     ConfigurationSetting,
     ContentMetadata,
@@ -23,9 +26,11 @@ from ace.data_model import (
 from ace.analysis import RootAnalysis, AnalysisModuleType, Observable
 from ace.api.base import AceAPI
 from ace.system import ACESystem
+from ace.system.base.storage import slice_content
 from ace.system.requests import AnalysisRequest
 from ace.constants import ERROR_AMT_VERSION, ERROR_AMT_EXTENDED_VERSION, ERROR_AMT_DEP
 from ace.system.events import EventHandler
+from ace.logging import get_logger
 from ace.exceptions import (
     AnalysisModuleTypeDependencyError,
     AnalysisModuleTypeExtendedVersionError,
@@ -33,12 +38,56 @@ from ace.exceptions import (
     DuplicateApiKeyNameError,
     InvalidApiKeyError,
     InvalidAccessError,
+    UnknownFileError,
     exception_map,
 )
 
 import aiofiles
 
-from httpx import AsyncClient
+from httpx import AsyncClient, Limits
+
+
+async def _iter_upload_content(
+    content: Union[bytes, str, io.IOBase, aiofiles.threadpool.binary.AsyncBufferedReader, Path],
+) -> AsyncGenerator[bytes, None]:
+    """Yields the given content in chunks without blocking the event loop.
+    Files are read from their current position."""
+    if isinstance(content, str):
+        yield content.encode()
+    elif isinstance(content, bytes):
+        yield content
+    elif isinstance(content, aiofiles.threadpool.binary.AsyncBufferedReader):
+        while chunk := await content.read(io.DEFAULT_BUFFER_SIZE):
+            yield chunk
+    elif isinstance(content, Path):
+        async with aiofiles.open(str(content), "rb") as fp:
+            while chunk := await fp.read(io.DEFAULT_BUFFER_SIZE):
+                yield chunk
+    else:
+        loop = asyncio.get_running_loop()
+        while chunk := await loop.run_in_executor(None, content.read, io.DEFAULT_BUFFER_SIZE):
+            yield chunk
+
+
+async def _iter_multipart(
+    boundary: str, data: dict[str, str], content: AsyncGenerator[bytes, None]
+) -> AsyncGenerator[bytes, None]:
+    """Yields a multipart/form-data body with the given form fields followed by the content as the file field."""
+    for name, value in data.items():
+        yield f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode()
+        yield value.encode() + b"\r\n"
+
+    yield (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="upload"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+
+    async for chunk in content:
+        yield chunk
+
+    yield f"\r\n--{boundary}--\r\n".encode()
+
 
 # maps error codes to exceptions
 
@@ -62,6 +111,16 @@ def _raise_exception_from_error_model(error: ErrorModel):
 
 
 class RemoteAceAPI(AceAPI):
+    """Implements the AceAPI by making HTTP calls to a remote core.
+
+    A single pooled AsyncClient is kept for all calls (so that connections are
+    kept alive and reused) and is closed by calling close().
+
+    Args:
+        limits: Optional httpx.Limits that controls the size of the connection pool.
+        http2: Set to True to enable HTTP/2 (requires the h2 package.)
+    """
+
     def __init__(
         self,
         system: ACESystem,
@@ -69,6 +128,8 @@ class RemoteAceAPI(AceAPI):
         url: str,
         client_args: Optional[list] = None,
         client_kwargs: Optional[dict] = None,
+        limits: Optional[Limits] = None,
+        http2: Optional[bool] = False,
     ):
         super().__init__(system, api_key)
 
@@ -79,16 +140,47 @@ class RemoteAceAPI(AceAPI):
         if "base_url" not in self.client_kwargs:
             self.client_kwargs["base_url"] = url
 
-    def get_client(self):
-        kwargs = {}
-        kwargs.update(self.client_kwargs)
+        if limits is not None:
+            self.client_kwargs["limits"] = limits
+
+        if http2:
+            if importlib.util.find_spec("h2") is None:
+                get_logger().warning("http2 requested but the h2 package is not installed (using HTTP/1.1)")
+            else:
+                self.client_kwargs["http2"] = True
+
+        # the pooled client and the event loop it was created in
+        self.client = None
+        self.client_loop = None
+
+    def create_client(self) -> AsyncClient:
+        return AsyncClient(*self.client_args, **self.client_kwargs)
+
+    @contextlib.asynccontextmanager
+    async def get_client(self):
+        """Returns the pooled AsyncClient to use.
+        The client is shared by all calls and is not closed when the context exits."""
+        # connections belong to the event loop they were created in
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.client.is_closed or self.client_loop is not loop:
+            self.client = self.create_client()
+            self.client_loop = loop
+
+        # the api key can be changed after the client is created
         if self.api_key:
-            if "headers" not in kwargs:
-                kwargs["headers"] = {}
+            self.client.headers["X-API-Key"] = self.api_key
+        else:
+            self.client.headers.pop("X-API-Key", None)
 
-            kwargs["headers"].update({"X-API-Key": self.api_key})
+        yield self.client
 
-        return AsyncClient(*self.client_args, **kwargs)
+    async def close(self):
+        """Closes the pooled client (if it was created.)"""
+        if self.client is not None and self.client_loop is asyncio.get_running_loop():
+            await self.client.aclose()
+
+        self.client = None
+        self.client_loop = None
 
     # alerting
     async def register_alert_system(self, name: str) -> bool:
@@ -239,9 +331,23 @@ class RemoteAceAPI(AceAPI):
         _raise_exception_on_error(response)
         return response.json()
 
+    async def get_analysis_details_bulk(self, uuids: list[str]) -> dict[str, Any]:
+        assert isinstance(uuids, list)
+
+        async with self.get_client() as client:
+            response = await client.post(
+                "/analysis_tracking/details", json=AnalysisDetailsQueryModel(uuids=uuids).dict()
+            )
+
+        _raise_exception_on_error(response)
+        return response.json()
+
     async def track_analysis_details(self, root: RootAnalysis, uuid: str, value: Any) -> bool:
         raise NotImplementedError()
 
+    async def track_analysis_details_bulk(self, root: RootAnalysis, details: dict[str, Any]) -> list[str]:
+        raise NotImplementedError()
+
     async def delete_analysis_details(self, uuid: str) -> bool:
         raise NotImplementedError()
 
@@ -329,7 +435,7 @@ class RemoteAceAPI(AceAPI):
     # processing
     async def process_analysis_request(self, ar: AnalysisRequest):
         async with self.get_client() as client:
-            response = await client.post("/process_request", json=ar.to_dict())
+            response = await client.post("/process_request", json=ar.to_dict(compact=True))
 
         _raise_exception_on_error(response)
 
@@ -339,17 +445,20 @@ class RemoteAceAPI(AceAPI):
         content: Union[bytes, str, io.IOBase, aiofiles.threadpool.binary.AsyncBufferedReader, Path],
         meta: ContentMetadata,
     ) -> str:
+        """Stores the content and returns the sha256 of the content.
+        File objects (io.IOBase) passed in are closed once the content is stored.
+
+        Clients that already know the sha256 of the content can set meta.sha256 to skip the upload
+        if the content is already stored. In that case only meta.roots are registered and the metadata
+        of the stored content is kept as is, which is also what the core does when the same content is stored again."""
         try:
-            if isinstance(content, str):
-                content = io.BytesIO(content.encode())
-            elif isinstance(content, bytes):
-                content = io.BytesIO(content)
-            elif isinstance(content, aiofiles.threadpool.binary.AsyncBufferedReader):
-                content = io.BytesIO(await content.read())
-            elif isinstance(content, Path):
-                content = open(str(content), "rb")
-
-            files = {"file": content}
+            if meta.sha256 and await self.content_exists(meta.sha256):
+                get_logger().debug(f"content {meta.sha256} already exists")
+                for root_uuid in meta.roots:
+                    await self.track_content_root(meta.sha256, root_uuid)
+
+                return meta.sha256
+
             data = {"name": meta.name}
 
             if meta.expiration_date:
@@ -358,8 +467,14 @@ class RemoteAceAPI(AceAPI):
             if meta.custom:
                 data["custom"] = meta.custom
 
+            # the multipart body is streamed from the content as the request is sent
+            boundary = os.urandom(16).hex()
             async with self.get_client() as client:
-                response = await client.post("/storage", files=files, data=data)
+                response = await client.post(
+                    "/storage",
+                    content=_iter_multipart(boundary, data, _iter_upload_content(content)),
+                    headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+                )
 
             _raise_exception_on_error(response)
             return ContentMetadata(**response.json()).sha256
@@ -367,9 +482,16 @@ class RemoteAceAPI(AceAPI):
             if isinstance(content, io.IOBase):
                 try:
                     content.close()
-                except Exception as e:
+                except Exception:
                     get_logger().exception("unable to close file handle")
 
+    async def content_exists(self, sha256: str) -> bool:
+        async with self.get_client() as client:
+            response = await client.head(f"/storage/{sha256}")
+
+        _raise_exception_on_error(response)
+        return response.status_code == 200
+
     async def get_content_bytes(self, sha256: str) -> Union[bytes, None]:
         async with self.get_client() as client:
             async with client.stream("GET", f"/storage/{sha256}") as response:
@@ -379,15 +501,33 @@ class RemoteAceAPI(AceAPI):
 
                 return await response.aread()
 
-    async def iter_content(self, sha256: str, buffer_size: int) -> Union[AsyncGenerator[bytes, None], None]:
+    async def iter_content(
+        self, sha256: str, buffer_size: int, offset: int = 0, length: Optional[int] = None
+    ) -> Union[AsyncGenerator[bytes, None], None]:
+        headers = {}
+        if offset or length is not None:
+            if length == 0:
+                return
+
+            headers["Range"] = f"bytes={offset}-{'' if length is None else offset + length - 1}"
+
         async with self.get_client() as client:
-            async with client.stream("GET", f"/storage/{sha256}") as response:
+            async with client.stream("GET", f"/storage/{sha256}", headers=headers) as response:
                 _raise_exception_on_error(response)
                 if response.status_code == 404:
                     yield None
                     return
 
-                async for data in response.aiter_bytes():
+                # the range is past the end of the content
+                if response.status_code == 416:
+                    return
+
+                source = response.aiter_bytes(buffer_size)
+                # a server (or proxy) that ignores the Range header returns all of the content
+                if headers and response.status_code != 206:
+                    source = slice_content(source, offset, length)
+
+                async for data in source:
                     yield data
 
     async def get_content_meta(self, sha256: str) -> Union[ContentMetadata, None]:
@@ -404,7 +544,15 @@ class RemoteAceAPI(AceAPI):
         raise NotImplementedError()
 
     async def track_content_root(self, sha256: str, root: Union[RootAnalysis, str]):
-        raise NotImplementedError()
+        if isinstance(root, RootAnalysis):
+            root = root.uuid
+
+        async with self.get_client() as client:
+            response = await client.post(f"/storage/{sha256}/roots/{root}")
+
+        _raise_exception_on_error(response)
+        if response.status_code == 404:
+            raise UnknownFileError()
 
     async def save_file(self, path: str, **kwargs) -> Union[str, None]:
         meta = ContentMetadata(name=os.path.basename(path), **kwargs)
@@ -475,6 +623,36 @@ class RemoteAceAPI(AceAPI):
         else:
             return AnalysisRequest.from_dict(response.json(), self.system)
 
+    async def get_next_analysis_requests(
+        self,
+        owner_uuid: str,
+        amt: Union[AnalysisModuleType, str],
+        count: int,
+        timeout: Optional[int] = 0,
+        version: Optional[str] = None,
+        extended_version: Optional[dict[str, str]] = [],
+    ) -> list[AnalysisRequest]:
+        if isinstance(amt, AnalysisModuleType):
+            version = amt.version
+            extended_version = amt.extended_version
+            amt = amt.name
+
+        async with self.get_client() as client:
+            response = await client.post(
+                "/work_queue/batch",
+                json=AnalysisRequestQueryModel(
+                    owner=owner_uuid,
+                    amt=amt,
+                    count=count,
+                    timeout=timeout,
+                    version=version,
+                    extended_version=extended_version,
+                ).dict(),
+            )
+
+        _raise_exception_on_error(response)
+        return [AnalysisRequest.from_dict(_, self.system) for _ in response.json()]
+
     #
     # authentication
     #
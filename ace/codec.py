@@ -0,0 +1,373 @@
+# vim: ts=4:sw=4:et:cc=120
+#
+# serialization of RootAnalysis and AnalysisRequest objects
+#
+# the to_json() and from_json() functions of these objects go through the
+# pydantic models in ace.data_model which validates the data (more than once)
+# that is what we want for data that comes from outside of the system (see
+# ace.system.distributed) but the data the system stores and passes around
+# internally (database rows, redis queue items, executor payloads) was created
+# by the system itself
+#
+# a Codec encodes and decodes these objects to and from json
+# the PydanticCodec uses the (validating) pydantic models
+# the FastCodec builds the json directly from the object graph (and back again)
+# using orjson if it is available
+#
+# the output of both codecs is the same and can be decoded by the other
+#
+
+import datetime
+import json
+
+from dataclasses import asdict
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from pydantic.datetime_parse import parse_datetime
+from pydantic.json import pydantic_encoder
+
+import ace
+
+from ace.analysis import (
+    Analysis,
+    AnalysisModuleType,
+    DetectionPoint,
+    Observable,
+    RootAnalysis,
+    create_observable,
+)
+from ace.system.requests import AnalysisRequest
+
+
+class Codec:
+    """Encodes and decodes RootAnalysis and AnalysisRequest objects to and from json."""
+
+    def root_to_dict(self, root: RootAnalysis, exclude_analysis_details: bool = False) -> dict:
+        raise NotImplementedError()
+
+    def root_from_dict(self, value: dict, system: Optional["ace.system.ACESystem"] = None) -> RootAnalysis:
+        raise NotImplementedError()
+
+    def encode_value(self, value) -> str:
+        """Encodes any json compatible value (such as the result of root_to_dict.)"""
+        return _dumps(value)
+
+    def decode_value(self, value: str):
+        return _loads(value)
+
+    def encode_root(self, root: RootAnalysis, exclude_analysis_details: bool = False) -> str:
+        raise NotImplementedError()
+
+    def decode_root(self, value: str, system: Optional["ace.system.ACESystem"] = None) -> RootAnalysis:
+        raise NotImplementedError()
+
+    def encode_request(self, request: AnalysisRequest, compact: bool = False) -> str:
+        raise NotImplementedError()
+
+    def decode_request(self, value: str, system: Optional["ace.system.ACESystem"] = None) -> AnalysisRequest:
+        raise NotImplementedError()
+
+
+class PydanticCodec(Codec):
+    """Uses the pydantic models to encode and decode (with validation.)"""
+
+    def root_to_dict(self, root: RootAnalysis, exclude_analysis_details: bool = False) -> dict:
+        return root.to_dict(exclude_analysis_details=exclude_analysis_details)
+
+    def root_from_dict(self, value: dict, system: Optional["ace.system.ACESystem"] = None) -> RootAnalysis:
+        return RootAnalysis.from_dict(value, system=system)
+
+    def encode_root(self, root: RootAnalysis, exclude_analysis_details: bool = False) -> str:
+        return root.to_json(exclude_analysis_details=exclude_analysis_details)
+
+    def decode_root(self, value: str, system: Optional["ace.system.ACESystem"] = None) -> RootAnalysis:
+        return RootAnalysis.from_json(value, system=system)
+
+    def encode_request(self, request: AnalysisRequest, compact: bool = False) -> str:
+        return request.to_json(compact=compact)
+
+    def decode_request(self, value: str, system: Optional["ace.system.ACESystem"] = None) -> AnalysisRequest:
+        return AnalysisRequest.from_json(value, system=system)
+
+
+def _dumps(value) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=pydantic_encoder).decode()
+        except TypeError:
+            # orjson refuses some things json does not (such as integers larger than 64 bits)
+            pass
+
+    return json.dumps(value, default=pydantic_encoder)
+
+
+def _loads(value: str):
+    if orjson is not None:
+        return orjson.loads(value)
+
+    return json.loads(value)
+
+
+def _parse_datetime(value) -> Optional[datetime.datetime]:
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        # anything else the pydantic models would accept
+        return parse_datetime(value)
+
+
+class FastCodec(Codec):
+    """Encodes and decodes directly to and from the object graph without validation.
+    Only use this for data the system created itself."""
+
+    #
+    # encoding
+    #
+
+    def _detections_to_dict(self, target) -> list[dict]:
+        return [{"description": _.description, "details": _.details} for _ in target._detections]
+
+    def _amt_to_dict(self, amt: Optional[AnalysisModuleType]) -> Optional[dict]:
+        if amt is None:
+            return None
+
+        return asdict(amt)
+
+    def _analysis_to_dict(self, analysis: Analysis, exclude_analysis_details: bool) -> dict:
+        return {
+            "tags": analysis._tags,
+            "detections": self._detections_to_dict(analysis),
+            "uuid": analysis.uuid,
+            "type": self._amt_to_dict(analysis.type),
+            "observable_id": analysis.observable_id,
+            "observable_ids": analysis.observable_ids,
+            "summary": analysis.summary,
+            "details": None if exclude_analysis_details else analysis._details,
+            "error_message": analysis.error_message,
+            "stack_trace": analysis.stack_trace,
+        }
+
+    def _observable_to_dict(self, observable: Observable, exclude_analysis_details: bool) -> dict:
+        return {
+            "tags": observable._tags,
+            "detections": self._detections_to_dict(observable),
+            "uuid": observable.uuid,
+            "type": observable._type,
+            "value": observable._value,
+            "time": observable._time,
+            "context": observable.context,
+            "analysis": {
+                name: self._analysis_to_dict(analysis, exclude_analysis_details)
+                for name, analysis in observable._analysis.items()
+            },
+            "directives": observable._directives,
+            "redirection": observable._redirection,
+            "links": observable._links,
+            "limited_analysis": observable._limited_analysis,
+            "excluded_analysis": observable._excluded_analysis,
+            "requested_analysis": observable._requested_analysis,
+            "relationships": observable._relationships,
+            "grouping_target": observable._grouping_target,
+            "request_tracking": observable._request_tracking,
+        }
+
+    def root_to_dict(self, root: RootAnalysis, exclude_analysis_details: bool = False) -> dict:
+        """Returns the same dict as RootAnalysis.to_dict().
+        NOTE the result references the data of the root and is only meant to be encoded."""
+        result = self._analysis_to_dict(root, exclude_analysis_details)
+        result.update(
+            {
+                "tool": root._tool,
+                "tool_instance": root._tool_instance,
+                "alert_type": root._alert_type,
+                "description": root._description,
+                "event_time": root._event_time,
+                "name": root._name,
+                "state": root.state,
+                "analysis_mode": root._analysis_mode,
+                "queue": root._queue,
+                "instructions": root._instructions,
+                "version": root._version,
+                "expires": root._expires,
+                "analysis_cancelled": root._analysis_cancelled,
+                "analysis_cancelled_reason": root._analysis_cancelled_reason,
+                "observable_store": {
+                    id: self._observable_to_dict(observable, exclude_analysis_details)
+                    for id, observable in root.observable_store.items()
+                },
+            }
+        )
+        return result
+
+    def request_to_dict(self, request: AnalysisRequest, compact: bool = False) -> dict:
+        """Returns the same dict as AnalysisRequest.to_dict().
+        NOTE the result references the data of the request and is only meant to be encoded."""
+        root, original_root, modified_root = request.root, request.original_root, request.modified_root
+        observable = request.observable
+        compact = compact and isinstance(request.root, RootAnalysis) and request.observable is not None
+        if compact:
+            root, original_root, modified_root = request.get_compact_roots()
+            observable = root.get_observable(request.observable)
+
+        return {
+            "id": request.id,
+            "root": root if isinstance(root, str) else self.root_to_dict(root),
+            "observable": self._observable_to_dict(observable, False) if observable else None,
+            "type": self._amt_to_dict(request.type),
+            "cache_hit": False,
+            "status": request.status,
+            "owner": request.owner,
+            "original_root": self.root_to_dict(original_root) if original_root else None,
+            "modified_root": self.root_to_dict(modified_root) if modified_root else None,
+            "compact": compact,
+        }
+
+    def encode_root(self, root: RootAnalysis, exclude_analysis_details: bool = False) -> str:
+        return _dumps(self.root_to_dict(root, exclude_analysis_details))
+
+    def encode_request(self, request: AnalysisRequest, compact: bool = False) -> str:
+        return _dumps(self.request_to_dict(request, compact))
+
+    #
+    # decoding
+    #
+
+    def _detections_from_dict(self, value: list[dict]) -> list[DetectionPoint]:
+        return [DetectionPoint(_["description"], _.get("details")) for _ in value or []]
+
+    def _amt_from_dict(self, value: Optional[dict]) -> Optional[AnalysisModuleType]:
+        if value is None:
+            return None
+
+        return AnalysisModuleType(**value)
+
+    def _analysis_from_dict(self, value: dict, root: RootAnalysis, analysis: Analysis) -> Analysis:
+        analysis._tags = value.get("tags") or []
+        analysis._detections = self._detections_from_dict(value.get("detections"))
+        analysis.type = self._amt_from_dict(value.get("type"))
+        analysis.observable_ids = value.get("observable_ids") or []
+        analysis.observable_id = value.get("observable_id")
+        analysis._summary = value.get("summary")
+        analysis.uuid = value["uuid"]
+
+        details = value.get("details")
+        if details is not None:
+            analysis._details = details
+            analysis._details_loaded = False
+            analysis._details_modified = True
+
+        analysis.error_message = value.get("error_message")
+        analysis.stack_trace = value.get("stack_trace")
+        analysis.root = root
+        return analysis
+
+    def _observable_from_dict(self, value: dict, root: RootAnalysis) -> Observable:
+        observable = create_observable(value["type"], value["value"], root=root)
+        observable._tags = value.get("tags") or []
+        observable._detections = self._detections_from_dict(value.get("detections"))
+        observable.uuid = value["uuid"]
+        observable._type = value["type"]
+        observable._value = value["value"]
+
+        time = _parse_datetime(value.get("time"))
+        if time is not None and time.tzinfo is None:
+            time = ace.LOCAL_TIMEZONE.localize(time)
+
+        observable._time = time
+        observable.context = value.get("context")
+        observable._analysis = {
+            name: self._analysis_from_dict(analysis, root, Analysis(root=root))
+            for name, analysis in (value.get("analysis") or {}).items()
+        }
+        observable._directives = value.get("directives") or []
+        observable._redirection = value.get("redirection")
+        observable._links = value.get("links") or []
+        observable._limited_analysis = value.get("limited_analysis") or []
+        observable._excluded_analysis = value.get("excluded_analysis") or []
+        observable._requested_analysis = value.get("requested_analysis") or []
+        observable._relationships = value.get("relationships") or {}
+        observable._grouping_target = value.get("grouping_target") or False
+        observable._request_tracking = value.get("request_tracking") or {}
+        return observable
+
+    def root_from_dict(self, value: dict, system: Optional["ace.system.ACESystem"] = None) -> RootAnalysis:
+        """Returns the same RootAnalysis as RootAnalysis.from_dict() without validating the data."""
+        root = RootAnalysis(system=system)
+        root.observable_store = {
+            id: self._observable_from_dict(observable, root)
+            for id, observable in (value.get("observable_store") or {}).items()
+        }
+
+        self._analysis_from_dict(value, root, root)
+        root._analysis_mode = value.get("analysis_mode")
+        root._uuid = value["uuid"]
+        root._version = value.get("version")
+        root._tool = value.get("tool")
+        root._tool_instance = value.get("tool_instance")
+        root._alert_type = value.get("alert_type")
+        root._description = value.get("description")
+        root._event_time = _parse_datetime(value.get("event_time"))
+        root._name = value.get("name")
+        root._queue = value.get("queue")
+        root._instructions = value.get("instructions")
+        root._analysis_cancelled = value.get("analysis_cancelled") or False
+        root._analysis_cancelled_reason = value.get("analysis_cancelled_reason")
+        root._expires = value.get("expires") or False
+        root.state = value.get("state") or {}
+        return root
+
+    def request_from_dict(self, value: dict, system: Optional["ace.system.ACESystem"] = None) -> AnalysisRequest:
+        """Returns the same AnalysisRequest as AnalysisRequest.from_dict() without validating the data."""
+        root = None
+        if isinstance(value.get("root"), dict):
+            root = self.root_from_dict(value["root"], system)
+
+        observable = None
+        if value.get("observable"):
+            observable = root.get_observable(value["observable"]["uuid"])
+
+        ar = AnalysisRequest(system, root, observable, self._amt_from_dict(value.get("type")))
+        ar.id = value["id"]
+        ar.status = value.get("status")
+        ar.owner = value.get("owner")
+
+        if value.get("original_root"):
+            ar.original_root = self.root_from_dict(value["original_root"], system)
+
+        if value.get("modified_root"):
+            ar.modified_root = self.root_from_dict(value["modified_root"], system)
+
+            # compact results send the original root as the root
+            if value.get("compact") and not ar.original_root:
+                ar.original_root = root.copy()
+
+        return ar
+
+    def decode_root(self, value: str, system: Optional["ace.system.ACESystem"] = None) -> RootAnalysis:
+        return self.root_from_dict(_loads(value), system)
+
+    def decode_request(self, value: str, system: Optional["ace.system.ACESystem"] = None) -> AnalysisRequest:
+        return self.request_from_dict(_loads(value), system)
+
+
+_codec: Codec = FastCodec()
+
+
+def get_codec() -> Codec:
+    """Returns the Codec used to encode and decode internal data."""
+    return _codec
+
+
+def set_codec(codec: Codec):
+    """Sets the Codec used to encode and decode internal data."""
+    global _codec
+    assert isinstance(codec, Codec)
+    _codec = codec
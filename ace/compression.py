@@ -0,0 +1,125 @@
+# vim: ts=4:sw=4:et:cc=120
+#
+# compression of the (json) data the system stores
+#
+# compressed data starts with a marker that identifies the algorithm used
+# data that does not start with a marker is returned as-is by decompress
+# so data stored before compression was enabled (or below the threshold) can still be read
+#
+# json never starts with the ~ character so the markers cannot collide with uncompressed json
+#
+# zstd is used if the zstandard package is available, otherwise zlib is used
+#
+
+import base64
+import dataclasses
+import os
+import typing
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSION_NONE = "none"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+
+MARKER_ZLIB = b"~zlib~"
+MARKER_ZSTD = b"~zstd~"
+
+ENV_COMPRESSION_ALGORITHM = "ACE_COMPRESSION_ALGORITHM"
+ENV_COMPRESSION_LEVEL = "ACE_COMPRESSION_LEVEL"
+ENV_COMPRESSION_THRESHOLD = "ACE_COMPRESSION_THRESHOLD"
+
+
+def get_default_algorithm() -> str:
+    """Returns zstd if the zstandard package is available, zlib otherwise."""
+    return COMPRESSION_ZSTD if zstandard is not None else COMPRESSION_ZLIB
+
+
+@dataclasses.dataclass
+class CompressionSettings:
+
+    # one of COMPRESSION_NONE, COMPRESSION_ZLIB or COMPRESSION_ZSTD
+    algorithm: str = dataclasses.field(default_factory=get_default_algorithm)
+    # the compression level, None uses the default level of the algorithm
+    level: typing.Optional[int] = None
+    # data smaller than this (in bytes) is not compressed
+    threshold: int = 1024
+
+    def load_from_env(self):
+        """Loads the compression settings from environment variables."""
+        if ENV_COMPRESSION_ALGORITHM in os.environ:
+            self.algorithm = os.environ[ENV_COMPRESSION_ALGORITHM]
+        if ENV_COMPRESSION_LEVEL in os.environ:
+            self.level = int(os.environ[ENV_COMPRESSION_LEVEL])
+        if ENV_COMPRESSION_THRESHOLD in os.environ:
+            self.threshold = int(os.environ[ENV_COMPRESSION_THRESHOLD])
+
+
+def compress(data: bytes, settings: typing.Optional[CompressionSettings] = None) -> bytes:
+    """Returns the compressed data prefixed with the marker of the algorithm used.
+    Returns the data as-is if it is smaller than the threshold, does not compress or compression is disabled."""
+    assert isinstance(data, bytes)
+
+    if settings is None:
+        settings = CompressionSettings()
+
+    if settings.algorithm == COMPRESSION_NONE or len(data) < settings.threshold:
+        return data
+
+    if settings.algorithm == COMPRESSION_ZSTD and zstandard is not None:
+        level = settings.level if settings.level is not None else 3
+        result = MARKER_ZSTD + zstandard.ZstdCompressor(level=level).compress(data)
+    else:
+        # zlib is used if zstd was selected but is not available
+        level = settings.level if settings.level is not None else zlib.Z_DEFAULT_COMPRESSION
+        result = MARKER_ZLIB + zlib.compress(data, level)
+
+    # no point in storing data that did not compress
+    if len(result) >= len(data):
+        return data
+
+    return result
+
+
+def decompress(data: bytes) -> bytes:
+    """Returns the decompressed data, or the data as-is if it is not compressed."""
+    assert isinstance(data, bytes)
+
+    if data.startswith(MARKER_ZLIB):
+        return zlib.decompress(data[len(MARKER_ZLIB) :])
+
+    if data.startswith(MARKER_ZSTD):
+        if zstandard is None:
+            raise RuntimeError("data is compressed with zstd but the zstandard package is not installed")
+
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data[len(MARKER_ZSTD) :])
+
+    return data
+
+
+def compress_text(value: str, settings: typing.Optional[CompressionSettings] = None) -> str:
+    """Like compress but for text columns. The compressed data (after the marker) is base64 encoded."""
+    assert isinstance(value, str)
+
+    data = value.encode()
+    compressed = compress(data, settings)
+    if compressed is data:
+        return value
+
+    marker = MARKER_ZSTD if compressed.startswith(MARKER_ZSTD) else MARKER_ZLIB
+    return (marker + base64.b64encode(compressed[len(marker) :])).decode()
+
+
+def decompress_text(value: str) -> str:
+    """Returns the decompressed text, or the text as-is if it is not compressed."""
+    assert isinstance(value, str)
+
+    for marker in (MARKER_ZLIB, MARKER_ZSTD):
+        if value.startswith(marker.decode()):
+            return decompress(marker + base64.b64decode(value[len(marker) :])).decode()
+
+    return value
@@ -27,6 +27,9 @@ TRACKING_STATUS_EXPIRED = "expired"
 # system-level locks
 # TODO these locks should not be acquire-able externally
 SYSTEM_LOCK_EXPIRED_ANALYSIS_REQUESTS = "ace:expired_analysis_requests"
+SYSTEM_LOCK_EXPIRED_CACHED_ANALYSIS_RESULTS = "ace:expired_cached_analysis_results"
+SYSTEM_LOCK_EXPIRED_CONTENT = "ace:expired_content"
+SYSTEM_LOCK_EXPIRED_ROOT_ANALYSIS = "ace:expired_root_analysis"
 
 # supported events
 # analysis tracking
@@ -54,6 +57,8 @@ EVENT_AR_EXPIRED = "/core/request/expired"
 # caching
 EVENT_CACHE_NEW = "/core/cache/new"
 EVENT_CACHE_HIT = "/core/cache/hit"
+# authentication
+EVENT_API_KEY_DELETED = "/core/auth/api_key/deleted"
 # config
 EVENT_CONFIG_SET = "/core/config/set"
 EVENT_CONFIG_DELETE = "/core/config/delete"
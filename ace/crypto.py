@@ -21,7 +21,10 @@ from Crypto.Protocol.KDF import PBKDF2
 
 import aiofiles
 
+# the default size of the chunks data is encrypted in
 CHUNK_SIZE = 64 * 1024
+# the largest chunk size that can be used (anything larger is treated as corruption when decrypting)
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
 
 ENV_CRYPTO_VERIFICATION_KEY = "ACE_CRYPTO_VERIFICATION_KEY"
 ENV_CRYPTO_SALT = "ACE_CRYPTO_SALT"
@@ -164,7 +167,8 @@ async def get_aes_key(password: str, settings: EncryptionSettings) -> bytes:
 # padded_size (8 byte int) (little endian)
 # byte data (of padded_size bytes)
 #
-# CHUNK_SIZE defines how big the chunks are (max)
+# the chunk_size parameter defines how big the chunks are (max)
+# chunks of any size up to MAX_CHUNK_SIZE can be decrypted
 #
 
 #
@@ -173,14 +177,59 @@ async def get_aes_key(password: str, settings: EncryptionSettings) -> bytes:
 #
 
 
+def _create_reader(
+    source: [io.BytesIO, aiofiles.threadpool.binary.AsyncBufferedIOBase, typing.AsyncGenerator[bytes, None]],
+) -> typing.Callable[[int], typing.Awaitable[bytes]]:
+    """Returns an async function that reads (at most) n bytes from the source regardless of the type of source.
+    Chunks from an async generator that are already the requested size are returned without copying."""
+
+    # used to buffer data from an async generator
+    _async_buffer = bytearray()
+
+    async def _read(n: int) -> bytes:
+        if isinstance(source, io.BytesIO):
+            return source.read(n)
+        elif isinstance(source, aiofiles.threadpool.binary.AsyncBufferedIOBase):
+            return await source.read(n)
+
+        # we break out of this loop once we have enough data
+        while len(_async_buffer) < n:
+            # get more data from the async generator
+            try:
+                chunk = await source.__anext__()
+            except StopAsyncIteration:
+                chunk = None
+
+            if not chunk:
+                # if we didn't get anything then we just return what we have left
+                # (which may be nothing)
+                break
+
+            # chunks that line up with what we are reading are passed through as-is
+            if not _async_buffer and len(chunk) == n:
+                return chunk
+
+            # otherwise append it to the end of our buffer
+            _async_buffer.extend(chunk)
+
+        # we may have more bytes in our buffer then we asked for
+        result = bytes(_async_buffer[:n])
+        del _async_buffer[:n]
+        return result
+
+    return _read
+
+
 async def iter_encrypt_stream(
     password: typing.Union[str, bytes],
     source: [io.BytesIO, aiofiles.threadpool.binary.AsyncBufferedIOBase, typing.AsyncGenerator[bytes, None]],
     settings: typing.Optional[EncryptionSettings] = None,
+    chunk_size: int = CHUNK_SIZE,
 ) -> typing.AsyncGenerator[bytes, None]:
     """Encrypts the data on the source stream with the given encryption settings. If the password parameter
     is a string, it is used as the password to decrypt the actual AES 32 byte password that is used to perform
     the encryption. The source can be either an io.BytesIO object, or an AsyncBufferedIOBase from aiofiles.
+    The data is encrypted in chunks of (at most) chunk_size bytes.
 
     Each encrypted chunk of data is yielded as a result. Use in a for async iterator like this:
 
@@ -200,39 +249,9 @@ async def iter_encrypt_stream(
         or isinstance(source, aiofiles.threadpool.binary.AsyncBufferedIOBase)
         or isinstance(source, typing.AsyncGenerator)
     )
+    assert 0 < chunk_size <= MAX_CHUNK_SIZE
 
-    # used to buffer data from an async generator
-    _async_buffer = b""
-
-    # utility function to read n bytes regardless of type of source
-    async def _read(n: int) -> bytes:
-        nonlocal _async_buffer
-
-        if isinstance(source, io.BytesIO):
-            return source.read(n)
-        elif isinstance(source, aiofiles.threadpool.binary.AsyncBufferedIOBase):
-            return await source.read(n)
-        else:
-            # we break out of this loop once we have enough data
-            while len(_async_buffer) < n:
-                # get more data from the async generator
-                try:
-                    chunk = await source.__anext__()
-                except StopAsyncIteration:
-                    chunk = None
-
-                if not chunk:
-                    # if we didn't get anything then we just return what we have left
-                    # (which may be nothing)
-                    break
-
-                # otherwise append it to the end of our buffer
-                _async_buffer += chunk
-
-            # we may have more bytes in our buffer then we asked for
-            result = _async_buffer[:n]
-            _async_buffer = _async_buffer[n:]
-            return result
+    _read = _create_reader(source)
 
     if isinstance(password, str):
         password = await get_aes_key(password, settings)
@@ -242,15 +261,15 @@ async def iter_encrypt_stream(
     yield iv
 
     while True:
-        chunk = await _read(CHUNK_SIZE)
-        chunk_size = len(chunk)
-        if chunk_size == 0:
+        chunk = await _read(chunk_size)
+        original_chunk_size = len(chunk)
+        if original_chunk_size == 0:
             break
-        elif chunk_size % 16 != 0:
-            chunk += b" " * (16 - chunk_size % 16)
+        elif original_chunk_size % 16 != 0:
+            chunk += b" " * (16 - original_chunk_size % 16)
 
         # write the original size first so the decryption process knows how much to truncate
-        yield struct.pack("<Q", chunk_size)
+        yield struct.pack("<Q", original_chunk_size)
         # write the actual (padded) size so the decryptor knows how many bytes to actually read next
         yield struct.pack("<Q", len(chunk))
         yield encryptor.encrypt(chunk)
@@ -284,40 +303,7 @@ async def iter_decrypt_stream(
         or isinstance(source, typing.AsyncGenerator)
     )
 
-    # XXX copy pasta
-
-    # used to buffer data from an async generator
-    _async_buffer = b""
-
-    # utility function to read n bytes regardless of type of source
-    async def _read(n: int) -> bytes:
-        nonlocal _async_buffer
-
-        if isinstance(source, io.BytesIO):
-            return source.read(n)
-        elif isinstance(source, aiofiles.threadpool.binary.AsyncBufferedIOBase):
-            return await source.read(n)
-        else:
-            # we break out of this loop once we have enough data
-            while len(_async_buffer) < n:
-                # get more data from the async generator
-                try:
-                    chunk = await source.__anext__()
-                except StopAsyncIteration:
-                    chunk = None
-
-                if not chunk:
-                    # if we didn't get anything then we just return what we have left
-                    # (which may be nothing)
-                    break
-
-                # otherwise append it to the end of our buffer
-                _async_buffer += chunk
-
-            # we may have more bytes in our buffer then we asked for
-            result = _async_buffer[:n]
-            _async_buffer = _async_buffer[n:]
-            return result
+    _read = _create_reader(source)
 
     if isinstance(password, str):
         password = await get_aes_key(password, settings)
@@ -338,8 +324,8 @@ async def iter_decrypt_stream(
             break
 
         padded_chunk_size = struct.unpack("<Q", _buffer)[0]
-        if padded_chunk_size > CHUNK_SIZE + 16:
-            raise ValueError("decryption error - invalid chunk size: {padded_chunk_size} (file corrupted?)")
+        if padded_chunk_size > MAX_CHUNK_SIZE + 16:
+            raise ValueError(f"decryption error - invalid chunk size: {padded_chunk_size} (file corrupted?)")
 
         chunk = await _read(padded_chunk_size)
         if not chunk:
@@ -66,7 +66,9 @@ class AnalysisModuleTypeModel(BaseModel):
     )
     conditions: list[str] = Field(
         default_factory=list,
-        description="""TODO""",
+        description="""List of conditions (formatted as type:regex) that must all be satisfied.
+        re: matches against the entire root, re_value: matches against the value of the observable,
+        re_tag: matches against the tags of the observable.""",
     )
     version: str = Field(
         "1.0.0",
@@ -319,6 +321,12 @@ class AnalysisRequestModel(BaseModel):
     modified_root: Optional[RootAnalysisModel] = Field(
         description="""The root as it existed after analyisis completed."""
     )
+    compact: Optional[bool] = Field(
+        False,
+        description="""If this is True then the roots of this request only
+            contain the observables relevant to the request. If original_root
+            is missing then it is the same as root.""",
+    )
 
 
 class ContentMetadata(BaseModel):
@@ -358,6 +366,9 @@ class AnalysisRequestQueryModel(BaseModel):
         description="""A unique name that identifies what is making the request. This value is tied to the analysis request for the purposes of tracking."""
     )
     amt: str = Field(description="The analysis module type this request is for.")
+    count: Optional[int] = Field(
+        1, ge=1, description="The maximum number of requests to return. Only used when requesting a batch of requests."
+    )
     timeout: int = Field(
         description="The amount of time (in seconds) to wait for a request to become available. If no requests become available during this time then an empty response is returned."
     )
@@ -370,6 +381,10 @@ class AnalysisRequestQueryModel(BaseModel):
     )
 
 
+class AnalysisDetailsQueryModel(BaseModel):
+    uuids: list[str] = Field(description="The uuids of the analysis to return the details of.")
+
+
 class AlertListModel(BaseModel):
     root_uuids: list[str]
 
@@ -10,6 +10,7 @@ from typing import Optional, Union
 from ace.analysis import RootAnalysis, AnalysisModuleType, Observable, Analysis
 
 DEFAULT_ASYNC_LIMIT = 3  # XXX ???
+DEFAULT_PREFETCH_COUNT = 1
 
 
 class AnalysisModule:
@@ -21,6 +22,10 @@ class AnalysisModule:
     limit: int = None
     timeout: Union[float, int] = None
     is_multi_process: bool = False
+    # the number of requests the manager leases at a time for this module
+    # the lease of a prefetched request keeps running while it waits to be processed
+    # so only modules that finish well within the request timeout should use more than one
+    prefetch_count: int = DEFAULT_PREFETCH_COUNT
 
     def __init__(
         self,
@@ -28,11 +33,13 @@ class AnalysisModule:
         limit: Optional[int] = None,
         timeout: Union[int, float] = None,
         is_multi_process: Optional[bool] = None,
+        prefetch_count: Optional[int] = None,
     ):
         assert type is None or isinstance(type, AnalysisModuleType)
         assert limit is None or isinstance(limit, int)
         assert timeout is None or (isinstance(timeout, int) or isinstance(timeout, float))
         assert is_multi_process is None or isinstance(is_multi_process, bool)
+        assert prefetch_count is None or (isinstance(prefetch_count, int) and prefetch_count > 0)
 
         if type:
             self.type = type
@@ -56,6 +63,9 @@ class AnalysisModule:
         if timeout is not None:
             self.timeout = timeout
 
+        if prefetch_count is not None:
+            self.prefetch_count = prefetch_count
+
         # TODO implement a custom default timeout here
 
     async def execute_analysis(self, root: RootAnalysis, observable: Observable, analysis: Analysis):
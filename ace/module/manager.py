@@ -18,6 +18,7 @@ from typing import Optional
 
 from ace.analysis import RootAnalysis, Analysis, AnalysisModuleType
 from ace.api.base import AceAPI, AnalysisRequest
+from ace.codec import get_codec
 from ace.error_reporting.reporter import format_error_report
 from ace.exceptions import AnalysisModuleTypeVersionError, AnalysisModuleTypeExtendedVersionError
 from ace.logging import get_logger
@@ -129,7 +130,7 @@ class CPUTaskExecutor:
         return result
 
     async def execute_analysis_async(self, module_type: str, request_json: str) -> str:
-        request = AnalysisRequest.from_json(request_json, self.system)
+        request = get_codec().decode_request(request_json, self.system)
         amt = AnalysisModuleType.from_json(module_type)
         module = self.module_map[amt.name]
         if not module.type.extended_version_matches(amt):
@@ -140,7 +141,7 @@ class CPUTaskExecutor:
 
         analysis = request.modified_observable.add_analysis(Analysis(type=module.type, details={}))
         await module.execute_analysis(request.modified_root, request.modified_observable, analysis)
-        return request.to_json()
+        return get_codec().encode_request(request)
 
     def upgrade_module(self, amt_json: str) -> str:
         """Upgrades the analysis module of the given type."""
@@ -226,6 +227,9 @@ class AnalysisModuleManager:
         self.module_tasks = []  # asyncio.Task
         self.module_task_count = {}  # key = AnalysisModule, value = int
 
+        # requests that have been leased but not yet processed
+        self.module_requests = {}  # key = AnalysisModule, value = [ AnalysisRequest ]
+
         # executor for non-async modules
         self.concurrency_mode = concurrency_mode  # determines threading or multiprocessing
         self.executor = None
@@ -350,6 +354,7 @@ class AnalysisModuleManager:
         if type(module) not in [type(_) for _ in self.analysis_modules]:
             self.analysis_modules.append(module)
             self.module_task_count[module] = 0
+            self.module_requests[module] = []
             return module
         else:
             return None
@@ -490,9 +495,7 @@ class AnalysisModuleManager:
         request = None
 
         try:
-            request = await self.system.get_next_analysis_request(
-                whoami, module.type, self.wait_time, module.type.version, module.type.extended_version
-            )
+            request = await self.get_next_analysis_request(module, whoami)
         except AnalysisModuleTypeExtendedVersionError as e:
             get_logger().warning(f"module {module.type.name} has invalid extended version: {e}")
             if not await self.upgrade_module(module):
@@ -513,7 +516,10 @@ class AnalysisModuleManager:
         # we just continue executing if there is no scaling required
         # OR this is the last task for this module
         # (there should always be one running)
-        if not self.shutdown and (scaling == NO_SCALING or self.module_task_count[module] == 1):
+        # prefetched requests are processed before a graceful shutdown
+        if self.module_requests[module] and not self.immediate_shutdown:
+            self.continue_module_task(module, whoami)
+        elif not self.shutdown and (scaling == NO_SCALING or self.module_task_count[module] == 1):
             self.continue_module_task(module, whoami)
         elif self.shutdown or scaling == SCALE_DOWN:
             self.stop_module_task(module, whoami)
@@ -525,6 +531,24 @@ class AnalysisModuleManager:
 
         return module
 
+    async def get_next_analysis_request(self, module: AnalysisModule, whoami: str) -> Optional[AnalysisRequest]:
+        """Returns the next request for the module to process, or None if nothing is available.
+        Leases up to module.prefetch_count requests at a time."""
+        requests = self.module_requests[module]
+        if not requests:
+            requests.extend(
+                await self.system.get_next_analysis_requests(
+                    whoami,
+                    module.type,
+                    module.prefetch_count,
+                    self.wait_time,
+                    module.type.version,
+                    module.type.extended_version,
+                )
+            )
+
+        return requests.pop(0) if requests else None
+
     async def load_file_content(self, request: AnalysisRequest):
         """Loads any file observables present in the RootAnalysis of the request."""
         for file_observable in request.root.find_observables_by_type("file"):
@@ -552,11 +576,11 @@ class AnalysisModuleManager:
 
         if module.is_multi_process:
             try:
-                request_json = request.to_json()
+                request_json = get_codec().encode_request(request)
                 request_result_json = await asyncio.get_event_loop().run_in_executor(
                     self.executor, _cpu_task_executor_execute_analysis, module.type.to_json(), request_json
                 )
-                return AnalysisRequest.from_json(request_result_json, self.system)
+                return get_codec().decode_request(request_result_json, self.system)
             except BrokenProcessPool as e:
                 # when this happens you have to create and start a new one
                 self.process_exception(
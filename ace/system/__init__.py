@@ -4,6 +4,7 @@
 # a system is an object that extends all of these interfaces
 #
 
+from ace.compression import CompressionSettings
 from ace.crypto import EncryptionSettings
 
 from ace.system.base import (
@@ -14,6 +15,7 @@ from ace.system.base import (
     CachingBaseInterface,
     ConfigurationBaseInterface,
     EventBaseInterface,
+    MaintenanceBaseInterface,
     StorageBaseInterface,
     WorkQueueBaseInterface,
     AuthenticationBaseInterface,
@@ -30,6 +32,7 @@ class ACESystem(
     CachingBaseInterface,
     ConfigurationBaseInterface,
     EventBaseInterface,
+    MaintenanceBaseInterface,
     StorageBaseInterface,
     WorkQueueBaseInterface,
     AuthenticationBaseInterface,
@@ -41,15 +44,31 @@ class ACESystem(
     # encryption is not enabled by default
     encryption_settings: EncryptionSettings
 
+    # the compression settings for the data this system stores
+    compression_settings: CompressionSettings = CompressionSettings()
+
     def new_root(self, *args, **kwargs):
         """Returns a new RootAnalysis object for this system."""
         from ace.analysis import RootAnalysis
 
         return RootAnalysis(system=self, *args, **kwargs)
 
+    async def run_in_unit_of_work(self, function, *args, **kwargs):
+        """Calls the given coroutine function as a single unit of work and returns the result.
+        Systems that support transactions perform everything the function does in a single transaction.
+        Calls made while a unit of work is already in progress join that unit of work.
+        By default the function is simply called."""
+        return await function(*args, **kwargs)
+
+    async def after_unit_of_work(self, function, *args, **kwargs):
+        """Calls the given coroutine function after the current unit of work completes successfully.
+        By default (or when there is no unit of work in progress) the function is called right away."""
+        return await function(*args, **kwargs)
+
     async def reset(self):
         """Resets the system. Useful for unit testing."""
-        pass
+        self.invalidate_config_cache()
+        self.invalidate_api_key_cache()
 
     # should be called before start() is called
     async def initialize(self):
@@ -61,10 +80,12 @@ class ACESystem(
     async def start(self):
         """Called once as the system begins execution.
         Be sure to call await super().initialize if you override this method."""
-        pass
+        await self.start_config_cache()
+        await self.start_api_key_cache()
+        await self.start_maintenance()
 
     # called to stop the system
     async def stop(self):
         """Called once when the system is being shut down.
         Extend this to"""
-        pass
+        await self.stop_maintenance()
@@ -5,6 +5,7 @@ from ace.system.base.auth import AuthenticationBaseInterface
 from ace.system.base.caching import CachingBaseInterface
 from ace.system.base.config import ConfigurationBaseInterface
 from ace.system.base.events import EventBaseInterface
+from ace.system.base.maintenance import MaintenanceBaseInterface
 from ace.system.base.module_tracking import AnalysisModuleTrackingBaseInterface
 from ace.system.base.request_tracking import AnalysisRequestTrackingBaseInterface
 from ace.system.base.storage import StorageBaseInterface
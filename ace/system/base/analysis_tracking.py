@@ -5,18 +5,23 @@
 
 import json
 
-from typing import Union, Any
+from typing import Any, Optional, Union
 
 from ace import coreapi
 from ace.analysis import RootAnalysis
 from ace.logging import get_logger
 from ace.constants import *
+from ace.compression import compress, decompress
 from ace.crypto import encrypt_chunk, decrypt_chunk
 
 CONFIG_ANALYSIS_ENCRYPTION_ENABLED = "/core/analysis/encrypted"
 
 
 class AnalysisTrackingBaseInterface:
+
+    # the number of expiring roots delete_expired_root_analysis loads at a time
+    expired_root_batch_size = 100
+
     async def analysis_encryption_enabled(self) -> bool:
         """Returns True if encryption is configured and analysis is configured to be encrypted."""
         # the settings need to be configured
@@ -80,13 +85,20 @@ class AnalysisTrackingBaseInterface:
         if root.uuid is None:
             raise ValueError(f"uuid property of {root} is None in update_root_analysis")
 
+        # content that was already in the root is already tracked to it
+        file_observables = root.get_observables_by_type("file")
+        tracked_content = set()
+        if file_observables:
+            tracked_content = set(await self.get_root_observable_values(root, "file") or [])
+
         get_logger().debug(f"updating root {root} with version {root.version}")
         if not await self.i_update_root_analysis(root):
             return False
 
         # make sure storage content is tracked to their roots
-        for observable in root.get_observables_by_type("file"):
-            await self.track_content_root(observable.value, root)
+        for observable in file_observables:
+            if observable.value not in tracked_content:
+                await self.track_content_root(observable.value, root)
 
         await self.fire_event(EVENT_ANALYSIS_ROOT_MODIFIED, root)
         return True
@@ -117,6 +129,38 @@ class AnalysisTrackingBaseInterface:
         """Deletes the given RootAnalysis JSON data by uuid, and any associated analysis details."""
         raise NotImplementedError()
 
+    @coreapi
+    async def delete_expired_root_analysis(self) -> int:
+        """Deletes all RootAnalysis objects that are set to expire and have expired.
+        Returns the number of RootAnalysis objects deleted."""
+        get_logger().debug("deleting expired root analysis")
+        count = 0
+        after = None
+        while True:
+            uuids = await self.i_get_expiring_root_analysis_uuids(after, self.expired_root_batch_size)
+            for uuid in uuids:
+                root = await self.get_root_analysis(uuid)
+                if root is None or not await root.is_expired():
+                    continue
+
+                get_logger().debug(f"deleting expired root analysis {root}")
+                await self.fire_event(EVENT_ANALYSIS_ROOT_EXPIRED, root)
+                if await self.delete_root_analysis(root):
+                    count += 1
+
+            if len(uuids) < self.expired_root_batch_size:
+                break
+
+            after = uuids[-1]
+
+        return count
+
+    async def i_get_expiring_root_analysis_uuids(self, after: Optional[str], limit: int) -> list[str]:
+        """Returns the uuids (in order) of up to limit RootAnalysis objects that may have expired.
+        These are the roots that are set to expire, do not have detection points and do not have outstanding
+        analysis requests. Only uuids that come after the given uuid are returned (if after is not None.)"""
+        raise NotImplementedError()
+
     @coreapi
     async def root_analysis_exists(self, root: Union[RootAnalysis, str]) -> bool:
         assert isinstance(root, RootAnalysis) or isinstance(root, str)
@@ -130,6 +174,52 @@ class AnalysisTrackingBaseInterface:
         """Returns True if the given root analysis exists, False otherwise."""
         raise NotImplementedError()
 
+    @coreapi
+    async def get_root_analysis_uuids_by_observable(self, type: str, value: str) -> Optional[list[str]]:
+        """Returns the uuids of all the RootAnalysis objects that contain the given observable,
+        or None if the observables of roots are not tracked."""
+        assert isinstance(type, str)
+        assert isinstance(value, str)
+        return await self.i_get_root_analysis_uuids_by_observable(type, value)
+
+    async def i_get_root_analysis_uuids_by_observable(self, type: str, value: str) -> Optional[list[str]]:
+        raise NotImplementedError()
+
+    @coreapi
+    async def get_root_observable_values(self, root: Union[RootAnalysis, str], type: str) -> Optional[list[str]]:
+        """Returns the values of the observables of the given type in the given RootAnalysis without loading it,
+        or None if the observables of roots are not tracked."""
+        assert isinstance(root, RootAnalysis) or isinstance(root, str)
+        assert isinstance(type, str)
+
+        if isinstance(root, RootAnalysis):
+            root = root.uuid
+
+        return await self.i_get_root_observable_values(root, type)
+
+    async def i_get_root_observable_values(self, uuid: str, type: str) -> Optional[list[str]]:
+        raise NotImplementedError()
+
+    async def encode_analysis_details(self, value: Any) -> bytes:
+        """Returns the given details as they are stored (json that is optionally compressed and encrypted.)"""
+        # the thing to be tracked must be able to serialize into json
+        json_value = json.dumps(value, sort_keys=True)
+
+        # compression has to happen before encryption (encrypted data does not compress)
+        encoded_value = compress(json_value.encode(), self.compression_settings)
+
+        if await self.analysis_encryption_enabled():
+            encoded_value = await encrypt_chunk(self.encryption_settings.aes_key, encoded_value)
+
+        return encoded_value
+
+    async def decode_analysis_details(self, details: bytes) -> Any:
+        """Reverses encode_analysis_details."""
+        if await self.analysis_encryption_enabled():
+            details = await decrypt_chunk(self.encryption_settings.aes_key, details)
+
+        return json.loads(decompress(details).decode())
+
     @coreapi
     async def get_analysis_details(self, uuid: str) -> Any:
         assert isinstance(uuid, str)
@@ -138,15 +228,38 @@ class AnalysisTrackingBaseInterface:
         if details is None:
             return None
 
-        if await self.analysis_encryption_enabled():
-            details = await decrypt_chunk(self.encryption_settings.aes_key, details)
-
-        return json.loads(details.decode())
+        return await self.decode_analysis_details(details)
 
     async def i_get_analysis_details(self, uuid: str) -> bytes:
         """Returns the details for the given Analysis object, or None if is has not been set."""
         raise NotImplementedError()
 
+    @coreapi
+    async def get_analysis_details_bulk(self, uuids: list[str]) -> dict[str, Any]:
+        """Returns the details for all of the given analysis uuids as a dict (key = uuid).
+        Analysis that does not have details is not included in the result."""
+        assert isinstance(uuids, list)
+        assert all([isinstance(_, str) for _ in uuids])
+
+        if not uuids:
+            return {}
+
+        return {
+            uuid: await self.decode_analysis_details(details)
+            for uuid, details in (await self.i_get_analysis_details_bulk(uuids)).items()
+        }
+
+    async def i_get_analysis_details_bulk(self, uuids: list[str]) -> dict[str, bytes]:
+        """Returns the details for the given Analysis objects (key = uuid).
+        By default this calls i_get_analysis_details for each uuid."""
+        result = {}
+        for uuid in uuids:
+            details = await self.i_get_analysis_details(uuid)
+            if details is not None:
+                result[uuid] = details
+
+        return result
+
     @coreapi
     async def track_analysis_details(self, root: RootAnalysis, uuid: str, value: Any) -> bool:
         assert isinstance(root, RootAnalysis)
@@ -159,15 +272,7 @@ class AnalysisTrackingBaseInterface:
         get_logger().debug(f"tracking {root} analysis details {uuid}")
         exists = await self.analysis_details_exists(root.uuid)
 
-        # the thing to be tracked must be able to serialize into json
-        json_value = json.dumps(value, sort_keys=True)
-
-        if await self.analysis_encryption_enabled():
-            encoded_value = await encrypt_chunk(self.encryption_settings.aes_key, json_value.encode())
-        else:
-            encoded_value = json_value.encode()
-
-        await self.i_track_analysis_details(root.uuid, uuid, encoded_value)
+        await self.i_track_analysis_details(root.uuid, uuid, await self.encode_analysis_details(value))
 
         if not exists:
             await self.fire_event(EVENT_ANALYSIS_DETAILS_NEW, [root, root.uuid])
@@ -180,6 +285,38 @@ class AnalysisTrackingBaseInterface:
         """Tracks the details for the given Analysis object (uuid) in the given root (root_uuid)."""
         raise NotImplementedError()
 
+    @coreapi
+    async def track_analysis_details_bulk(self, root: RootAnalysis, details: dict[str, Any]) -> list[str]:
+        """Tracks the details of all the given analysis (key = uuid) of the given root.
+        Details that are None are not tracked. Returns the list of uuids that were tracked."""
+        assert isinstance(root, RootAnalysis)
+        assert isinstance(details, dict)
+
+        details = {uuid: value for uuid, value in details.items() if value is not None}
+        if not details:
+            return []
+
+        get_logger().debug(f"tracking {len(details)} analysis details for {root}")
+        exists = await self.analysis_details_exists(root.uuid)
+
+        await self.i_track_analysis_details_bulk(
+            root.uuid, {uuid: await self.encode_analysis_details(value) for uuid, value in details.items()}
+        )
+
+        for _ in details:
+            if not exists:
+                await self.fire_event(EVENT_ANALYSIS_DETAILS_NEW, [root, root.uuid])
+            else:
+                await self.fire_event(EVENT_ANALYSIS_DETAILS_MODIFIED, [root, root.uuid])
+
+        return list(details)
+
+    async def i_track_analysis_details_bulk(self, root_uuid: str, values: dict[str, bytes]):
+        """Tracks the details for the given Analysis objects (key = uuid) in the given root (root_uuid).
+        By default this calls i_track_analysis_details for each uuid."""
+        for uuid, value in values.items():
+            await self.i_track_analysis_details(root_uuid, uuid, value)
+
     @coreapi
     async def delete_analysis_details(self, uuid: str) -> bool:
         assert isinstance(uuid, str)
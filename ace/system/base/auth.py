@@ -3,13 +3,53 @@
 #
 #
 
+import hashlib
+import time
+
+from collections import OrderedDict
 from typing import Optional, Union
 
 from ace import coreapi
+from ace.constants import *
 from ace.exceptions import MissingEncryptionSettingsError
+from ace.system.events import CacheInvalidationEventHandler
 
 
 class AuthenticationBaseInterface:
+
+    # how long (in seconds) a verified api key is cached, 0 disables the cache
+    api_key_cache_ttl: float = 30.0
+
+    # the maximum number of verified api keys to cache
+    api_key_cache_size: int = 1024
+
+    # key = tuple(sha256 of api key, is_admin), value = time.monotonic() the entry expires
+    # only keys that passed verification are cached
+    api_key_cache: Optional[OrderedDict] = None
+
+    # incremented every time the cache is invalidated
+    # keys verified while the cache was invalidated are not cached (they may have been deleted)
+    api_key_cache_generation: int = 0
+
+    api_key_cache_event_handler: Optional[CacheInvalidationEventHandler] = None
+
+    def invalidate_api_key_cache(self):
+        """Clears the cache of verified api keys."""
+        self.api_key_cache_generation += 1
+        self.api_key_cache = None
+
+    async def start_api_key_cache(self):
+        """Starts listening for deleted api keys."""
+        if not self.api_key_cache_ttl:
+            return
+
+        if self.api_key_cache_event_handler is None:
+            self.api_key_cache_event_handler = CacheInvalidationEventHandler(
+                "cached api keys", lambda event: self.invalidate_api_key_cache()
+            )
+
+        await self.register_event_handler(EVENT_API_KEY_DELETED, self.api_key_cache_event_handler)
+
     @coreapi
     async def create_api_key(
         self, name: str, description: Optional[str] = None, is_admin: Optional[bool] = False
@@ -29,7 +69,13 @@ class AuthenticationBaseInterface:
         if not self.encryption_settings:
             raise MissingEncryptionSettingsError()
 
-        return await self.i_delete_api_key(name)
+        result = await self.i_delete_api_key(name)
+        # we only know the name of the key so we drop all of them
+        self.invalidate_api_key_cache()
+        if result:
+            await self.fire_event(EVENT_API_KEY_DELETED, name)
+
+        return result
 
     async def i_delete_api_key(self, name: str) -> bool:
         raise NotImplementedError()
@@ -39,7 +85,32 @@ class AuthenticationBaseInterface:
         """Returns True if the given api key is valid, False otherwise. If
         is_admin is True then the api_key must also be an admin key to pass
         verification."""
-        return await self.i_verify_api_key(api_key, is_admin)
+        if not self.api_key_cache_ttl:
+            return await self.i_verify_api_key(api_key, is_admin)
+
+        if self.api_key_cache is None:
+            self.api_key_cache = OrderedDict()
+
+        cache_key = (hashlib.sha256(api_key.encode()).hexdigest(), bool(is_admin))
+        expires = self.api_key_cache.get(cache_key)
+        if expires is not None and expires > time.monotonic():
+            self.api_key_cache.move_to_end(cache_key)
+            return True
+
+        generation = self.api_key_cache_generation
+        result = await self.i_verify_api_key(api_key, is_admin)
+        if generation != self.api_key_cache_generation:
+            return result
+
+        if result:
+            self.api_key_cache[cache_key] = time.monotonic() + self.api_key_cache_ttl
+            self.api_key_cache.move_to_end(cache_key)
+            while len(self.api_key_cache) > self.api_key_cache_size:
+                self.api_key_cache.popitem(last=False)
+        else:
+            self.api_key_cache.pop(cache_key, None)
+
+        return result
 
     async def i_verify_api_key(self, api_key: str) -> bool:
         raise NotImplementedError()
@@ -4,16 +4,97 @@
 #
 
 import os
+import time
 
 from typing import Optional, Any, Union
 
 from ace import coreapi
 from ace.constants import *
 from ace.logging import get_logger
-from ace.data_model import ConfigurationSetting
+from ace.data_model import ConfigurationSetting, Event
+from ace.system.events import CacheInvalidationEventHandler
 
 
 class ConfigurationBaseInterface:
+
+    # how long (in seconds) configuration settings are cached, 0 disables the cache
+    config_cache_ttl: float = 60.0
+
+    # key = config key, value = tuple(time.monotonic() the entry expires, ConfigurationSetting or None)
+    config_cache: Optional[dict] = None
+
+    # after load_config() runs any key missing from the cache does not exist until this time.monotonic()
+    config_cache_loaded_until: float = 0
+
+    # incremented every time the cache is invalidated
+    # settings loaded while the cache was invalidated are not cached (they may already be out of date)
+    config_cache_generation: int = 0
+
+    config_cache_event_handler: Optional[CacheInvalidationEventHandler] = None
+
+    def invalidate_config_cache(self, key: Optional[str] = None):
+        """Removes the given key from the configuration cache, or clears the entire cache if key is None."""
+        self.config_cache_generation += 1
+        if key is None or self.config_cache is None:
+            self.config_cache = None
+            self.config_cache_loaded_until = 0
+            return
+
+        self.config_cache.pop(key, None)
+        # we also no longer know if the key exists
+        self.config_cache_loaded_until = 0
+
+    def _get_cached_config(self, key: str) -> tuple[bool, Union[ConfigurationSetting, None]]:
+        """Returns a tuple of (found, setting) for the given key."""
+        if not self.config_cache_ttl or self.config_cache is None:
+            return False, None
+
+        now = time.monotonic()
+        entry = self.config_cache.get(key)
+        if entry is not None:
+            expires, setting = entry
+            if expires > now:
+                return True, setting
+
+        elif self.config_cache_loaded_until > now:
+            return True, None
+
+        return False, None
+
+    def _invalidate_config_cache_on_event(self, event: Event):
+        if event.name == EVENT_CONFIG_SET:
+            self.invalidate_config_cache(event.args[0])
+        elif event.name == EVENT_CONFIG_DELETE:
+            self.invalidate_config_cache(event.args)
+
+    def _cache_config(self, key: str, setting: Union[ConfigurationSetting, None], generation: int):
+        if not self.config_cache_ttl or generation != self.config_cache_generation:
+            return
+
+        if self.config_cache is None:
+            self.config_cache = {}
+
+        self.config_cache[key] = (time.monotonic() + self.config_cache_ttl, setting)
+
+    async def start_config_cache(self):
+        """Loads all the configuration settings into the cache and starts listening for changes."""
+        if not self.config_cache_ttl:
+            return
+
+        if self.config_cache_event_handler is None:
+            self.config_cache_event_handler = CacheInvalidationEventHandler(
+                "cached configuration", self._invalidate_config_cache_on_event
+            )
+
+        await self.register_event_handler(EVENT_CONFIG_SET, self.config_cache_event_handler)
+        await self.register_event_handler(EVENT_CONFIG_DELETE, self.config_cache_event_handler)
+
+        try:
+            await self.load_config()
+        except Exception as e:
+            # the settings are then loaded (and cached) as they are used
+            get_logger().warning(f"unable to load configuration: {e}")
+
     async def get_config_value(
         self,
         key: str,
@@ -38,13 +119,41 @@ class ConfigurationBaseInterface:
     @coreapi
     async def get_config(self, key: str) -> Union[ConfigurationSetting, None]:
         assert isinstance(key, str) and key
-        return await self.i_get_config(key)
+        found, result = self._get_cached_config(key)
+        if found:
+            return result
+
+        generation = self.config_cache_generation
+        result = await self.i_get_config(key)
+        self._cache_config(key, result, generation)
+        return result
 
     async def i_get_config(self, key: str) -> ConfigurationSetting:
         """Returns a ace.data_model.ConfigurationSetting object for the setting, or None if the setting does not
         exist."""
         raise NotImplementedError()
 
+    @coreapi
+    async def load_config(self) -> int:
+        """Loads all configuration settings into the cache. Returns the number of settings loaded."""
+        if not self.config_cache_ttl:
+            return 0
+
+        generation = self.config_cache_generation
+        settings = await self.i_get_all_config()
+        if generation != self.config_cache_generation:
+            # something changed while the settings were loading
+            return len(settings)
+
+        expires = time.monotonic() + self.config_cache_ttl
+        self.config_cache = {setting.name: (expires, setting) for setting in settings}
+        self.config_cache_loaded_until = expires
+        return len(settings)
+
+    async def i_get_all_config(self) -> list[ConfigurationSetting]:
+        """Returns all the configuration settings."""
+        raise NotImplementedError()
+
     @coreapi
     async def set_config(self, key: str, value: Any, documentation: Optional[str] = None):
         """Sets the configuration setting. This function updates the setting if it already exists, or creates a new one if
@@ -57,6 +166,7 @@ class ConfigurationBaseInterface:
 
         get_logger().debug(f"modified config key {key} value {value}")
         result = await self.i_set_config(key, value, documentation)
+        self.invalidate_config_cache(key)
         await self.fire_event(EVENT_CONFIG_SET, [key, value, documentation])
         return result
 
@@ -79,6 +189,7 @@ class ConfigurationBaseInterface:
 
         get_logger().debug(f"deleted config key {key}")
         result = await self.i_delete_config(key)
+        self.invalidate_config_cache(key)
         if result:
             await self.fire_event(EVENT_CONFIG_DELETE, key)
 
@@ -42,10 +42,11 @@ class EventBaseInterface:
 
     @coreapi
     async def fire_event(self, event: str, event_args: Optional[Any] = None):
-        """Fires the event with the given JSON argument."""
+        """Fires the event with the given JSON argument.
+        Events fired during a unit of work are fired once the unit of work completes (see after_unit_of_work)."""
         assert isinstance(event, str) and event
         get_logger().debug(f"fired event {event}")
-        return await self.i_fire_event(Event(name=event, args=event_args))
+        return await self.after_unit_of_work(self.i_fire_event, Event(name=event, args=event_args))
 
     async def i_fire_event(self, event: Event):
         """Calls all registered event handlers for the given event.
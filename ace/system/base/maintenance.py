@@ -0,0 +1,147 @@
+# vim: ts=4:sw=4:et:cc=120
+#
+# scheduled system maintenance
+#
+# each core node runs a background task that periodically removes expired data from the system
+# (expired analysis requests, cached analysis results, content and root analysis)
+#
+# every sweep has its own (configurable) interval
+# a sweep is only executed if the node can acquire the maintenance lock for it
+# the lock is held for the length of the interval and is never released
+# so each sweep runs once per interval no matter how many nodes are running
+#
+
+import asyncio
+import time
+
+from typing import Optional
+
+from ace import coreapi
+from ace.constants import *
+from ace.exceptions import UnknownAnalysisModuleTypeError
+from ace.logging import get_logger
+
+CONFIG_MAINTENANCE_INTERVAL_EXPIRED_ANALYSIS_REQUESTS = "/ace/core/maintenance/expired_analysis_requests/interval"
+CONFIG_MAINTENANCE_INTERVAL_EXPIRED_CACHED_ANALYSIS_RESULTS = (
+    "/ace/core/maintenance/expired_cached_analysis_results/interval"
+)
+CONFIG_MAINTENANCE_INTERVAL_EXPIRED_CONTENT = "/ace/core/maintenance/expired_content/interval"
+CONFIG_MAINTENANCE_INTERVAL_EXPIRED_ROOT_ANALYSIS = "/ace/core/maintenance/expired_root_analysis/interval"
+
+# key = lock name, value = (config key of the interval, default interval in seconds)
+MAINTENANCE_INTERVALS = {
+    SYSTEM_LOCK_EXPIRED_ANALYSIS_REQUESTS: (CONFIG_MAINTENANCE_INTERVAL_EXPIRED_ANALYSIS_REQUESTS, 10),
+    SYSTEM_LOCK_EXPIRED_CACHED_ANALYSIS_RESULTS: (CONFIG_MAINTENANCE_INTERVAL_EXPIRED_CACHED_ANALYSIS_RESULTS, 60),
+    SYSTEM_LOCK_EXPIRED_CONTENT: (CONFIG_MAINTENANCE_INTERVAL_EXPIRED_CONTENT, 300),
+    SYSTEM_LOCK_EXPIRED_ROOT_ANALYSIS: (CONFIG_MAINTENANCE_INTERVAL_EXPIRED_ROOT_ANALYSIS, 300),
+}
+
+
+class MaintenanceBaseInterface:
+
+    # set to False to disable the background maintenance task
+    maintenance_enabled: bool = True
+
+    # how often (in seconds) the background maintenance task checks for sweeps to run
+    maintenance_frequency: float = 1.0
+
+    # the running background maintenance task
+    maintenance_task: Optional[asyncio.Task] = None
+
+    # key = lock name, value = time.monotonic() of the next time this node tries to run the sweep
+    maintenance_schedule: Optional[dict[str, float]] = None
+
+    @coreapi
+    async def acquire_maintenance_lock(self, name: str, timeout: float) -> bool:
+        """Attempts to acquire the given maintenance lock for timeout seconds.
+        Returns True if the lock was acquired, False if another node already holds it."""
+        assert isinstance(name, str) and name
+        return await self.i_acquire_maintenance_lock(name, timeout)
+
+    async def i_acquire_maintenance_lock(self, name: str, timeout: float) -> bool:
+        """Acquires the lock if it is not currently held. The lock expires after timeout seconds."""
+        raise NotImplementedError()
+
+    async def process_all_expired_analysis_requests(self) -> int:
+        """Moves all expired analysis requests back into the work queues.
+        Returns the number of requests that were re-queued."""
+        count = 0
+        if self.reliable_work_queue:
+            for amt in await self.get_all_analysis_module_types():
+                count += await self.requeue_expired_work(amt)
+
+        for request in await self.get_expired_analysis_requests():
+            await self.fire_event(EVENT_AR_EXPIRED, request)
+            try:
+                await self.queue_analysis_request(request)
+                count += 1
+            except UnknownAnalysisModuleTypeError:
+                await self.delete_analysis_request(request)
+
+        return count
+
+    def get_maintenance_sweeps(self) -> dict:
+        """Returns a dict of lock name to the coroutine function that performs the sweep."""
+        return {
+            SYSTEM_LOCK_EXPIRED_ANALYSIS_REQUESTS: self.process_all_expired_analysis_requests,
+            SYSTEM_LOCK_EXPIRED_CACHED_ANALYSIS_RESULTS: self.delete_expired_cached_analysis_results,
+            SYSTEM_LOCK_EXPIRED_CONTENT: self.delete_expired_content,
+            SYSTEM_LOCK_EXPIRED_ROOT_ANALYSIS: self.delete_expired_root_analysis,
+        }
+
+    async def run_maintenance(self) -> dict:
+        """Runs all the maintenance sweeps that are due. Returns a dict of lock name to the result of each sweep that ran."""
+        if self.maintenance_schedule is None:
+            self.maintenance_schedule = {}
+
+        result = {}
+        for name, sweep in self.get_maintenance_sweeps().items():
+            if self.maintenance_schedule.get(name, 0) > time.monotonic():
+                continue
+
+            config_key, default = MAINTENANCE_INTERVALS[name]
+            interval = float(await self.get_config_value(config_key, default=default))
+            self.maintenance_schedule[name] = time.monotonic() + interval
+
+            # only one node runs each sweep per interval
+            if not await self.acquire_maintenance_lock(name, interval):
+                continue
+
+            get_logger().debug(f"running maintenance {name}")
+            try:
+                result[name] = await sweep()
+            except Exception as e:
+                get_logger().error(f"maintenance {name} failed: {e}")
+
+        return result
+
+    async def maintenance_loop(self):
+        while True:
+            try:
+                await self.run_maintenance()
+            except Exception as e:
+                get_logger().error(f"maintenance failed: {e}")
+
+            await asyncio.sleep(self.maintenance_frequency)
+
+    async def start_maintenance(self):
+        """Starts the background maintenance task."""
+        if not self.maintenance_enabled or self.maintenance_task is not None:
+            return
+
+        get_logger().info("starting maintenance task")
+        self.maintenance_task = asyncio.create_task(self.maintenance_loop())
+
+    async def stop_maintenance(self):
+        """Stops the background maintenance task."""
+        if self.maintenance_task is None:
+            return
+
+        get_logger().info("stopping maintenance task")
+        self.maintenance_task.cancel()
+        try:
+            await self.maintenance_task
+        except asyncio.CancelledError:
+            pass
+
+        self.maintenance_task = None
@@ -3,16 +3,115 @@
 #
 #
 
+import time
+
 from typing import Union, Optional
 
 from ace import coreapi
 from ace.logging import get_logger
-from ace.analysis import AnalysisModuleType
+from ace.analysis import AnalysisModuleType, Observable
 from ace.constants import *
+from ace.data_model import Event
 from ace.exceptions import AnalysisModuleTypeDependencyError, CircularDependencyError
+from ace.system.events import CacheInvalidationEventHandler
+
+
+class AnalysisModuleTypeIndex:
+    """An inverted index of analysis module types keyed on the properties of an
+    observable that AnalysisModuleType.accepts filters on (observable type,
+    analysis mode, directives and tags.)
+
+    The index is used to narrow down the list of types that need to be checked
+    against a given observable. It returns a superset of the types that accept
+    the observable, so accepts() still needs to be called on the results."""
+
+    def __init__(self, amts: list[AnalysisModuleType], generation: int = 0):
+        # the generation of the registered types this index was built from
+        self.generation = generation
+        self.amts = {}  # key = amt.name, value = AnalysisModuleType
+        self.order = {}  # key = amt.name, value = position in the original list
+
+        self.by_observable_type = {}  # key = observable type, value = set(amt.name)
+        self.any_observable_type = set()
+        self.by_mode = {}  # key = analysis mode, value = set(amt.name)
+        self.any_mode = set()
+        self.by_directive = {}  # key = directive, value = set(amt.name)
+        self.no_directives = set()
+        self.by_tag = {}  # key = tag, value = set(amt.name)
+        self.no_tags = set()
+
+        for position, amt in enumerate(amts):
+            self.amts[amt.name] = amt
+            self.order[amt.name] = position
+
+            # manual analysis modules are only ever selected when requested
+            if amt.manual:
+                continue
+
+            self._index(amt.name, amt.observable_types, self.by_observable_type, self.any_observable_type)
+            self._index(amt.name, amt.modes, self.by_mode, self.any_mode)
+            self._index(amt.name, amt.directives, self.by_directive, self.no_directives)
+            self._index(amt.name, amt.tags, self.by_tag, self.no_tags)
+
+    @staticmethod
+    def _index(name: str, keys: list[str], index: dict[str, set[str]], unrestricted: set[str]):
+        if not keys:
+            unrestricted.add(name)
+            return
+
+        for key in keys:
+            index.setdefault(key, set()).add(name)
+
+    def _all_of(self, values: list[str], attr: str, index: dict[str, set[str]], unrestricted: set[str]) -> set[str]:
+        """Returns the names of the types where every required value (attr) is in values."""
+        result = set(unrestricted)
+        for value in values:
+            for name in index.get(value, ()):
+                if name not in result and all(_ in values for _ in getattr(self.amts[name], attr)):
+                    result.add(name)
+
+        return result
+
+    def get_candidates(self, observable: Observable) -> list[AnalysisModuleType]:
+        """Returns the list of analysis module types that could accept the given observable,
+        in the same order the types were given to the index."""
+        assert isinstance(observable, Observable)
+
+        candidates = self.any_observable_type | self.by_observable_type.get(observable.type, set())
+
+        if candidates:
+            mode = observable.root.analysis_mode if observable.root else None
+            candidates &= self.any_mode | self.by_mode.get(mode, set())
+
+        if candidates:
+            candidates &= self._all_of(observable.directives, "directives", self.by_directive, self.no_directives)
+
+        if candidates:
+            candidates &= self._all_of(observable.tags, "tags", self.by_tag, self.no_tags)
+
+        # requested analysis bypasses everything else
+        for name in observable.requested_analysis:
+            if name in self.amts:
+                candidates.add(name)
+
+        return [self.amts[name] for name in sorted(candidates, key=self.order.get)]
 
 
 class AnalysisModuleTrackingBaseInterface:
+
+    # the current index of registered analysis module types (see get_analysis_module_type_index)
+    # this also serves as the in-memory registry of the types
+    amt_index: Optional[AnalysisModuleTypeIndex] = None
+    # how long (in seconds) the index is used before it is rebuilt
+    # changes are normally picked up through events, this limits how long a missed event goes unnoticed
+    amt_index_ttl: float = 60.0
+    # the time.monotonic() the current index expires
+    amt_index_expires: float = 0
+    # incremented every time the registered analysis module types change
+    amt_generation: int = 0
+    # the event handler that invalidates the index
+    amt_index_event_handler: Optional[CacheInvalidationEventHandler] = None
+
     @coreapi
     async def register_analysis_module_type(self, amt: AnalysisModuleType) -> AnalysisModuleType:
         """Registers the given AnalysisModuleType with the system."""
@@ -33,7 +132,8 @@ class AnalysisModuleTrackingBaseInterface:
         # any updates to version or cache keys would be saved here
         await self.track_analysis_module_type(amt)
 
-        if current_type and not current_type.version_matches(amt):
+        # any change is published so that other systems refresh their copy of the type
+        if current_type and current_type != amt:
             await self.fire_event(EVENT_AMT_MODIFIED, amt)
         elif current_type is None:
             await self.fire_event(EVENT_AMT_NEW, amt)
@@ -44,7 +144,9 @@ class AnalysisModuleTrackingBaseInterface:
     async def track_analysis_module_type(self, amt: AnalysisModuleType):
         assert isinstance(amt, AnalysisModuleType)
         get_logger().debug(f"tracking analysis module type {amt}")
-        return await self.i_track_analysis_module_type(amt)
+        result = await self.i_track_analysis_module_type(amt)
+        self.invalidate_analysis_module_type_index()
+        return result
 
     async def i_track_analysis_module_type(self, amt: AnalysisModuleType):
         raise NotImplementedError()
@@ -68,6 +170,7 @@ class AnalysisModuleTrackingBaseInterface:
         await self.delete_work_queue(amt.name)
         # remove the module
         await self.i_delete_analysis_module_type(amt)
+        self.invalidate_analysis_module_type_index()
         # remove any outstanding requests from tracking
         await self.clear_tracking_by_analysis_module_type(amt)
         # remove any cached analysis results for this type
@@ -83,19 +186,71 @@ class AnalysisModuleTrackingBaseInterface:
     async def get_analysis_module_type(self, name: str) -> Union[AnalysisModuleType, None]:
         """Returns the registered AnalysisModuleType by name, or None if it has not been or is no longer registered."""
         assert isinstance(name, str)
-        return await self.i_get_analysis_module_type(name)
-
-    async def i_get_analysis_module_type(self, name: str) -> Union[AnalysisModuleType, None]:
-        raise NotImplementedError()
+        amt = (await self.get_analysis_module_type_index()).amts.get(name)
+        # the index is shared so callers get their own copy
+        return amt.copy() if amt is not None else None
 
     @coreapi
     async def get_all_analysis_module_types(self) -> list[AnalysisModuleType]:
         """Returns the full list of all registered analysis module types."""
-        return await self.i_get_all_analysis_module_types()
+        return [amt.copy() for amt in (await self.get_analysis_module_type_index()).amts.values()]
 
     async def i_get_all_analysis_module_types(self) -> list[AnalysisModuleType]:
         raise NotImplementedError()
 
+    def _invalidate_analysis_module_type_index_on_event(self, event: Event):
+        # the systems also receive their own events, which are ignored if the index is already up to date
+        amt_index = self.amt_index
+        if amt_index is not None and event.args:
+            amt = AnalysisModuleType.from_dict(event.args)
+            current_amt = amt_index.amts.get(amt.name)
+            if event.name == EVENT_AMT_DELETED and current_amt is None:
+                return
+
+            if event.name != EVENT_AMT_DELETED and current_amt == amt:
+                return
+
+        self.invalidate_analysis_module_type_index()
+
+    def invalidate_analysis_module_type_index(self):
+        """Discards the current AnalysisModuleTypeIndex. The next call to get_analysis_module_type_index rebuilds it."""
+        self.amt_generation += 1
+        self.amt_index = None
+
+    async def get_analysis_module_type_index(self) -> AnalysisModuleTypeIndex:
+        """Returns the AnalysisModuleTypeIndex of all registered analysis module types.
+        The index is rebuilt when analysis module types are added, modified or deleted,
+        and when it is older than amt_index_ttl seconds.
+        NOTE the types in the index are shared and must not be modified."""
+
+        # make sure we're listening for changes made by other systems
+        # NOTE the handler is discarded when the event handlers are reset
+        if self.amt_index_event_handler is None:
+            self.amt_index_event_handler = CacheInvalidationEventHandler(
+                "analysis module type index", self._invalidate_analysis_module_type_index_on_event
+            )
+
+        if self.amt_index_event_handler not in await self.get_event_handlers(EVENT_AMT_NEW):
+            for event in [EVENT_AMT_NEW, EVENT_AMT_MODIFIED, EVENT_AMT_DELETED]:
+                await self.register_event_handler(event, self.amt_index_event_handler)
+
+            self.invalidate_analysis_module_type_index()
+
+        amt_index = self.amt_index
+        if amt_index is None or time.monotonic() >= self.amt_index_expires:
+            get_logger().debug("building analysis module type index")
+            generation = self.amt_generation
+            expires = time.monotonic() + self.amt_index_ttl
+            amt_index = AnalysisModuleTypeIndex(await self.i_get_all_analysis_module_types(), generation)
+
+            # if the types changed while we were loading them then this index is already out of date
+            # it's still used for this call but it's not kept
+            if generation == self.amt_generation:
+                self.amt_index = amt_index
+                self.amt_index_expires = expires
+
+        return amt_index
+
     async def _circ_dep_check(
         self,
         source_amt: AnalysisModuleType,
@@ -3,9 +3,10 @@
 #
 #
 
-from typing import Union
+from typing import Any, Optional, Union
 
 from ace import coreapi
+from ace.codec import get_codec
 from ace.logging import get_logger
 from ace.constants import *
 from ace.system.requests import AnalysisRequest
@@ -35,6 +36,29 @@ class AnalysisRequestTrackingBaseInterface:
     async def i_track_analysis_request(self, request: AnalysisRequest):
         raise NotImplementedError()
 
+    @coreapi
+    async def track_analysis_requests(self, requests: list[AnalysisRequest], session: Optional[Any] = None):
+        """Begins tracking all of the given AnalysisRequests in a single operation.
+        The optional session is a backend specific transaction (such as a database session)
+        that the caller commits. Otherwise the operation is committed before returning."""
+        assert isinstance(requests, list)
+        assert all([isinstance(_, AnalysisRequest) for _ in requests])
+        if not requests:
+            return
+
+        for amt_name in {_.type.name for _ in requests if _.type}:
+            if await self.get_analysis_module_type(amt_name) is None:
+                raise UnknownAnalysisModuleTypeError()
+
+        get_logger().debug(f"tracking {len(requests)} analysis requests")
+        await self.i_track_analysis_requests(requests, session=session)
+        for request in requests:
+            await self.fire_event(EVENT_AR_NEW, request)
+
+    async def i_track_analysis_requests(self, requests: list[AnalysisRequest], session: Optional[Any] = None):
+        for request in requests:
+            await self.i_track_analysis_request(request)
+
     @coreapi
     async def lock_analysis_request(self, request: AnalysisRequest) -> bool:
         """Attempts to lock the request. Returns True if successful, False otherwise.
@@ -90,6 +114,29 @@ class AnalysisRequestTrackingBaseInterface:
     async def i_delete_analysis_request(self, key: str) -> bool:
         raise NotImplementedError()
 
+    @coreapi
+    async def delete_analysis_requests(
+        self, targets: list[Union[AnalysisRequest, str]], session: Optional[Any] = None
+    ) -> int:
+        """Deletes all of the given AnalysisRequests (or request ids) in a single operation.
+        Returns the number of requests deleted. See track_analysis_requests for the session parameter."""
+        assert isinstance(targets, list)
+        keys = [_.id if isinstance(_, AnalysisRequest) else _ for _ in targets]
+        assert all([isinstance(_, str) for _ in keys])
+        if not keys:
+            return 0
+
+        get_logger().debug(f"deleting {len(keys)} analysis requests")
+        deleted = await self.i_delete_analysis_requests(keys, session=session)
+        for key in deleted:
+            await self.fire_event(EVENT_AR_DELETED, key)
+
+        return len(deleted)
+
+    async def i_delete_analysis_requests(self, keys: list[str], session: Optional[Any] = None) -> list[str]:
+        """Deletes the given requests. Returns the ids of the requests that were deleted."""
+        return [key for key in keys if await self.i_delete_analysis_request(key)]
+
     @coreapi
     async def get_expired_analysis_requests(self) -> list[AnalysisRequest]:
         """Returns all AnalysisRequests that are in the TRACKING_STATUS_ANALYZING state and have expired."""
@@ -109,6 +156,18 @@ class AnalysisRequestTrackingBaseInterface:
     async def i_get_analysis_request_by_request_id(self, key: str) -> Union[AnalysisRequest, None]:
         raise NotImplementedError()
 
+    @coreapi
+    async def get_analysis_requests_by_request_ids(self, request_ids: list[str]) -> list[AnalysisRequest]:
+        """Returns the requests for the given ids (in the same order.) Unknown requests are not included."""
+        assert isinstance(request_ids, list)
+        if not request_ids:
+            return []
+
+        return await self.i_get_analysis_requests_by_request_ids(request_ids)
+
+    async def i_get_analysis_requests_by_request_ids(self, keys: list[str]) -> list[AnalysisRequest]:
+        raise NotImplementedError()
+
     @coreapi
     async def get_analysis_request_by_observable(
         self, observable: Observable, amt: AnalysisModuleType
@@ -166,13 +225,34 @@ class AnalysisRequestTrackingBaseInterface:
             return await self.process_analysis_request(ar)
 
         # otherwise we assign this request to the appropriate work queue based on the amt
-        await self.put_work(ar.type, ar)
+        # (once the request is visible to whoever picks it up)
+        await self.after_unit_of_work(self.put_work, ar.type, ar)
 
     @coreapi
     async def process_analysis_request(self, ar: AnalysisRequest):
         """Processes an analysis request.
-        This function implements the core logic of the system."""
-
+        This function implements the core logic of the system.
+        All of the processing is done in a single unit of work (see run_in_unit_of_work).
+        Events, alerts and work queue changes happen once the unit of work completes."""
+        # a unit of work that fails is tried again from the start (see run_in_unit_of_work)
+        # processing modifies the request (and the root) so the attempts after the first one
+        # work with a copy of the request as it was before the first attempt
+        snapshot = get_codec().encode_request(ar)
+        attempts = 0
+
+        async def _attempt():
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                return await self._process_analysis_request(ar)
+
+            request = get_codec().decode_request(snapshot, self)
+            request.cache_hit = ar.cache_hit
+            return await self._process_analysis_request(request)
+
+        return await self.run_in_unit_of_work(_attempt)
+
+    async def _process_analysis_request(self, ar: AnalysisRequest):
         get_logger().info(f"processing {ar}")
         target_root = None
 
@@ -231,18 +311,6 @@ class AnalysisRequestTrackingBaseInterface:
                 raise UnknownObservableError(ar.observable)
 
             target_observable.apply_diff_merge(original_observable, modified_observable, ar.type)
-            await target_root.update_and_save()
-
-            await self.fire_event(EVENT_PROCESSING_REQUEST_RESULT, ar)
-            # TODO fire event if analysis failed
-
-            # process any analysis request links
-            for linked_request in await self.get_linked_analysis_requests(ar):
-                linked_request.initialize_result()
-                linked_request.original_root = ar.original_root
-                linked_request.modified_root = ar.modified_root
-                get_logger().debug(f"processing linked analysis request {linked_request} from {ar}")
-                await self.process_analysis_request(linked_request)
 
         elif ar.is_root_analysis_request:
             # are we updating an existing root analysis?
@@ -253,91 +321,62 @@ class AnalysisRequestTrackingBaseInterface:
                 # otherwise we just save the new one
                 target_root = ar.root
 
-            await target_root.update_and_save()
-            await self.fire_event(EVENT_PROCESSING_REQUEST_ROOT, ar)
-
         # this should never fire
         if target_root is None:
             get_logger().critical("hit unexpected code branch")
             raise RuntimeError("target_root is None")
 
-        # did we generate an alert?
-        if not target_root.analysis_cancelled and target_root.has_detections():
-            await self.submit_alert(target_root)
+        # all modifications made to the root while processing this request are saved in a single write
+        # anything that (re)loads the root (linked requests, cache hits, new work) waits until it's saved
+        cache_hits = []  # list of (observable, AnalysisRequest)
+        new_requests = []  # list of AnalysisRequest
 
         # for each observable that needs to be analyzed
         if not target_root.analysis_cancelled:
             get_logger().debug(f"processing {target_root}")
-            for observable in ar.observables:
-                for amt in await self.get_all_analysis_module_types():
-                    # does this analysis module accept this observable?
-                    if not await amt.accepts(observable, self):
-                        continue
-
-                    # is this analysis request already completed?
-                    if target_root.analysis_completed(observable, amt):
-                        continue
-
-                    # is this analysis request for this RootAnalysis already being tracked?
-                    if target_root.analysis_tracked(observable, amt):
-                        continue
-
-                    # is this observable being analyzed by another root analysis?
-                    # NOTE if the analysis module does not support caching
-                    # then get_analysis_request_by_observable always returns None
-                    tracked_ar = await self.get_analysis_request_by_observable(observable, amt)
-
-                    # at this point we know we're going to create a request to analyze this
-                    new_ar = observable.create_analysis_request(amt)
-                    await self.track_analysis_request(new_ar)
-
-                    if tracked_ar and tracked_ar != ar:
-                        try:
-                            # tell that AR to update the details of this analysis as well when it's done
-                            # if link_analysis_requests returns False it means it was unable to link it
-                            if await self.link_analysis_requests(tracked_ar, new_ar):
-                                observable.track_analysis_request(new_ar)
-                                # track_analysis_request(new_ar)
-                                await target_root.update_and_save()
-                                # and then that's it for this request
-                                # it waits for tracked_ar to complete
-                                continue
-
-                            # oh well -- it could be in the cache
-
-                        except Exception as e:  # TODO what can be thrown here?
-                            raise e
-
-                    # is this analysis in the cache?
-                    cached_result = await self.get_cached_analysis_result(observable, amt)
-                    if cached_result:
-                        get_logger().debug(
-                            f"using cached result {cached_result} for {observable} type {amt} in {target_root}"
-                        )
-
-                        new_ar.original_root = cached_result.original_root
-                        new_ar.modified_root = cached_result.modified_root
-                        new_ar.cache_hit = True
-                        await self.track_analysis_request(new_ar)
-                        observable.track_analysis_request(new_ar)
-                        await target_root.update_and_save()
-                        await self.fire_event(EVENT_CACHE_HIT, [target_root, observable, new_ar])
-                        await self.process_analysis_request(new_ar)
-                        continue
-
-                    # otherwise we need to request it
-                    get_logger().info(
-                        f"creating new analysis request for observable {observable} amt {amt} root {target_root}"
-                    )
-                    # (we also track the request inside the RootAnalysis object)
-                    observable.track_analysis_request(new_ar)
-                    # track_analysis_request(new_ar)
-                    await target_root.update_and_save()
-                    await self.fire_event(EVENT_PROCESSING_REQUEST_OBSERVABLE, new_ar)
-                    await self.queue_analysis_request(new_ar)
-                    continue
+            pending_requests = await self._get_pending_analysis_requests(ar, target_root)
+
+            # the new requests need to be tracked before they can be linked to
+            await self.track_analysis_requests([new_ar for _, _, _, new_ar in pending_requests])
+            cache_hits, new_requests = await self._dispatch_pending_analysis_requests(ar, target_root, pending_requests)
+
+            # update the tracking of the requests that were found in the cache
+            await self.track_analysis_requests([new_ar for _, new_ar in cache_hits])
+
+        await target_root.update_and_save()
+
+        if ar.is_observable_analysis_result:
+            await self.fire_event(EVENT_PROCESSING_REQUEST_RESULT, ar)
+            # TODO fire event if analysis failed
+
+            # process any analysis request links
+            for linked_request in await self.get_linked_analysis_requests(ar):
+                linked_request.initialize_result()
+                linked_request.original_root = ar.original_root
+                linked_request.modified_root = ar.modified_root
+                get_logger().debug(f"processing linked analysis request {linked_request} from {ar}")
+                await self.process_analysis_request(linked_request)
+
+        elif ar.is_root_analysis_request:
+            await self.fire_event(EVENT_PROCESSING_REQUEST_ROOT, ar)
+
+        # did we generate an alert?
+        if not target_root.analysis_cancelled and target_root.has_detections():
+            await self.after_unit_of_work(self.submit_alert, target_root)
+
+        for observable, new_ar in cache_hits:
+            await self.fire_event(EVENT_CACHE_HIT, [target_root, observable, new_ar])
+            await self.process_analysis_request(new_ar)
+
+        for new_ar in new_requests:
+            await self.fire_event(EVENT_PROCESSING_REQUEST_OBSERVABLE, new_ar)
+            await self.queue_analysis_request(new_ar)
 
         # at this point this AnalysisRequest is no longer needed
+        # (it stays in the work queue until the result is committed)
+        if ar.is_observable_analysis_result:
+            await self.after_unit_of_work(self.ack_work, ar.type, ar)
+
         await self.delete_analysis_request(ar)
 
         # has all the analysis completed for this root?
@@ -350,3 +389,89 @@ class AnalysisRequestTrackingBaseInterface:
             get_logger().debug(f"deleting expired root analysis {ar.root}")
             await self.fire_event(EVENT_ANALYSIS_ROOT_EXPIRED, ar.root)
             await self.delete_root_analysis(ar.root)
+
+    async def _get_pending_analysis_requests(
+        self, ar: AnalysisRequest, target_root: RootAnalysis
+    ) -> list[tuple[Observable, AnalysisModuleType, Optional[AnalysisRequest], AnalysisRequest]]:
+        """Returns the analysis requests needed for the observables of the given request as a list of
+        (observable, amt, tracked AnalysisRequest, new AnalysisRequest) tuples.
+        The tracked request is the request (of any root) already analyzing the observable, or None."""
+        result = []
+        amt_index = await self.get_analysis_module_type_index()
+        # the root is not modified while we check what accepts the observables
+        # so the buffers rendered for regex conditions are shared by all the checks
+        condition_buffers = {}
+        for observable in ar.observables:
+            # results can reference observables in a partial copy of the root
+            # so we work with the observables of the target root
+            if ar.is_observable_analysis_result:
+                target_observable = target_root.get_observable(observable)
+                if not target_observable:
+                    get_logger().warning(f"cannot find {observable} in target root {target_root}")
+                    continue
+
+                observable = target_observable
+
+            # only check the types that could possibly accept this observable
+            for amt in amt_index.get_candidates(observable):
+                # does this analysis module accept this observable?
+                if not await amt.accepts(observable, self, condition_buffers):
+                    continue
+
+                # is this analysis request already completed?
+                if target_root.analysis_completed(observable, amt):
+                    continue
+
+                # is this analysis request for this RootAnalysis already being tracked?
+                if target_root.analysis_tracked(observable, amt):
+                    continue
+
+                # is this observable being analyzed by another root analysis?
+                # NOTE if the analysis module does not support caching
+                # then get_analysis_request_by_observable always returns None
+                tracked_ar = await self.get_analysis_request_by_observable(observable, amt)
+
+                # at this point we know we're going to create a request to analyze this
+                result.append((observable, amt, tracked_ar, observable.create_analysis_request(amt)))
+
+        return result
+
+    async def _dispatch_pending_analysis_requests(
+        self,
+        ar: AnalysisRequest,
+        target_root: RootAnalysis,
+        pending_requests: list[tuple[Observable, AnalysisModuleType, Optional[AnalysisRequest], AnalysisRequest]],
+    ) -> tuple[list[tuple[Observable, AnalysisRequest]], list[AnalysisRequest]]:
+        """Links each pending request to the request already analyzing the observable,
+        or else uses the cached result, or else requests the analysis. Each request is tracked in the root.
+        Returns a tuple of (list of (observable, AnalysisRequest) cache hits, list of new AnalysisRequest.)"""
+        cache_hits = []
+        new_requests = []
+        for observable, amt, tracked_ar, new_ar in pending_requests:
+            # tell that AR to update the details of this analysis as well when it's done
+            # if link_analysis_requests returns False it means it was unable to link it
+            # (oh well -- it could be in the cache)
+            if tracked_ar and tracked_ar != ar and await self.link_analysis_requests(tracked_ar, new_ar):
+                # and then that's it for this request
+                # it waits for tracked_ar to complete
+                observable.track_analysis_request(new_ar)
+                continue
+
+            # is this analysis in the cache?
+            cached_result = await self.get_cached_analysis_result(observable, amt)
+            if cached_result:
+                get_logger().debug(f"using cached result {cached_result} for {observable} type {amt} in {target_root}")
+                new_ar.original_root = cached_result.original_root
+                new_ar.modified_root = cached_result.modified_root
+                new_ar.cache_hit = True
+                observable.track_analysis_request(new_ar)
+                cache_hits.append((observable, new_ar))
+                continue
+
+            # otherwise we need to request it
+            get_logger().info(f"creating new analysis request for observable {observable} amt {amt} root {target_root}")
+            # (we also track the request inside the RootAnalysis object)
+            observable.track_analysis_request(new_ar)
+            new_requests.append(new_ar)
+
+        return cache_hits, new_requests
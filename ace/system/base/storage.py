@@ -33,7 +33,38 @@ class MetaComputation:
         return self.m.hexdigest().lower()
 
 
+async def slice_content(
+    source: AsyncGenerator[bytes, None], offset: int = 0, length: Optional[int] = None
+) -> AsyncGenerator[bytes, None]:
+    """Yields length bytes (or everything if length is None) of the source after skipping offset bytes."""
+    try:
+        async for chunk in source:
+            if offset >= len(chunk):
+                offset -= len(chunk)
+                continue
+
+            chunk = chunk[offset:]
+            offset = 0
+
+            if length is not None:
+                chunk = chunk[:length]
+                length -= len(chunk)
+
+            if chunk:
+                yield chunk
+
+            if length == 0:
+                break
+    finally:
+        await source.aclose()
+
+
 class StorageBaseInterface:
+
+    # the size of the chunks content is read, written and encrypted in (in bytes)
+    # the same size is used through the whole pipeline so that chunks are not split and joined again
+    storage_chunk_size = 1024 * 1024
+
     async def storage_encryption_enabled(self) -> bool:
         """Returns True if encryption is configured and storage is configured to be encrypted."""
         # the settings need to be configured
@@ -86,14 +117,14 @@ class StorageBaseInterface:
         async def _reader(target) -> AsyncGenerator[bytes, None]:
             async def _read() -> bytes:
                 if isinstance(target, io.BytesIO):
-                    return target.read(io.DEFAULT_BUFFER_SIZE)
+                    return target.read(self.storage_chunk_size)
                 elif isinstance(target, AsyncGenerator):
                     try:
                         return await target.__anext__()
                     except StopAsyncIteration:
                         return None
                 else:
-                    return await target.read(io.DEFAULT_BUFFER_SIZE)
+                    return await target.read(self.storage_chunk_size)
 
             while True:
                 chunk = await _read()
@@ -109,7 +140,7 @@ class StorageBaseInterface:
         if await self.storage_encryption_enabled():
             # if storage encryption is enabled then the source_content becomes
             # the *output* of the encryption process
-            source = iter_encrypt_stream(self.encryption_settings.aes_key, source)
+            source = iter_encrypt_stream(self.encryption_settings.aes_key, source, chunk_size=self.storage_chunk_size)
 
         sha256 = await self.i_store_content(source, meta_computation, meta)
         await self.fire_event(EVENT_STORAGE_NEW, [sha256, meta])
@@ -148,17 +179,38 @@ class StorageBaseInterface:
 
     @coreapi
     async def iter_content(
-        self, sha256: str, buffer_size: Optional[int] = io.DEFAULT_BUFFER_SIZE
+        self, sha256: str, buffer_size: Optional[int] = None, offset: int = 0, length: Optional[int] = None
     ) -> Union[AsyncGenerator[bytes, None], None]:
+        """Returns an AsyncGenerator that yields the content in chunks of (at most) buffer_size bytes.
+        buffer_size defaults to storage_chunk_size. offset and length select a range of the content."""
+        assert offset >= 0
+        assert length is None or length >= 0
+
+        if buffer_size is None:
+            buffer_size = self.storage_chunk_size
 
         if await self.storage_encryption_enabled():
-            return iter_decrypt_stream(self.encryption_settings.aes_key, self.i_iter_content(sha256, buffer_size))
+            # encrypted content has to be decrypted from the start
+            source = iter_decrypt_stream(self.encryption_settings.aes_key, self.i_iter_content(sha256, buffer_size))
+            if offset or length is not None:
+                source = slice_content(source, offset, length)
+
+            return source
         else:
-            return self.i_iter_content(sha256, buffer_size)
+            return self.i_iter_content(sha256, buffer_size, offset, length)
 
-    async def i_iter_content(self, sha256: str, buffer_size: int) -> Union[AsyncGenerator[bytes, None], None]:
+    async def i_iter_content(
+        self, sha256: str, buffer_size: int, offset: int = 0, length: Optional[int] = None
+    ) -> Union[AsyncGenerator[bytes, None], None]:
+        """Yields the stored content in chunks of (at most) buffer_size bytes.
+        offset and length select a range of the content."""
         raise NotImplementedError()
 
+    async def get_local_content_path(self, sha256: str) -> Optional[str]:
+        """Returns the path to a local file that contains the content as-is (not encrypted),
+        or None if there is no such file. Used to serve content directly from the file."""
+        return None
+
     @coreapi
     async def load_file(self, sha256: str, path: str) -> Union[ContentMetadata, None]:
         return await self.i_load_file(sha256, path)
@@ -187,6 +239,17 @@ class StorageBaseInterface:
         """Returns the meta data of the stored content, or None if the content does not exist."""
         raise NotImplementedError()
 
+    @coreapi
+    async def content_exists(self, sha256: str) -> bool:
+        """Returns True if content with the given sha256 hash is already stored.
+        Clients that already know the hash of the content can use this to avoid storing it again."""
+        assert isinstance(sha256, str) and sha256
+        return await self.i_content_exists(sha256.lower())
+
+    async def i_content_exists(self, sha256: str) -> bool:
+        """Returns True if the content exists. By default this checks for the meta data of the content."""
+        return await self.i_get_content_meta(sha256) is not None
+
     @coreapi
     async def iter_expired_content(self) -> Iterator[ContentMetadata]:
         """Returns an iterator for all the expired content."""
@@ -241,7 +304,7 @@ class StorageBaseInterface:
         async for meta in await self.iter_expired_content():
             root_exists = False
             for root_uuid in meta.roots:
-                if await self.analyis_tracking.get_root_analysis(root_uuid) is not None:
+                if await self.get_root_analysis(root_uuid) is not None:
                     root_exists = True
                     break
 
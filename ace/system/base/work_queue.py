@@ -11,10 +11,19 @@ from ace.constants import *
 from ace.system.requests import AnalysisRequest
 from ace.crypto import EncryptionSettings
 from ace.logging import get_logger
-from ace.exceptions import AnalysisModuleTypeVersionError, AnalysisModuleTypeExtendedVersionError
+from ace.exceptions import (
+    AnalysisModuleTypeVersionError,
+    AnalysisModuleTypeExtendedVersionError,
+    UnknownAnalysisModuleTypeError,
+)
 
 
 class WorkQueueBaseInterface:
+
+    # set to True if the work queue keeps track of the work it hands out until it is acknowledged
+    # expired work is then re-queued by requeue_expired_work instead of scanning the tracked requests
+    reliable_work_queue: bool = False
+
     @coreapi
     async def delete_work_queue(self, amt: Union[AnalysisModuleType, str]) -> bool:
         assert isinstance(amt, AnalysisModuleType) or isinstance(amt, str)
@@ -94,6 +103,79 @@ class WorkQueueBaseInterface:
         """
         raise NotImplementedError()
 
+    @coreapi
+    async def get_work_batch(
+        self, amt: Union[AnalysisModuleType, str], timeout: int, count: int
+    ) -> list[AnalysisRequest]:
+        assert isinstance(amt, AnalysisModuleType) or isinstance(amt, str)
+        assert isinstance(timeout, int)
+        assert isinstance(count, int) and count > 0
+
+        if isinstance(amt, AnalysisModuleType):
+            amt = amt.name
+
+        result = await self.i_get_work_batch(amt, timeout, count)
+        for request in result:
+            await self.fire_event(EVENT_WORK_REMOVE, [amt, request])
+
+        return result
+
+    async def i_get_work_batch(self, amt: str, timeout: int, count: int) -> list[AnalysisRequest]:
+        """Gets up to count AnalysisRequest objects from the work queue for the given type.
+        Waits up to timeout seconds for the first request, the rest are only taken if they are already available.
+        Returns an empty list if no content is available."""
+        raise NotImplementedError()
+
+    @coreapi
+    async def ack_work(self, amt: Union[AnalysisModuleType, str], analysis_request: AnalysisRequest) -> bool:
+        """Acknowledges that the given AnalysisRequest (taken from the work queue) has been processed.
+        Returns True if the work queue was still tracking the request, False otherwise."""
+        assert isinstance(amt, AnalysisModuleType) or isinstance(amt, str)
+        assert isinstance(analysis_request, AnalysisRequest)
+
+        if not self.reliable_work_queue:
+            return False
+
+        if isinstance(amt, AnalysisModuleType):
+            amt = amt.name
+
+        return await self.i_ack_work(amt, analysis_request.id)
+
+    async def i_ack_work(self, amt: str, request_id: str) -> bool:
+        """Stops tracking the given request that was taken from the work queue.
+        Only reliable work queues need to implement this."""
+        raise NotImplementedError()
+
+    @coreapi
+    async def requeue_expired_work(self, amt: Union[AnalysisModuleType, str]) -> int:
+        """Moves all work that was taken from the work queue and has not been acknowledged in time back into the queue.
+        Returns the number of requests that were re-queued."""
+        assert isinstance(amt, AnalysisModuleType) or isinstance(amt, str)
+
+        if isinstance(amt, AnalysisModuleType):
+            amt = amt.name
+
+        request_ids = await self.i_get_expired_work(amt)
+        if not request_ids:
+            return 0
+
+        # get the most recent copy of the analysis requests (some may have been deleted)
+        result = 0
+        for request in await self.get_analysis_requests_by_request_ids(request_ids):
+            await self.fire_event(EVENT_AR_EXPIRED, request)
+            try:
+                await self.queue_analysis_request(request)
+                result += 1
+            except UnknownAnalysisModuleTypeError:
+                await self.delete_analysis_request(request)
+
+        return result
+
+    async def i_get_expired_work(self, amt: str) -> list[str]:
+        """Stops tracking all work taken from the work queue that has expired and returns the ids of the requests.
+        Only reliable work queues need to implement this."""
+        raise NotImplementedError()
+
     @coreapi
     async def get_queue_size(self, amt: Union[AnalysisModuleType, str]) -> int:
         assert isinstance(amt, AnalysisModuleType) or isinstance(amt, str)
@@ -133,8 +215,29 @@ class WorkQueueBaseInterface:
         Returns:
             An AnalysisRequest to be processed, or None if no work requests are available."""
 
+        result = await self.get_next_analysis_requests(owner_uuid, amt, 1, timeout, version, extended_version)
+        return result[0] if result else None
+
+    @coreapi
+    async def get_next_analysis_requests(
+        self,
+        owner_uuid: str,
+        amt: Union[AnalysisModuleType, str],
+        count: int,
+        timeout: Optional[int] = 0,
+        version: Optional[str] = None,
+        extended_version: Optional[dict[str, str]] = {},
+    ) -> list[AnalysisRequest]:
+        """Returns up to count AnalysisRequest objects for the given AnalysisModuleType.
+        All of the returned requests are assigned to the given owner.
+        See get_next_analysis_request for a description of the parameters.
+
+        Returns:
+            A list of AnalysisRequest objects to be processed, or an empty list if no work requests are available."""
+
         assert isinstance(owner_uuid, str) and owner_uuid
         assert isinstance(amt, AnalysisModuleType) or (isinstance(amt, str) and amt)
+        assert isinstance(count, int) and count > 0
         assert isinstance(timeout, int)
         assert version is None or (isinstance(version, str) and version)
         assert isinstance(extended_version, dict)
@@ -158,28 +261,43 @@ class WorkQueueBaseInterface:
             raise AnalysisModuleTypeExtendedVersionError(amt, existing_amt)
 
         # make sure expired analysis requests go back in the work queues
-        await self.process_expired_analysis_requests(amt)
+        # (when the maintenance task is running it takes care of the tracked requests)
+        if self.reliable_work_queue:
+            await self.requeue_expired_work(amt)
+        elif self.maintenance_task is None:
+            await self.process_expired_analysis_requests(amt)
 
         # we don't need to do any locking here because of how the work queues work
         while True:
-            next_ar = await self.get_work(amt, timeout)
-
-            if next_ar:
-                # get the most recent copy of the analysis request
-                next_ar = await self.get_analysis_request_by_request_id(next_ar.id)
-                # if it was deleted then we ignore it and move on to the next one
-                # this can happen if the request is deleted while it's waiting in the queue
-                if not next_ar:
-                    get_logger().warning("unknown request {next_ar} aquired from work queue for {amt}")
+            work = await self.get_work_batch(amt, timeout, count)
+            if not work:
+                return []
+
+            # get the most recent copy of the analysis requests
+            result = await self.get_analysis_requests_by_request_ids([_.id for _ in work])
+
+            # if any were deleted then we ignore them
+            # this can happen if the request is deleted while it's waiting in the queue
+            if len(result) != len(work):
+                known_ids = set([_.id for _ in result])
+                for request in work:
+                    if request.id not in known_ids:
+                        get_logger().warning(f"unknown request {request} aquired from work queue for {amt}")
+
+                # and if they were all deleted we move on to the next ones
+                if not result:
                     continue
 
-                # set the owner, status then update
+            # set the owner, status then update them all at once
+            for next_ar in result:
                 next_ar.owner = owner_uuid
                 next_ar.status = TRACKING_STATUS_ANALYZING
                 get_logger().debug(f"assigned analysis request {next_ar} to {owner_uuid}")
-                await self.track_analysis_request(next_ar)
+
+            await self.track_analysis_requests(result)
+            for next_ar in result:
                 await self.fire_event(EVENT_WORK_ASSIGNED, next_ar)
 
-            return next_ar
+            return result
 
     encryption_settings: EncryptionSettings = None
@@ -11,14 +11,15 @@ import time
 import warnings
 
 from contextlib import asynccontextmanager
-from typing import Union
+from contextvars import ContextVar
+from typing import Optional, Union
 
 import ace
 
 from ace.system import ACESystem
 
 from ace.logging import get_logger
-from sqlalchemy import event
+from sqlalchemy import event, text
 from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm.session import Session, sessionmaker
@@ -33,11 +34,47 @@ from ace.system.database.module_tracking import DatabaseAnalysisModuleTrackingIn
 from ace.system.database.request_tracking import DatabaseAnalysisRequestTrackingInterface
 from ace.system.local.storage import LocalStorageInterface
 
-
 CONFIG_DB_URL = "/ace/core/sqlalchemy/url"
 CONFIG_DB_KWARGS = "/ace/core/sqlalchemy/kwargs"
 
 
+class UnitOfWork:
+    """A database transaction shared by all the operations performed by a task in a unit of work."""
+
+    def __init__(self, system: "DatabaseACESystem", session: AsyncSession):
+        self.system = system
+        self.session = session
+        self.task = asyncio.current_task()
+        # list of (function, args, kwargs) to call after the transaction is committed
+        self.deferred = []
+
+
+class UnitOfWorkSession:
+    """Wraps the session of a unit of work for the operations that join it.
+    Calling commit() only flushes the changes. The unit of work commits once when it completes."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def commit(self):
+        await self.session.flush()
+
+
+# the unit of work in progress, if any
+current_unit_of_work: ContextVar[Optional[UnitOfWork]] = ContextVar("current_unit_of_work", default=None)
+
+
+def is_deadlock_error(e: DBAPIError) -> bool:
+    """Returns True if the given error was raised because of a deadlock (or lock wait timeout.)
+    For sqlite this is a transaction that could not get the write lock.
+    The string DEADLOCK can be RAISEd to fake it in sqlite."""
+    args = getattr(e.orig, "args", None)
+    return bool(args) and args[0] in (1213, 1205, "DEADLOCK", "database is locked")
+
+
 class DatabaseACESystem(
     DatabaseAnalysisTrackingInterface,
     DatabaseAnalysisModuleTrackingInterface,
@@ -57,6 +94,9 @@ class DatabaseACESystem(
 
     engine = None
 
+    # the maximum number of times a unit of work is attempted when a deadlock is detected
+    unit_of_work_attempts: int = 3
+
     def __init__(self, *args, db_url=None, db_kwargs={}, **kwargs):
         super().__init__(*args, **kwargs)
         self.db_url = db_url
@@ -91,15 +131,81 @@ class DatabaseACESystem(
         await super().initialize()
 
     @asynccontextmanager
-    async def get_db(self) -> AsyncSession:
-        """Returns the a database session."""
-        session = None
-        if self.engine is None:
+    async def get_db(self, session: Optional[AsyncSession] = None) -> AsyncSession:
+        """Returns the a database session. If a session is passed in then that session is returned instead.
+        (the caller is then responsible for committing it.)"""
+        if session is not None:
+            yield session
+        elif (unit := self.get_unit_of_work()) is not None:
+            # each operation gets a savepoint so that a failed operation does not end the unit of work
+            try:
+                async with unit.session.begin_nested():
+                    yield UnitOfWorkSession(unit.session)
+            finally:
+                # operations do not share loaded objects (as if each had used their own session)
+                unit.session.expunge_all()
+        elif self.engine is None:
             yield None
         else:
             async with self.async_session() as session:
                 yield session
 
+    def get_unit_of_work(self) -> Optional[UnitOfWork]:
+        """Returns the unit of work the current task is performing for this system, or None if there isn't one."""
+        unit = current_unit_of_work.get()
+        # tasks started during a unit of work inherit the context but do not take part in it
+        if unit is None or unit.system is not self or unit.task is not asyncio.current_task():
+            return None
+
+        return unit
+
+    async def run_in_unit_of_work(self, function, *args, **kwargs):
+        if self.get_unit_of_work() is not None or self.engine is None:
+            return await function(*args, **kwargs)
+
+        attempt = 1
+        while True:
+            try:
+                async with self.async_session() as session:
+                    if self.engine.dialect.name == "sqlite":
+                        # the sqlite driver does not start a transaction until something is modified
+                        # so start one now to keep the unit of work in one transaction
+                        # the write lock is not taken until the first write
+                        # (failing to get it is treated like a deadlock and the unit of work is tried again)
+                        await session.execute(text("BEGIN"))
+
+                    unit = UnitOfWork(self, session)
+                    token = current_unit_of_work.set(unit)
+                    try:
+                        result = await function(*args, **kwargs)
+                        await session.commit()
+                    finally:
+                        current_unit_of_work.reset(token)
+
+                break
+
+            except DBAPIError as e:
+                # the entire unit of work is tried again
+                if is_deadlock_error(e) and attempt < self.unit_of_work_attempts:
+                    get_logger().warning(f"deadlock detected in unit of work -- trying again (attempt #{attempt})")
+                    attempt += 1
+                    await asyncio.sleep(random.uniform(0, 1))
+                    continue
+
+                raise
+
+        for deferred_function, deferred_args, deferred_kwargs in unit.deferred:
+            await deferred_function(*deferred_args, **deferred_kwargs)
+
+        return result
+
+    async def after_unit_of_work(self, function, *args, **kwargs):
+        unit = self.get_unit_of_work()
+        if unit is None:
+            return await function(*args, **kwargs)
+
+        unit.deferred.append((function, args, kwargs))
+
     async def execute_with_retry(
         self,
         db: AsyncSession,
@@ -182,7 +288,7 @@ class DatabaseACESystem(
                 if callable(sql_or_func):
                     results.append(sql_or_func(db, *params))
                 else:
-                    for (_sql, _params) in zip(sql_or_func, params):
+                    for _sql, _params in zip(sql_or_func, params):
                         result = await db.execute(_sql, _params)
                         results.append(result.rowcount)
 
@@ -279,14 +385,8 @@ class DatabaseACESystem(
                     return last_result
 
                 except (DBAPIError, IntegrityError) as e:
-                    # catch the deadlock error ids 1213 and 1205
-                    # NOTE this is for MySQL only
-                    if (
-                        e.orig.args[0] == 1213
-                        or e.orig.args[0] == 1205
-                        or (isinstance(e.orig.args[0], str) and e.orig.args[0] == "DEADLOCK")
-                        and current_attempt < attempts
-                    ):
+                    # inside of a unit of work the entire unit of work is tried again instead
+                    if is_deadlock_error(e) and current_attempt < attempts and self.get_unit_of_work() is None:
                         get_logger().debug(
                             f"DEADLOCK STATEMENT attempt #{current_attempt + 1} SQL {e.statement} PARAMS {e.params}"
                         )
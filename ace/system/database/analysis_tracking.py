@@ -1,23 +1,181 @@
 # vim: sw=4:ts=4:et:cc=120
 
+import hashlib
 import json
 import uuid
 
-from typing import Any, Union
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Union
 
 import ace
 
 from ace.analysis import RootAnalysis
+from ace.codec import Codec, get_codec
+from ace.compression import compress_text, decompress_text
 from ace.system.base import AnalysisTrackingBaseInterface
-from ace.system.database.schema import RootAnalysisTracking, AnalysisDetailsTracking
+from ace.system.database.schema import (
+    AnalysisDetailsTracking,
+    AnalysisRequestTracking,
+    ObservableTracking,
+    RootAnalysisDelta,
+    RootAnalysisTracking,
+    get_upsert_statement,
+)
 from ace.exceptions import UnknownRootAnalysisError
 
 import sqlalchemy.exc
 from sqlalchemy.sql import exists, and_
 from sqlalchemy.sql.expression import select, insert, update, delete
 
+#
+# roots are stored as a snapshot plus a log of the changes made since the snapshot (deltas)
+# so that updating a large root only writes the parts of it that changed
+#
+# a delta is a json object with the following keys
+# root: the top level properties of the root that changed (key = name, value = new value)
+# observables: the observables that were added or changed (key = uuid, value = observable)
+# removed: the uuids of the observables that were removed
+#
+# the parts of the root are encoded separately and a digest of each part is kept
+# for the versions of the roots this system has recently read or written (see RootDigests)
+# a delta can only be computed from a version that is known
+# otherwise (and every root_delta_compaction_threshold updates) the snapshot is rewritten instead
+#
+
+
+@dataclass
+class RootDigests:
+    # key = name of the top level property, value = digest
+    root: dict
+    # key = uuid of the observable, value = digest
+    observables: dict
+    # the number of deltas stored since the snapshot
+    delta_count: int
+
+
+def _digest(part: str) -> bytes:
+    return hashlib.sha1(part.encode()).digest()
+
+
+def _join(parts: dict) -> str:
+    """Returns the json object made from the given (already encoded) parts."""
+    return "{" + ",".join([f"{json.dumps(key)}:{part}" for key, part in parts.items()]) + "}"
+
+
+def encode_root_parts(codec: Codec, value: dict) -> tuple[dict, dict]:
+    """Encodes the top level properties and the observables of the given root dict separately.
+    Returns the tuple (root_parts, observable_parts)."""
+    root_parts = {key: codec.encode_value(_) for key, _ in value.items() if key != "observable_store"}
+    observable_parts = {key: codec.encode_value(_) for key, _ in (value.get("observable_store") or {}).items()}
+    return root_parts, observable_parts
+
+
+def encode_root_snapshot(root_parts: dict, observable_parts: dict) -> str:
+    return _join(dict(root_parts, observable_store=_join(observable_parts)))
+
+
+def get_root_digests(root_parts: dict, observable_parts: dict, delta_count: int) -> RootDigests:
+    return RootDigests(
+        root={key: _digest(part) for key, part in root_parts.items()},
+        observables={key: _digest(part) for key, part in observable_parts.items()},
+        delta_count=delta_count,
+    )
+
+
+def encode_root_delta(previous: RootDigests, current: RootDigests, root_parts: dict, observable_parts: dict) -> str:
+    """Returns the encoded delta between the previous and current versions of a root,
+    or None if nothing changed."""
+    root = {
+        key: part
+        # the version stored in the json is never used (see i_get_root_analysis)
+        for key, part in root_parts.items()
+        if key != "version" and previous.root.get(key) != current.root[key]
+    }
+    observables = {
+        key: part for key, part in observable_parts.items() if previous.observables.get(key) != current.observables[key]
+    }
+    removed = [key for key in previous.observables if key not in current.observables]
+    if not root and not observables and not removed:
+        return None
+
+    return _join({"root": _join(root), "observables": _join(observables), "removed": json.dumps(removed)})
+
+
+def _hash_value(value: str) -> str:
+    return hashlib.sha256(value.encode("utf8", errors="ignore")).hexdigest()
+
+
+def apply_root_delta(value: dict, delta: dict):
+    """Applies the given (decoded) delta to the given root dict."""
+    value.update(delta["root"])
+    observable_store = value.setdefault("observable_store", {})
+    observable_store.update(delta["observables"])
+    for key in delta["removed"]:
+        observable_store.pop(key, None)
+
 
 class DatabaseAnalysisTrackingInterface(AnalysisTrackingBaseInterface):
+
+    # the number of deltas stored for a root before the snapshot is rewritten
+    root_delta_compaction_threshold: int = 32
+
+    # the maximum number of root versions to keep the digests of
+    root_digest_cache_size: int = 1024
+
+    # key = (uuid, version), value = RootDigests
+    root_digest_cache: Optional[OrderedDict] = None
+
+    # set to False to disable tracking the observables of roots in the observable_tracking table
+    # (this needs to be set before any roots are tracked)
+    observable_tracking_enabled: bool = True
+
+    def get_cached_root_digests(self, uuid: str, version: str) -> Optional[RootDigests]:
+        if self.root_digest_cache is None:
+            return None
+
+        return self.root_digest_cache.get((uuid, version))
+
+    def cache_root_digests(self, uuid: str, version: str, digests: RootDigests):
+        if self.root_digest_cache is None:
+            self.root_digest_cache = OrderedDict()
+
+        self.root_digest_cache[(uuid, version)] = digests
+        while len(self.root_digest_cache) > self.root_digest_cache_size:
+            self.root_digest_cache.popitem(last=False)
+
+    async def update_observable_tracking(
+        self, db, root: RootAnalysis, added: list[str], removed: Optional[list[str]] = None
+    ):
+        """Adds the given observables (by uuid) of the root to the observable tracking and removes the given removed
+        observables. If removed is None then all of the existing observable tracking of the root is removed."""
+        if not self.observable_tracking_enabled:
+            return
+
+        query = delete(ObservableTracking).where(ObservableTracking.root_uuid == root.uuid)
+        if removed is None:
+            await db.execute(query)
+        elif removed:
+            await db.execute(query.where(ObservableTracking.uuid.in_(removed)))
+
+        if added:
+            await db.execute(
+                insert(ObservableTracking),
+                [
+                    {
+                        "root_uuid": root.uuid,
+                        "uuid": observable.uuid,
+                        "type": observable.type,
+                        "value_hash": _hash_value(observable.value),
+                        "value": observable.value,
+                    }
+                    for observable in [root.observable_store[_] for _ in added]
+                ],
+            )
+
+    def encode_root_snapshot(self, root_parts: dict, observable_parts: dict) -> str:
+        return compress_text(encode_root_snapshot(root_parts, observable_parts), self.compression_settings)
+
     async def i_get_root_analysis(self, uuid: str) -> Union[RootAnalysisTracking, None]:
         """Returns the root for the given uuid or None if it does not exist.."""
         async with self.get_db() as db:
@@ -25,14 +183,26 @@ class DatabaseAnalysisTrackingInterface(AnalysisTrackingBaseInterface):
                 await db.execute(select(RootAnalysisTracking).where(RootAnalysisTracking.uuid == uuid))
             ).one_or_none()
 
-        if not result:
-            return None
+            if not result:
+                return None
+
+            deltas = []
+            if result[0].delta_count:
+                query = select(RootAnalysisDelta.json_data).where(RootAnalysisDelta.root_uuid == uuid)
+                deltas = (await db.execute(query.order_by(RootAnalysisDelta.id))).scalars().all()
+
+        # the snapshot plus all the changes made since
+        codec = get_codec()
+        value = codec.decode_value(decompress_text(result[0].json_data))
+        for delta in deltas:
+            apply_root_delta(value, codec.decode_value(decompress_text(delta)))
 
         # we keep a copy of the actual value of the version property in the database
         # (the JSON would have a copy of the previous value)
         # also see update_root_analysis
-        root = RootAnalysis.from_json(result[0].json_data)
+        root = codec.root_from_dict(value)
         root.version = result[0].version
+        self.cache_root_digests(uuid, root.version, get_root_digests(*encode_root_parts(codec, value), len(deltas)))
         return root
 
     async def i_track_root_analysis(self, root: RootAnalysis) -> bool:
@@ -41,31 +211,80 @@ class DatabaseAnalysisTrackingInterface(AnalysisTrackingBaseInterface):
         if version is None:
             version = str(uuid.uuid4())
 
+        root_parts, observable_parts = encode_root_parts(
+            get_codec(), get_codec().root_to_dict(root, exclude_analysis_details=True)
+        )
+
         try:
             async with self.get_db() as db:
                 await db.execute(
                     insert(RootAnalysisTracking).values(
-                        uuid=root.uuid, version=version, json_data=root.to_json(exclude_analysis_details=True)
+                        uuid=root.uuid,
+                        version=version,
+                        expires=root.may_expire(),
+                        json_data=self.encode_root_snapshot(root_parts, observable_parts),
+                        delta_count=0,
                     )
                 )
+                await self.update_observable_tracking(db, root, list(observable_parts), [])
                 await db.commit()
 
             root.version = version
+            self.cache_root_digests(root.uuid, version, get_root_digests(root_parts, observable_parts, 0))
             return True
         except sqlalchemy.exc.IntegrityError:
             return False
 
     async def i_update_root_analysis(self, root: RootAnalysis) -> bool:
+        root_parts, observable_parts = encode_root_parts(
+            get_codec(), get_codec().root_to_dict(root, exclude_analysis_details=True)
+        )
+
+        previous = self.get_cached_root_digests(root.uuid, root.version)
+        delta_count = previous.delta_count + 1 if previous else 0
+        current = get_root_digests(root_parts, observable_parts, delta_count)
+
         # when we update we also update the version
         new_version = str(uuid.uuid4())
+        # so the version has to match for the update to work
+        query = update(RootAnalysisTracking).where(
+            and_(RootAnalysisTracking.uuid == root.uuid, RootAnalysisTracking.version == root.version)
+        )
+
         async with self.get_db() as db:
-            result = await db.execute(
-                update(RootAnalysisTracking).values(
-                    version=new_version, json_data=root.to_json(exclude_analysis_details=True)
+            if previous is None or delta_count >= self.root_delta_compaction_threshold:
+                # rewrite the snapshot and clear the deltas
+                current.delta_count = 0
+                result = await db.execute(
+                    query.values(
+                        version=new_version,
+                        expires=root.may_expire(),
+                        json_data=self.encode_root_snapshot(root_parts, observable_parts),
+                        delta_count=0,
+                    )
                 )
-                # so the version has to match for the update to work
-                .where(and_(RootAnalysisTracking.uuid == root.uuid, RootAnalysisTracking.version == root.version))
-            )
+                if result.rowcount:
+                    await db.execute(delete(RootAnalysisDelta).where(RootAnalysisDelta.root_uuid == root.uuid))
+                    await self.update_observable_tracking(db, root, list(observable_parts))
+            else:
+                # otherwise only store what changed
+                delta = encode_root_delta(previous, current, root_parts, observable_parts)
+                if delta is None:
+                    current.delta_count = previous.delta_count
+
+                result = await db.execute(
+                    query.values(version=new_version, expires=root.may_expire(), delta_count=current.delta_count)
+                )
+                if result.rowcount and delta is not None:
+                    json_data = compress_text(delta, self.compression_settings)
+                    await db.execute(insert(RootAnalysisDelta).values(root_uuid=root.uuid, json_data=json_data))
+                    await self.update_observable_tracking(
+                        db,
+                        root,
+                        [_ for _ in current.observables if _ not in previous.observables],
+                        [_ for _ in previous.observables if _ not in current.observables],
+                    )
+
             await db.commit()
 
         if result.rowcount == 0:
@@ -73,8 +292,33 @@ class DatabaseAnalysisTrackingInterface(AnalysisTrackingBaseInterface):
             return False
 
         root.version = new_version
+        self.cache_root_digests(root.uuid, new_version, current)
         return True
 
+    async def i_get_root_analysis_uuids_by_observable(self, type: str, value: str) -> Optional[list[str]]:
+        if not self.observable_tracking_enabled:
+            return None
+
+        query = select(ObservableTracking.root_uuid).where(
+            and_(
+                ObservableTracking.type == type,
+                ObservableTracking.value_hash == _hash_value(value),
+                ObservableTracking.value == value,
+            )
+        )
+        async with self.get_db() as db:
+            return (await db.execute(query.distinct())).scalars().all()
+
+    async def i_get_root_observable_values(self, uuid: str, type: str) -> Optional[list[str]]:
+        if not self.observable_tracking_enabled:
+            return None
+
+        query = select(ObservableTracking.value).where(
+            and_(ObservableTracking.root_uuid == uuid, ObservableTracking.type == type)
+        )
+        async with self.get_db() as db:
+            return (await db.execute(query)).scalars().all()
+
     async def i_root_analysis_exists(self, root: str) -> bool:
         async with self.get_db() as db:
             return (
@@ -89,6 +333,20 @@ class DatabaseAnalysisTrackingInterface(AnalysisTrackingBaseInterface):
 
         return result.rowcount > 0
 
+    async def i_get_expiring_root_analysis_uuids(self, after: Optional[str], limit: int) -> list[str]:
+        # roots with outstanding analysis requests cannot expire yet
+        query = select(RootAnalysisTracking.uuid).where(
+            and_(
+                RootAnalysisTracking.expires == True,  # noqa:E712
+                ~exists().where(AnalysisRequestTracking.root_uuid == RootAnalysisTracking.uuid),
+            )
+        )
+        if after is not None:
+            query = query.where(RootAnalysisTracking.uuid > after)
+
+        async with self.get_db() as db:
+            return (await db.execute(query.order_by(RootAnalysisTracking.uuid).limit(limit))).scalars().all()
+
     async def i_get_analysis_details(self, uuid: str) -> bytes:
         """Returns the details for the given Analysis object, or None if is has not been set."""
         async with self.get_db() as db:
@@ -121,6 +379,38 @@ class DatabaseAnalysisTrackingInterface(AnalysisTrackingBaseInterface):
         except sqlalchemy.exc.IntegrityError:
             raise UnknownRootAnalysisError(root_uuid)
 
+    async def i_get_analysis_details_bulk(self, uuids: list[str]) -> dict[str, bytes]:
+        query = select(AnalysisDetailsTracking.uuid, AnalysisDetailsTracking.json_data)
+        async with self.get_db() as db:
+            return {
+                _uuid: json_data
+                for _uuid, json_data in (await db.execute(query.where(AnalysisDetailsTracking.uuid.in_(uuids)))).all()
+            }
+
+    async def i_track_analysis_details_bulk(self, root_uuid: str, values: dict[str, bytes]):
+        assert isinstance(root_uuid, str) and root_uuid
+
+        try:
+            rows = [{"uuid": _uuid, "root_uuid": root_uuid, "json_data": value} for _uuid, value in values.items()]
+            async with self.get_db() as db:
+                statement = get_upsert_statement(
+                    self.engine.dialect.name,
+                    AnalysisDetailsTracking,
+                    rows,
+                    AnalysisDetailsTracking.uuid,
+                    ["root_uuid", "json_data"],
+                )
+                if statement is not None:
+                    await db.execute(statement)
+                else:
+                    for row in rows:
+                        await db.merge(AnalysisDetailsTracking(**row))
+
+                await db.commit()
+
+        except sqlalchemy.exc.IntegrityError:
+            raise UnknownRootAnalysisError(root_uuid)
+
     async def i_delete_analysis_details(self, uuid: str) -> bool:
         """Deletes the analysis details for the given Analysis referenced by id."""
         async with self.get_db() as db:
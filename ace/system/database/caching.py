@@ -8,6 +8,8 @@ from typing import Union, Optional
 import ace
 
 from ace.analysis import AnalysisModuleType
+from ace.codec import get_codec
+from ace.compression import compress_text, decompress_text
 from ace.system.base import CachingBaseInterface
 from ace.system.database.schema import AnalysisResultCache
 from ace.system.requests import AnalysisRequest
@@ -30,7 +32,7 @@ class DatabaseCachingInterface(CachingBaseInterface):
             if result.expiration_date is not None and utc_now() > result.expiration_date:
                 return None
 
-            return AnalysisRequest.from_json(result.json_data, system=self)
+            return get_codec().decode_request(decompress_text(result.json_data), system=self)
 
     async def i_cache_analysis_result(self, cache_key: str, request: AnalysisRequest, expiration: Optional[int]) -> str:
         expiration_date = None
@@ -42,7 +44,7 @@ class DatabaseCachingInterface(CachingBaseInterface):
             cache_key=cache_key,
             expiration_date=expiration_date,
             analysis_module_type=request.type.name,
-            json_data=request.to_json(),
+            json_data=compress_text(get_codec().encode_request(request), self.compression_settings),
         )
 
         async with self.get_db() as db:
@@ -40,6 +40,17 @@ class DatabaseConfigurationInterface(ConfigurationBaseInterface):
         setting.documentation = result[0].documentation
         return setting
 
+    async def i_get_all_config(self) -> list[ConfigurationSetting]:
+        result = dict(self.temp_config)
+        async with self.get_db() as db:
+            if db is not None:
+                for (config,) in await db.execute(select(Config)):
+                    setting = ConfigurationSetting.parse_raw(config.value)
+                    setting.documentation = config.documentation
+                    result[config.key] = setting
+
+        return list(result.values())
+
     async def i_set_config(self, key: str, value: Any, documentation: Optional[str] = None):
         setting = ConfigurationSetting(name=key, value=value)
         encoded_value = setting.json()
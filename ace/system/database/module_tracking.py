@@ -28,17 +28,6 @@ class DatabaseAnalysisModuleTrackingInterface(AnalysisModuleTrackingBaseInterfac
             await db.execute(delete(AnalysisModuleTracking).where(AnalysisModuleTracking.name == amt.name))
             await db.commit()
 
-    async def i_get_analysis_module_type(self, name: str) -> Union[AnalysisModuleType, None]:
-        async with self.get_db() as db:
-            db_amt = (
-                await db.execute(select(AnalysisModuleTracking).where(AnalysisModuleTracking.name == name))
-            ).scalar()
-
-            if db_amt is None:
-                return None
-
-            return AnalysisModuleType.from_dict(json.loads(db_amt.json_data))
-
     async def i_get_all_analysis_module_types(self) -> list[AnalysisModuleType]:
         async with self.get_db() as db:
             return [
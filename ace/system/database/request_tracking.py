@@ -1,6 +1,5 @@
 # vim: ts=4:sw=4:et:cc=120
 
-import json
 import datetime
 
 from operator import itemgetter
@@ -9,8 +8,9 @@ from typing import Optional, Union
 import ace
 
 from ace.analysis import Observable, AnalysisModuleType
+from ace.codec import get_codec
 from ace.system.base import AnalysisRequestTrackingBaseInterface
-from ace.system.database.schema import AnalysisRequestTracking, analysis_request_links
+from ace.system.database.schema import AnalysisRequestTracking, analysis_request_links, get_upsert_statement
 from ace.constants import TRACKING_STATUS_ANALYZING, EVENT_AR_EXPIRED
 from ace.system.requests import AnalysisRequest
 from ace.system.caching import generate_cache_key
@@ -18,30 +18,58 @@ from ace.exceptions import UnknownAnalysisModuleTypeError
 
 from sqlalchemy import and_, text
 from sqlalchemy.sql import delete, update, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+# the columns that are updated when an existing request is tracked again
+UPSERT_COLUMNS = ["expiration_date", "analysis_module_type", "cache_key", "root_uuid", "json_data"]
+
+# the maximum number of requests inserted with a single statement
+BULK_INSERT_SIZE = 100
+
 
 class DatabaseAnalysisRequestTrackingInterface(AnalysisRequestTrackingBaseInterface):
-    # if we switched to TRACKING_STATUS_ANALYZING then we start the expiration timer
-    async def i_track_analysis_request(self, request: AnalysisRequest):
+    def _get_tracking_values(self, request: AnalysisRequest) -> dict:
+        # if we switched to TRACKING_STATUS_ANALYZING then we start the expiration timer
         # XXX we're using server-side time instead of database time
         expiration_date = None
         if request.status == TRACKING_STATUS_ANALYZING:
             expiration_date = datetime.datetime.now() + datetime.timedelta(request.type.timeout)
 
-        db_request = AnalysisRequestTracking(
+        return dict(
             id=request.id,
             expiration_date=expiration_date,
             analysis_module_type=request.type.name if request.type else None,
             cache_key=request.cache_key,
             root_uuid=request.root.uuid,
-            json_data=request.to_json(),
+            json_data=get_codec().encode_request(request),
         )
 
+    async def i_track_analysis_request(self, request: AnalysisRequest):
         async with self.get_db() as db:
-            await db.merge(db_request)
+            await db.merge(AnalysisRequestTracking(**self._get_tracking_values(request)))
             await db.commit()
 
+    async def i_track_analysis_requests(self, requests: list[AnalysisRequest], session: Optional[AsyncSession] = None):
+        values = [self._get_tracking_values(_) for _ in requests]
+        async with self.get_db(session) as db:
+            for index in range(0, len(values), BULK_INSERT_SIZE):
+                statement = get_upsert_statement(
+                    self.engine.dialect.name,
+                    AnalysisRequestTracking,
+                    values[index : index + BULK_INSERT_SIZE],
+                    AnalysisRequestTracking.id,
+                    UPSERT_COLUMNS,
+                )
+                if statement is not None:
+                    await db.execute(statement)
+                else:
+                    for value in values[index : index + BULK_INSERT_SIZE]:
+                        await db.merge(AnalysisRequestTracking(**value))
+
+            if session is None:
+                await db.commit()
+
     async def i_link_analysis_requests(self, source: AnalysisRequest, dest: AnalysisRequest) -> bool:
         from sqlalchemy import select, bindparam, String, and_
 
@@ -82,7 +110,7 @@ class DatabaseAnalysisRequestTrackingInterface(AnalysisRequestTrackingBaseInterf
                 return None
 
             # I think this is where you have to be careful with async
-            return [AnalysisRequest.from_dict(json.loads(_.json_data), self) for _ in source_request[0].linked_requests]
+            return [get_codec().decode_request(_.json_data, self) for _ in source_request[0].linked_requests]
 
     async def i_lock_analysis_request(self, request: AnalysisRequest) -> bool:
         async with self.get_db() as db:
@@ -123,6 +151,23 @@ class DatabaseAnalysisRequestTrackingInterface(AnalysisRequestTrackingBaseInterf
 
         return count == 1
 
+    async def i_delete_analysis_requests(self, keys: list[str], session: Optional[AsyncSession] = None) -> list[str]:
+        async with self.get_db(session) as db:
+            deleted = [
+                _[0]
+                for _ in (
+                    await db.execute(select(AnalysisRequestTracking.id).where(AnalysisRequestTracking.id.in_(keys)))
+                ).all()
+            ]
+
+            if deleted:
+                await db.execute(delete(AnalysisRequestTracking).where(AnalysisRequestTracking.id.in_(deleted)))
+
+            if session is None:
+                await db.commit()
+
+        return deleted
+
     async def i_get_expired_analysis_requests(self) -> list[AnalysisRequest]:
         async with self.get_db() as db:
             result = (
@@ -132,7 +177,7 @@ class DatabaseAnalysisRequestTrackingInterface(AnalysisRequestTrackingBaseInterf
                     )
                 )
             ).all()
-            return [AnalysisRequest.from_dict(json.loads(_[0].json_data), self) for _ in result]
+            return [get_codec().decode_request(_[0].json_data, self) for _ in result]
 
     # this is called when an analysis module type is removed (or expired)
     async def i_clear_tracking_by_analysis_module_type(self, amt: AnalysisModuleType):
@@ -151,12 +196,23 @@ class DatabaseAnalysisRequestTrackingInterface(AnalysisRequestTrackingBaseInterf
             if result is None:
                 return None
 
-            return AnalysisRequest.from_dict(json.loads(result[0].json_data), self)
+            return get_codec().decode_request(result[0].json_data, self)
+
+    async def i_get_analysis_requests_by_request_ids(self, keys: list[str]) -> list[AnalysisRequest]:
+        async with self.get_db() as db:
+            result = {
+                _[0].id: _[0].json_data
+                for _ in (
+                    await db.execute(select(AnalysisRequestTracking).where(AnalysisRequestTracking.id.in_(keys)))
+                ).all()
+            }
+
+        return [get_codec().decode_request(result[key], self) for key in keys if key in result]
 
     async def i_get_analysis_requests_by_root(self, key: str) -> list[AnalysisRequest]:
         async with self.get_db() as db:
             return [
-                AnalysisRequest.from_dict(json.loads(_[0].json_data), self)
+                get_codec().decode_request(_[0].json_data, self)
                 for _ in (
                     await db.execute(select(AnalysisRequestTracking).where(AnalysisRequestTracking.root_uuid == key))
                 ).all()
@@ -173,7 +229,7 @@ class DatabaseAnalysisRequestTrackingInterface(AnalysisRequestTrackingBaseInterf
             if result is None:
                 return None
 
-            return AnalysisRequest.from_dict(json.loads(result[0].json_data), self)
+            return get_codec().decode_request(result[0].json_data, self)
 
     async def i_process_expired_analysis_requests(self, amt: AnalysisModuleType) -> int:
         assert isinstance(amt, AnalysisModuleType)
@@ -186,7 +242,7 @@ class DatabaseAnalysisRequestTrackingInterface(AnalysisRequestTrackingBaseInterf
                     )
                 )
             ):
-                request = AnalysisRequest.from_json(db_request[0].json_data, self)
+                request = get_codec().decode_request(db_request[0].json_data, self)
                 await self.fire_event(EVENT_AR_EXPIRED, request)
                 try:
                     await self.queue_analysis_request(request)
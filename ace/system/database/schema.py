@@ -4,8 +4,10 @@ from datetime import datetime, timezone
 
 from sqlalchemy import (
     BOOLEAN,
+    CHAR,
     Column,
     ForeignKey,
+    Index,
     Integer,
     LargeBinary,
     String,
@@ -57,11 +59,70 @@ class RootAnalysisTracking(Base):
     uuid = Column(String(36), unique=True, primary_key=True)
     version = Column(String(36), unique=False, primary_key=False, index=True)
 
+    # copy of root.may_expire() (see delete_expired_root_analysis)
+    expires = Column(BOOLEAN, nullable=False, index=True, default=False)
+
+    # the snapshot of the root (changes made since the snapshot are stored in root_analysis_delta)
     json_data = Column(Text, nullable=False)
 
+    # the number of deltas stored since the snapshot
+    delta_count = Column(Integer, nullable=False, default=0)
+
     insert_date = Column(TimeStamp, nullable=False, index=True, server_default=text("CURRENT_TIMESTAMP"))
 
 
+class RootAnalysisDelta(Base):
+
+    __tablename__ = "root_analysis_delta"
+    __table_args__ = {
+        "mysql_engine": "InnoDB",
+        "mysql_charset": "utf8mb4",
+    }
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    root_uuid = Column(
+        String(36),
+        ForeignKey("root_analysis_tracking.uuid", ondelete="CASCADE", onupdate="CASCADE"),
+        index=True,
+        nullable=False,
+    )
+
+    # the parts of the root that changed (see ace.system.database.analysis_tracking)
+    json_data = Column(Text, nullable=False)
+
+
+class ObservableTracking(Base):
+    """The observables of each root (see DatabaseAnalysisTrackingInterface.observable_tracking_enabled)"""
+
+    __tablename__ = "observable_tracking"
+    __table_args__ = (
+        Index("ix_observable_tracking_root_type_value", "root_uuid", "type", "value_hash"),
+        Index("ix_observable_tracking_type_value", "type", "value_hash"),
+        {
+            "mysql_engine": "InnoDB",
+            "mysql_charset": "utf8mb4",
+        },
+    )
+
+    root_uuid = Column(
+        String(36),
+        ForeignKey("root_analysis_tracking.uuid", ondelete="CASCADE", onupdate="CASCADE"),
+        primary_key=True,
+    )
+
+    # the uuid of the observable
+    uuid = Column(String(36), primary_key=True)
+
+    # both of these are part of the indexes so they need a (short) length
+    type = Column(String(64), nullable=False)
+
+    # hex sha256 of the value (values can be too large to index)
+    value_hash = Column(CHAR(64), nullable=False)
+
+    value = Column(Text, nullable=False)
+
+
 class AnalysisDetailsTracking(Base):
 
     __tablename__ = "analysis_details_tracking"
@@ -231,3 +292,26 @@ class ApiKey(Base):
     description = Column(String, index=False, nullable=True)
 
     is_admin = Column(BOOLEAN, index=False, nullable=False, default=False)
+
+
+def get_upsert_statement(dialect: str, table: Base, values: list[dict], index_column: Column, columns: list[str]):
+    """Returns a multi-row INSERT ... ON CONFLICT UPDATE statement for the given table and values
+    that updates the given columns of existing rows, or None if the dialect does not support it."""
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+
+        statement = insert(table).values(values)
+        return statement.on_conflict_do_update(
+            index_elements=[index_column],
+            set_={column: statement.excluded[column] for column in columns},
+        )
+    elif dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        statement = insert(table).values(values)
+        return statement.on_duplicate_key_update({column: statement.inserted[column] for column in columns})
+
+    return None
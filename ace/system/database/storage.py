@@ -14,7 +14,7 @@ from ace.logging import get_logger
 from ace.system.base import StorageBaseInterface
 from ace.system.database.schema import Storage, StorageRootTracking
 
-from sqlalchemy.sql import select, delete
+from sqlalchemy.sql import exists, select, delete
 from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError
 
@@ -42,6 +42,10 @@ class DatabaseStorageInterface(StorageBaseInterface):
                 custom=json.loads(storage.custom),
             )
 
+    async def i_content_exists(self, sha256: str) -> bool:
+        async with self.get_db() as db:
+            return (await db.execute(select(exists(Storage)).where(Storage.sha256 == sha256))).scalar()
+
     async def i_iter_expired_content(self) -> Iterator[ContentMetadata]:
         async with self.get_db() as db:
             # XXX use db NOW()
@@ -1,6 +1,6 @@
 # vim: ts=4:sw=4:et:cc=120
 
-from ace.data_model import RootAnalysisModel, ErrorModel
+from ace.data_model import AnalysisDetailsQueryModel, RootAnalysisModel, ErrorModel
 from ace.system.distributed import app, TAG_ANALYSIS_TRACKING
 from ace.exceptions import ACEError
 
@@ -60,3 +60,25 @@ async def api_get_analysis_details(uuid: str = Path(..., description="The uuid o
 
     except ACEError as e:
         return JSONResponse(status_code=400, content=ErrorModel(code=e.code, details=str(e)).dict())
+
+
+@app.post(
+    "/analysis_tracking/details",
+    name="Get Analysis Details (Bulk)",
+    responses={
+        200: {
+            "description": "Returns the details of the analysis specified by the uuids (key = uuid).",
+            "content": {"application/json": {}},
+        },
+        400: {"model": ErrorModel},
+    },
+    tags=[TAG_ANALYSIS_TRACKING],
+    description="""Returns the details for all of the analysis with the specified uuids as an object keyed by uuid.
+Analysis that does not have details is not included.
+""",
+)
+async def api_get_analysis_details_bulk(query: AnalysisDetailsQueryModel):
+    try:
+        return await app.state.system.get_analysis_details_bulk(query.uuids)
+    except ACEError as e:
+        return JSONResponse(status_code=400, content=ErrorModel(code=e.code, details=str(e)).dict())
@@ -1,7 +1,6 @@
 # vim: ts=4:sw=4:et:cc=120
 
 import json
-import io
 
 from datetime import datetime
 from typing import Optional, Union
@@ -9,8 +8,8 @@ from typing import Optional, Union
 from ace.data_model import ContentMetadata, ErrorModel
 from ace.system.distributed import app, TAG_STORAGE
 
-from fastapi import UploadFile, File, Form, Query, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import UploadFile, File, Form, Path, Query, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
 
 @app.post(
@@ -36,7 +35,7 @@ async def api_store_content(
 
     async def _reader(target):
         while True:
-            chunk = target.read(io.DEFAULT_BUFFER_SIZE)
+            chunk = target.read(app.state.system.storage_chunk_size)
             if not chunk:
                 break
 
@@ -46,19 +45,119 @@ async def api_store_content(
     return await app.state.system.get_content_meta(sha256)
 
 
+@app.head(
+    "/storage/{sha256}",
+    name="Content Exists",
+    responses={
+        200: {"description": "The content exists."},
+        404: {"description": "The content does not exist."},
+    },
+    tags=[TAG_STORAGE],
+    description="""Checks if content with the specified sha256 hash is already stored.
+Clients that already know the hash of the content use this to avoid uploading content that already exists.""",
+)
+async def api_content_exists(sha256: str = Path(..., description="The sha256 hash of the content.")):
+    if not await app.state.system.content_exists(sha256):
+        raise HTTPException(status_code=404)
+
+    return Response(status_code=200)
+
+
+@app.post(
+    "/storage/{sha256}/roots/{uuid}",
+    name="Track Content Root",
+    responses={
+        200: {"description": "The content is now referenced by the root."},
+        404: {"description": "The content does not exist."},
+    },
+    tags=[TAG_STORAGE],
+    description="""Records that the root with the specified uuid references the content with the specified sha256 hash.
+This is used instead of storing the content again when the content already exists.""",
+)
+async def api_track_content_root(
+    sha256: str = Path(..., description="The sha256 hash of the content."),
+    uuid: str = Path(..., description="The uuid of the root analysis."),
+):
+    if not await app.state.system.content_exists(sha256):
+        raise HTTPException(status_code=404, detail=f"Content with sha256 {sha256} not found.")
+
+    await app.state.system.track_content_root(sha256, uuid)
+    return Response(status_code=200)
+
+
+def parse_range_header(value: str, size: int) -> Optional[tuple[int, int]]:
+    """Parses the value of a Range header into a (start, end) tuple (end is inclusive.)
+    Returns None if the header is not a valid single byte range, in which case it is ignored.
+    Raises ValueError if the range cannot be satisfied."""
+    unit, _, ranges = value.partition("=")
+    start, _, end = ranges.strip().partition("-")
+    if unit.strip() != "bytes" or not (start or end) or not all([_.isdigit() for _ in (start, end) if _]):
+        return None
+
+    if not start:
+        # suffix range (the last N bytes)
+        if size == 0 or int(end) == 0:
+            raise ValueError(value)
+
+        return max(size - int(end), 0), size - 1
+
+    start, end = int(start), int(end) if end else None
+    if end is not None and end < start:
+        return None
+
+    if start >= size:
+        raise ValueError(value)
+
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
 @app.get(
     "/storage/{sha256}",
     name="Get File Content",
+    responses={
+        206: {"description": "Returns the requested range of the content."},
+        404: {"description": "The content does not exist."},
+        416: {"description": "The requested range cannot be satisfied."},
+    },
     tags=[TAG_STORAGE],
-    description="Returns the binary content of the file with the specified sha256 hash.",
+    description="""Returns the binary content of the file with the specified sha256 hash.
+A single byte range can be requested with the Range header.""",
 )
-async def api_get_content(sha256: str = Query(..., description="The sha256 hash of the content.")):
+async def api_get_content(request: Request, sha256: str = Query(..., description="The sha256 hash of the content.")):
     meta = await app.state.system.get_content_meta(sha256)
     if meta is None:
         raise HTTPException(status_code=404, detail=f"Content with sha256 {sha256} not found.")
 
-    # see https://www.starlette.io/responses/#streamingresponse
-    return StreamingResponse(await app.state.system.iter_content(sha256), media_type="application/octet-stream")
+    headers = {"Accept-Ranges": "bytes"}
+    content_range = None
+    if "range" in request.headers:
+        try:
+            content_range = parse_range_header(request.headers["range"], meta.size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{meta.size}"})
+
+    if content_range is None:
+        # unencrypted local content is served directly from the file
+        path = await app.state.system.get_local_content_path(sha256)
+        if path is not None:
+            return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+        # see https://www.starlette.io/responses/#streamingresponse
+        return StreamingResponse(
+            await app.state.system.iter_content(sha256),
+            media_type="application/octet-stream",
+            headers=dict(headers, **{"Content-Length": str(meta.size)}),
+        )
+
+    start, end = content_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{meta.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        await app.state.system.iter_content(sha256, offset=start, length=end - start + 1),
+        status_code=206,
+        media_type="application/octet-stream",
+        headers=headers,
+    )
 
 
 @app.get(
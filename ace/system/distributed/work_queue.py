@@ -37,3 +37,32 @@ async def api_get_next_analysis_request(query: AnalysisRequestQueryModel):
         return Response(status_code=204)
 
     return result.to_model()
+
+
+@app.post(
+    "/work_queue/batch",
+    name="Get Next Analysis Requests",
+    responses={
+        200: {
+            "model": list[AnalysisRequestModel],
+            "description": "Returns up to count observable analysis requests to process.",
+        },
+        400: {"model": ErrorModel},
+    },
+    tags=[TAG_WORK_QUEUE],
+    description="""Gets up to count analysis requests for the given analysis module type. An empty list is returned if no work was available. See /work_queue for details.""",
+)
+async def api_get_next_analysis_requests(query: AnalysisRequestQueryModel):
+    try:
+        result = await app.state.system.get_next_analysis_requests(
+            query.owner,
+            query.amt,
+            query.count,
+            timeout=query.timeout,
+            version=query.version,
+            extended_version=query.extended_version,
+        )
+    except ACEError as e:
+        return JSONResponse(status_code=400, content=ErrorModel(code=e.code, details=str(e)).dict())
+
+    return [_.to_model() for _ in result]
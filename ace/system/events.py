@@ -1,6 +1,9 @@
 # vim: ts=4:sw=4:et:cc=120
 
+from typing import Callable
+
 from ace.data_model import Event
+from ace.logging import get_logger
 
 #
 # Events
@@ -32,3 +35,19 @@ class EventHandler:
         This is called with the same parameters as handle_event and an additional parameter that is the exception that was raised.
         """
         raise NotImplementedError()
+
+
+class CacheInvalidationEventHandler(EventHandler):
+    """Invalidates a cache when the events it is registered for fire (on any node.)
+    invalidate is called with the event and decides what to invalidate."""
+
+    def __init__(self, description: str, invalidate: Callable[[Event], None]):
+        # what is invalidated (used for logging)
+        self.description = description
+        self.invalidate = invalidate
+
+    async def handle_event(self, event: Event):
+        self.invalidate(event)
+
+    async def handle_exception(self, event: str, exception: Exception):
+        get_logger().error(f"unable to invalidate {self.description} on {event}: {exception}")
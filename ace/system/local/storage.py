@@ -2,15 +2,17 @@
 
 import asyncio
 import datetime
+import functools
 import hashlib
 import io
 import json
 import os
 import os.path
+import time
 import uuid
 
 from pathlib import Path
-from typing import Union, Iterator, AsyncGenerator
+from typing import Union, Iterator, AsyncGenerator, Optional
 
 from ace.data_model import ContentMetadata, CustomJSONEncoder
 from ace.exceptions import UnknownFileError
@@ -27,10 +29,45 @@ from sqlalchemy.sql import insert
 class LocalStorageInterface(DatabaseStorageInterface):
     """Storage interface that stores files in the local file system."""
 
+    # temporary files older than this (in seconds) are left over from content that failed to store
+    # (other processes can be storing content in the same storage root at the same time)
+    storage_temp_file_max_age: int = 60 * 60
+
     def __init__(self, *args, storage_root=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.storage_root = storage_root
 
+    async def initialize(self):
+        await super().initialize()
+        await self.delete_stale_temp_files()
+
+    async def delete_stale_temp_files(self) -> int:
+        """Deletes the temporary files left over from content that failed to store.
+        Returns the number of files deleted."""
+        temp_dir = os.path.join(self.storage_root, ".tmp") if self.storage_root else None
+
+        def _delete() -> int:
+            if temp_dir is None or not os.path.isdir(temp_dir):
+                return 0
+
+            count = 0
+            cutoff = time.time() - self.storage_temp_file_max_age
+            for entry in os.scandir(temp_dir):
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        count += 1
+                except FileNotFoundError:
+                    pass
+
+            return count
+
+        count = await asyncio.get_running_loop().run_in_executor(None, _delete)
+        if count:
+            get_logger().info(f"deleted {count} stale temporary files from {temp_dir}")
+
+        return count
+
     async def get_file_path(self, sha256: str) -> str:
         """Returns the full path to the local path that should be used to store
         the file with the given sha256 hash."""
@@ -41,16 +78,24 @@ class LocalStorageInterface(DatabaseStorageInterface):
 
         return meta.location
 
-    async def initialize_file_path(self) -> str:
+    async def initialize_file_path(self, file_name: Optional[str] = None) -> str:
         """Initializes a file path for storage of a file. Returns the full path
-        to the target file."""
-        file_name = str(uuid.uuid4())
-        sub_dir = os.path.join(self.storage_root, file_name[0:3])
-        if not await asyncio.get_running_loop().run_in_executor(None, os.path.isdir, sub_dir):
-            await asyncio.get_running_loop().run_in_executor(None, os.mkdir, sub_dir)
+        to the target file. Content is stored by sha256 hash (file_name) and
+        a random name is used if file_name is not given."""
+        if file_name is None:
+            file_name = str(uuid.uuid4())
 
+        sub_dir = os.path.join(self.storage_root, file_name[0:3])
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(os.makedirs, sub_dir, exist_ok=True))
         return os.path.join(sub_dir, file_name)
 
+    async def initialize_temp_file_path(self) -> str:
+        """Returns the full path to a temporary file to write content to before it is moved into place.
+        The temporary files are kept inside the storage root so that the move is a rename."""
+        temp_dir = os.path.join(self.storage_root, ".tmp")
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(os.makedirs, temp_dir, exist_ok=True))
+        return os.path.join(temp_dir, str(uuid.uuid4()))
+
     async def i_store_content(
         self,
         source: AsyncGenerator[bytes, None],
@@ -61,14 +106,39 @@ class LocalStorageInterface(DatabaseStorageInterface):
         assert isinstance(meta_computation, MetaComputation)
         assert isinstance(meta, ContentMetadata)
 
-        file_path = await self.initialize_file_path()
+        # the sha256 is not known until all of the content is read
+        # so it's written to a temporary file first and then moved into place
+        temp_path = await self.initialize_temp_file_path()
+        loop = asyncio.get_running_loop()
 
-        async with aiofiles.open(file_path, "wb") as fp:
-            async for chunk in source:
-                await fp.write(chunk)
+        try:
+            async with aiofiles.open(temp_path, "wb") as fp:
+                async for chunk in source:
+                    await fp.write(chunk)
+
+            meta.sha256 = meta_computation.sha256
+            meta.size = meta_computation.size
+
+            # if the content is already stored then the existing file is used
+            existing_meta = await self.get_content_meta(meta.sha256)
+            if existing_meta is not None:
+                await loop.run_in_executor(None, os.remove, temp_path)
+                meta.location = existing_meta.location
+                get_logger().info(f"file with sha256 {meta.sha256} already exists")
+                return meta.sha256
+
+            # content is stored by sha256 so the same content always ends up in the same file
+            file_path = await self.initialize_file_path(meta.sha256)
+            if await loop.run_in_executor(None, os.path.exists, file_path):
+                await loop.run_in_executor(None, os.remove, temp_path)
+            else:
+                await loop.run_in_executor(None, os.replace, temp_path, file_path)
+        except Exception:
+            if await loop.run_in_executor(None, os.path.exists, temp_path):
+                await loop.run_in_executor(None, os.remove, temp_path)
+
+            raise
 
-        meta.sha256 = meta_computation.sha256
-        meta.size = meta_computation.size
         meta.location = file_path
 
         try:
@@ -85,12 +155,13 @@ class LocalStorageInterface(DatabaseStorageInterface):
                 )
                 await db.commit()
         except IntegrityError:
+            # the content was stored at the same time
             get_logger().warning(f"file with sha256 {meta.sha256} already exists")
-            try:
-                # XXX async
-                os.remove(file_path)
-            except Exception as e:
-                get_logger().exception(f"unable to remove duplicate file {file_path}")
+            existing_meta = await self.get_content_meta(meta.sha256)
+            if existing_meta is not None and existing_meta.location != file_path:
+                # the existing content is stored somewhere else (such as the legacy uuid named files)
+                await loop.run_in_executor(None, os.remove, file_path)
+                meta.location = existing_meta.location
 
             return meta.sha256
 
@@ -105,24 +176,38 @@ class LocalStorageInterface(DatabaseStorageInterface):
 
         return meta.sha256
 
-    async def i_iter_content(self, sha256: str, buffer_size: int) -> Union[AsyncGenerator[bytes, None], None]:
+    async def i_iter_content(
+        self, sha256: str, buffer_size: int, offset: int = 0, length: Optional[int] = None
+    ) -> Union[AsyncGenerator[bytes, None], None]:
         try:
             file_path = await self.get_file_path(sha256)
             if file_path is None:
                 raise UnknownFileError()
 
-            async with aiofiles.open(await self.get_file_path(sha256), "rb") as fp:
-                while True:
-                    data = await fp.read(buffer_size)
+            async with aiofiles.open(file_path, "rb") as fp:
+                if offset:
+                    await fp.seek(offset)
+
+                while length is None or length > 0:
+                    data = await fp.read(buffer_size if length is None else min(buffer_size, length))
                     if data == b"":
                         break
 
+                    if length is not None:
+                        length -= len(data)
+
                     yield data
 
         except IOError as e:
             get_logger().warning(f"unable to get content stream for {sha256}: {e}")
             raise e
 
+    async def get_local_content_path(self, sha256: str) -> Optional[str]:
+        if await self.storage_encryption_enabled():
+            return None
+
+        return await self.get_file_path(sha256)
+
     async def i_load_file(self, sha256: str, path: str) -> Union[ContentMetadata, None]:
         meta = await self.get_content_meta(sha256)
         if meta is None:
@@ -155,8 +240,8 @@ class LocalStorageInterface(DatabaseStorageInterface):
     async def i_delete_content(self, sha256: str) -> bool:
         file_path = await self.get_file_path(sha256)
         try:
-            if await asyncio.get_running_loop().run_in_executor(os.path.exists, file_path):
-                await asyncio.get_running_loop().run_in_executor(os.remove, file_path)
+            if await asyncio.get_running_loop().run_in_executor(None, os.path.exists, file_path):
+                await asyncio.get_running_loop().run_in_executor(None, os.remove, file_path)
         except Exception as e:
             get_logger().exception(f"unable to delete {file_path}")
 
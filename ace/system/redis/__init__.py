@@ -11,9 +11,9 @@ import aioredis
 
 from ace.system.redis.alerting import RedisAlertTrackingInterface
 from ace.system.redis.events import RedisEventInterface
+from ace.system.redis.maintenance import RedisMaintenanceInterface
 from ace.system.redis.work_queue import RedisWorkQueueManagerInterface
 
-
 CONFIG_REDIS_HOST = "/ace/core/redis/host"
 CONFIG_REDIS_PORT = "/ace/core/redis/port"
 CONFIG_REDIS_DB = "/ace/core/redis/db"
@@ -24,7 +24,13 @@ def _pool_key():
     return "{}:{}".format(os.getpid(), threading.get_ident())
 
 
-class RedisACESystem(RedisAlertTrackingInterface, RedisEventInterface, RedisWorkQueueManagerInterface, ACESystem):
+class RedisACESystem(
+    RedisAlertTrackingInterface,
+    RedisEventInterface,
+    RedisMaintenanceInterface,
+    RedisWorkQueueManagerInterface,
+    ACESystem,
+):
     """A partial implementation of the ACE core implemented using Redis."""
 
     pools = {}  # key = _pool_key(), value = aioredis.create_redis_pool
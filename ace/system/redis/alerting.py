@@ -9,13 +9,38 @@ from typing import Optional
 
 from ace.system.base import AlertingBaseInterface
 from ace.exceptions import UnknownAlertSystemError
+from ace.system.redis.script import RedisScript
 from ace.time import utc_now
 
 KEY_ALERT_SYSTEMS = "alert_systems"
+ALERT_QUEUE_PREFIX = "alert_system:"
+
+# KEYS[1] = KEY_ALERT_SYSTEMS
+# ARGV[1] = ALERT_QUEUE_PREFIX, ARGV[2] = the uuid of the alert root
+# returns the number of alert systems the alert was submitted to
+SCRIPT_SUBMIT_ALERT = RedisScript("""
+local names = redis.call('HKEYS', KEYS[1])
+for _, name in ipairs(names) do
+    redis.call('RPUSH', ARGV[1] .. name, ARGV[2])
+end
+return #names
+""")
+
+# KEYS[1] = KEY_ALERT_SYSTEMS, KEYS[2] = the alert queue
+# ARGV[1] = the name of the alert system
+# returns {0, {}} if the alert system does not exist, otherwise {1, {alert1, alert2, ...}}
+SCRIPT_GET_ALERTS = RedisScript("""
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return {0, {}}
+end
+local items = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[2])
+return {1, items}
+""")
 
 
 def get_alert_queue(name: str) -> str:
-    return f"alert_system:{name}"
+    return f"{ALERT_QUEUE_PREFIX}{name}"
 
 
 class RedisAlertTrackingInterface(AlertingBaseInterface):
@@ -29,32 +54,29 @@ class RedisAlertTrackingInterface(AlertingBaseInterface):
 
     async def i_submit_alert(self, root_uuid: str) -> bool:
         async with self.get_redis_connection() as rc:
-            result = False
-            for name in await rc.hkeys(KEY_ALERT_SYSTEMS):
-                result = True
-                name = name.decode()
-                await rc.rpush(get_alert_queue(name), root_uuid)
+            # NOTE the alert queues are computed inside the script
+            count = await SCRIPT_SUBMIT_ALERT.execute(
+                rc, keys=[KEY_ALERT_SYSTEMS], args=[ALERT_QUEUE_PREFIX, root_uuid]
+            )
 
-        return result
+        return count > 0
 
     async def i_get_alerts(self, name: str, timeout: Optional[int] = None) -> list[str]:
         async with self.get_redis_connection() as rc:
-            if not await rc.hexists(KEY_ALERT_SYSTEMS, name):
-                raise UnknownAlertSystemError(name)
-
-            result = []
-
             if timeout is None:
-                while True:
-                    alert_uuid = await rc.lpop(get_alert_queue(name))
-                    if alert_uuid is None:
-                        break
-
-                    result.append(alert_uuid.decode())
+                # take all of the alerts in a single round trip
+                exists, result = await SCRIPT_GET_ALERTS.execute(
+                    rc, keys=[KEY_ALERT_SYSTEMS, get_alert_queue(name)], args=[name]
+                )
+                if not exists:
+                    raise UnknownAlertSystemError(name)
 
-                return result
+                return [_.decode() for _ in result]
 
             else:
+                if not await rc.hexists(KEY_ALERT_SYSTEMS, name):
+                    raise UnknownAlertSystemError(name)
+
                 # if a timeout is specified then only a single alert is returned
                 # if we have a timeout when we use BLPOP
                 result = await rc.blpop(get_alert_queue(name), timeout=timeout)
@@ -0,0 +1,23 @@
+# vim: ts=4:sw=4:et:cc=120
+
+from ace.system.base import MaintenanceBaseInterface
+from ace.time import utc_now
+
+
+def get_maintenance_lock_name(name: str) -> str:
+    return f"maintenance_lock:{name}"
+
+
+class RedisMaintenanceInterface(MaintenanceBaseInterface):
+    async def i_acquire_maintenance_lock(self, name: str, timeout: float) -> bool:
+        async with self.get_redis_connection() as rc:
+            return await rc.set(
+                get_maintenance_lock_name(name),
+                str(utc_now()),
+                pexpire=max(int(timeout * 1000), 1),
+                exist=rc.SET_IF_NOT_EXIST,
+            )
+
+    async def reset(self):
+        await super().reset()
+        self.maintenance_schedule = None
@@ -0,0 +1,33 @@
+# vim: ts=4:sw=4:et:cc=120
+#
+# server side lua scripts
+#
+# operations that need to check something before they modify something
+# (for example, does the work queue exist before we add work to it)
+# are implemented as lua scripts so that they execute in a single round trip
+# (and atomically)
+#
+
+import hashlib
+
+from aioredis.errors import ReplyError
+
+
+class RedisScript:
+    """A lua script that is executed by the sha1 digest of the source.
+    The script is loaded into the server the first time it is missing."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.digest = hashlib.sha1(source.encode()).hexdigest()
+
+    async def execute(self, rc, keys: list = [], args: list = []):
+        try:
+            return await rc.evalsha(self.digest, keys=keys, args=args)
+        except ReplyError as e:
+            if not str(e).startswith("NOSCRIPT"):
+                raise
+
+        # script cache is per server and is lost when the server restarts (or SCRIPT FLUSH)
+        await rc.script_load(self.source)
+        return await rc.evalsha(self.digest, keys=keys, args=args)
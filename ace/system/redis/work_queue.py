@@ -1,27 +1,201 @@
 # vim: ts=4:sw=4:et:cc=120
 
 import json
+import time
 
 from typing import Union, Optional
 
 from ace.system.base import WorkQueueBaseInterface
+from ace.codec import get_codec
 from ace.system.requests import AnalysisRequest
 from ace.exceptions import UnknownAnalysisModuleTypeError
+from ace.system.redis.script import RedisScript
 from ace.time import utc_now
 
 #
-# we use two keys for each work queue due to the way redis works
+# we use four keys for each work queue due to the way redis works
 # one key is used as a marker for when the queue exists
-# the other contains the list of requests (the actual queue)
+# another contains the list of request ids (the actual queue)
+# the requests themselves are stored in a hash by request id
+# along with the timeout (in seconds) of the request in another hash
+# so that no script has to decode the requests
+#
+# when reliable_work_queue is True two more keys are used
+# work taken from the queue is moved into a processing list (atomically)
+# and the time the work expires (the lease) is tracked in a sorted set by request id
+# work is removed from both when it is acknowledged (see ack_work)
+# or when the lease expires (see requeue_expired_work)
 #
 
 KEY_WORK_QUEUES = "work_queues"
 
+# removes the request ARGV[n] from the request and timeout hashes KEYS[5] and KEYS[6]
+LUA_FORGET_WORK = """
+local function forget_work(id)
+    redis.call('HDEL', KEYS[5], id)
+    redis.call('HDEL', KEYS[6], id)
+end
+"""
+
+# removes the leased request ARGV[n] from the processing list KEYS[3] and lease set KEYS[4]
+# the processing list is only searched if the request had a lease
+LUA_RELEASE_WORK = LUA_FORGET_WORK + """
+local function release_work(id)
+    if redis.call('ZREM', KEYS[4], id) == 0 then
+        return 0
+    end
+    redis.call('LREM', KEYS[3], 1, id)
+    forget_work(id)
+    return 1
+end
+"""
+
+# KEYS = see get_work_queue_keys
+# ARGV[1] = the name of the queue, ARGV[2] = the id of the analysis request
+# ARGV[3] = the analysis request, ARGV[4] = the timeout of the analysis request
+# releases any existing lease on the request
+# returns -1 if the queue does not exist, otherwise the new length of the queue
+SCRIPT_PUT_WORK = RedisScript(LUA_RELEASE_WORK + """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return -1
+end
+release_work(ARGV[2])
+redis.call('HSET', KEYS[5], ARGV[2], ARGV[3])
+redis.call('HSET', KEYS[6], ARGV[2], ARGV[4])
+return redis.call('RPUSH', KEYS[2], ARGV[2])
+""")
+
+# KEYS = see get_work_queue_keys
+# ARGV[1] = the name of the queue, ARGV[2] = the maximum number of items to pop
+# ARGV[3] = (optional) the id of a request that was already popped off the queue
+# returns {0, {}} if the queue does not exist, otherwise {1, {item1, item2, ...}}
+SCRIPT_GET_WORK = RedisScript(LUA_FORGET_WORK + """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return {0, {}}
+end
+local count = tonumber(ARGV[2])
+local ids = {}
+if ARGV[3] then
+    table.insert(ids, ARGV[3])
+end
+if #ids < count then
+    for _, id in ipairs(redis.call('LRANGE', KEYS[2], 0, count - #ids - 1)) do
+        table.insert(ids, id)
+    end
+    if #ids > 0 then
+        redis.call('LTRIM', KEYS[2], #ids - (ARGV[3] and 1 or 0), -1)
+    end
+end
+local items = {}
+for _, id in ipairs(ids) do
+    -- the request is gone if the same request was queued more than once
+    local item = redis.call('HGET', KEYS[5], id)
+    if item then
+        table.insert(items, item)
+        forget_work(id)
+    end
+end
+return {1, items}
+""")
+
+# KEYS = see get_work_queue_keys
+# ARGV[1] = the name of the queue, ARGV[2] = the maximum number of items to take, ARGV[3] = the current time
+# ARGV[4] = (optional) the id of a request that was already moved into the processing list
+# moves up to ARGV[2] items into the processing list and leases them for the timeout of the request
+# returns {0, {}} if the queue does not exist, otherwise {1, {item1, item2, ...}}
+SCRIPT_LEASE_WORK = RedisScript("""
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return {0, {}}
+end
+local now = tonumber(ARGV[3])
+local ids = {}
+if ARGV[4] then
+    table.insert(ids, ARGV[4])
+end
+while #ids < tonumber(ARGV[2]) do
+    local id = redis.call('LMOVE', KEYS[2], KEYS[3], 'LEFT', 'RIGHT')
+    if not id then
+        break
+    end
+    table.insert(ids, id)
+end
+local items = {}
+for _, id in ipairs(ids) do
+    local item = redis.call('HGET', KEYS[5], id)
+    if item then
+        local timeout = tonumber(redis.call('HGET', KEYS[6], id)) or 0
+        redis.call('ZADD', KEYS[4], now + timeout, id)
+        table.insert(items, item)
+    else
+        -- the request is gone if the same request was queued more than once
+        redis.call('LREM', KEYS[3], 1, id)
+    end
+end
+return {1, items}
+""")
+
+# KEYS = see get_work_queue_keys
+# ARGV[1] = the id of the analysis request
+# returns 1 if the request was released, 0 otherwise
+SCRIPT_ACK_WORK = RedisScript(LUA_RELEASE_WORK + """
+return release_work(ARGV[1])
+""")
+
+# KEYS = see get_work_queue_keys
+# ARGV[1] = the current time
+# removes all expired work from the processing list and returns the ids of the requests
+# items in the processing list without a lease (the worker went away right after BLMOVE) are given one
+SCRIPT_EXPIRE_WORK = RedisScript(LUA_FORGET_WORK + """
+local now = tonumber(ARGV[1])
+local result = redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', now)
+for _, id in ipairs(result) do
+    redis.call('ZREM', KEYS[4], id)
+    redis.call('LREM', KEYS[3], 1, id)
+    forget_work(id)
+end
+if redis.call('LLEN', KEYS[3]) > redis.call('ZCARD', KEYS[4]) then
+    for _, id in ipairs(redis.call('LRANGE', KEYS[3], 0, -1)) do
+        if not redis.call('ZSCORE', KEYS[4], id) then
+            local timeout = tonumber(redis.call('HGET', KEYS[6], id)) or 0
+            redis.call('ZADD', KEYS[4], now + timeout, id)
+        end
+    end
+end
+return result
+""")
+
 
 def get_queue_name(name: str) -> str:
     return f"work_queue:{name}"
 
 
+def get_processing_list_name(name: str) -> str:
+    return f"work_queue_processing:{name}"
+
+
+def get_lease_set_name(name: str) -> str:
+    return f"work_queue_leases:{name}"
+
+
+def get_request_hash_name(name: str) -> str:
+    return f"work_queue_requests:{name}"
+
+
+def get_timeout_hash_name(name: str) -> str:
+    return f"work_queue_timeouts:{name}"
+
+
+def get_work_queue_keys(name: str) -> list[str]:
+    return [
+        KEY_WORK_QUEUES,
+        get_queue_name(name),
+        get_processing_list_name(name),
+        get_lease_set_name(name),
+        get_request_hash_name(name),
+        get_timeout_hash_name(name),
+    ]
+
+
 class RedisWorkQueueManagerInterface(WorkQueueBaseInterface):
     async def i_add_work_queue(self, name: str) -> bool:
         async with self.get_redis_connection() as rc:
@@ -33,40 +207,94 @@ class RedisWorkQueueManagerInterface(WorkQueueBaseInterface):
             # this has to exist for the queue to exist
             result = await rc.hdel(KEY_WORK_QUEUES, name)
             # the actual queue may or may not exist
-            await rc.delete(get_queue_name(name))
+            await rc.delete(*get_work_queue_keys(name)[1:])
 
         return result == 1
 
     async def i_put_work(self, amt: str, analysis_request: AnalysisRequest):
         async with self.get_redis_connection() as rc:
-            if not await rc.hexists(KEY_WORK_QUEUES, amt):
+            result = await SCRIPT_PUT_WORK.execute(
+                rc,
+                keys=get_work_queue_keys(amt),
+                args=[
+                    amt,
+                    analysis_request.id,
+                    get_codec().encode_request(analysis_request, compact=True),
+                    analysis_request.type.timeout if analysis_request.type else 0,
+                ],
+            )
+            if result == -1:
                 raise UnknownAnalysisModuleTypeError()
 
-            await rc.rpush(get_queue_name(amt), analysis_request.to_json())
+    async def _pop_work(self, rc, amt: str, count: int, item: Optional[bytes] = None) -> list[bytes]:
+        """Pops up to count items off the queue in a single round trip.
+        The id of a request that was already popped off the queue can be passed to get it as well."""
+        args = [amt, count]
+        if item is not None:
+            args.append(item)
+
+        exists, items = await SCRIPT_GET_WORK.execute(rc, keys=get_work_queue_keys(amt), args=args)
+        if not exists:
+            raise UnknownAnalysisModuleTypeError()
+
+        return items
+
+    async def _lease_work(self, rc, amt: str, count: int, item: Optional[bytes] = None) -> list[bytes]:
+        """Moves up to count items into the processing list and leases them in a single round trip.
+        The id of a request that was already moved into the processing list can be passed to lease it as well."""
+        args = [amt, count, time.time()]
+        if item is not None:
+            args.append(item)
+
+        exists, items = await SCRIPT_LEASE_WORK.execute(rc, keys=get_work_queue_keys(amt), args=args)
+        if not exists:
+            raise UnknownAnalysisModuleTypeError()
+
+        return items
 
     async def i_get_work(self, amt: str, timeout: float) -> Union[AnalysisRequest, None]:
+        result = await self.i_get_work_batch(amt, timeout, 1)
+        return result[0] if result else None
+
+    async def i_get_work_batch(self, amt: str, timeout: int, count: int) -> list[AnalysisRequest]:
         async with self.get_redis_connection() as rc:
-            if not await rc.hexists(KEY_WORK_QUEUES, amt):
-                raise UnknownAnalysisModuleTypeError()
+            # take whatever is available (this also checks that the queue exists)
+            if self.reliable_work_queue:
+                result = await self._lease_work(rc, amt, count)
+            else:
+                result = await self._pop_work(rc, amt, count)
 
-            # if we're not looking to wait then we use LPOP
-            # this always returns a single result
-            if timeout == 0:
-                result = await rc.lpop(get_queue_name(amt))
-                if result is None:
-                    return None
+            # if nothing was available then wait for the first request using BLMOVE or BLPOP
+            # (blocking commands cannot be used inside scripts)
+            if not result and timeout:
+                if self.reliable_work_queue:
+                    item = await rc.execute(
+                        b"BLMOVE", get_queue_name(amt), get_processing_list_name(amt), b"LEFT", b"RIGHT", timeout
+                    )
+                    if item is None:
+                        return []
 
-                return AnalysisRequest.from_json(result.decode(), system=self)
+                    result = await self._lease_work(rc, amt, count, item)
+                else:
+                    item = await rc.blpop(get_queue_name(amt), timeout=timeout)
+                    if item is None:
+                        return []
 
-            else:
-                # if we have a timeout when we use BLPOP
-                result = await rc.blpop(get_queue_name(amt), timeout=timeout)
-                if result is None:
-                    return None
-
-                # this can return a tuple of results (key, item1, item2, ...)
-                _, result = result
-                return AnalysisRequest.from_json(result.decode(), system=self)
+                    # this returns a tuple of results (key, item)
+                    _, item = item
+                    result = await self._pop_work(rc, amt, count, item)
+
+            return [get_codec().decode_request(_.decode(), system=self) for _ in result]
+
+    async def i_ack_work(self, amt: str, request_id: str) -> bool:
+        async with self.get_redis_connection() as rc:
+            return await SCRIPT_ACK_WORK.execute(rc, keys=get_work_queue_keys(amt), args=[request_id]) == 1
+
+    async def i_get_expired_work(self, amt: str) -> list[str]:
+        async with self.get_redis_connection() as rc:
+            result = await SCRIPT_EXPIRE_WORK.execute(rc, keys=get_work_queue_keys(amt), args=[time.time()])
+
+        return [_.decode() for _ in result]
 
     async def i_get_queue_size(self, amt: str) -> int:
         async with self.get_redis_connection() as rc:
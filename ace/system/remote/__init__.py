@@ -5,6 +5,8 @@
 
 from typing import Optional
 
+from httpx import Limits
+
 from ace.api.base import AceAPI
 from ace.api.remote import RemoteAceAPI
 from ace.system import ACESystem
@@ -33,8 +35,20 @@ class RemoteACESystem(
     RemoteWorkQueueManagerInterface,
     ACESystem,
 ):
+
+    # maintenance is performed by the core system
+    maintenance_enabled = False
+
     def __init__(
-        self, url, api_key, *args, client_args: Optional[list] = None, client_kwargs: Optional[dict] = None, **kwargs
+        self,
+        url,
+        api_key,
+        *args,
+        client_args: Optional[list] = None,
+        client_kwargs: Optional[dict] = None,
+        limits: Optional[Limits] = None,
+        http2: Optional[bool] = False,
+        **kwargs,
     ):
         super().__init__(*args, *kwargs)
 
@@ -42,7 +56,13 @@ class RemoteACESystem(
         self.api_key = api_key
         self.client_args = client_args
         self.client_kwargs = client_kwargs
-        self.api = RemoteAceAPI(self, api_key, url, client_args=client_args, client_kwargs=client_kwargs)
+        self.api = RemoteAceAPI(
+            self, api_key, url, client_args=client_args, client_kwargs=client_kwargs, limits=limits, http2=http2
+        )
+
+    async def stop(self):
+        await self.api.close()
+        await super().stop()
 
     def get_api(self) -> AceAPI:
         # if the api key changed then create a new api object to use
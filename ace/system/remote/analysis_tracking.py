@@ -14,6 +14,9 @@ class RemoteAnalysisTrackingInterface(AnalysisTrackingBaseInterface):
     async def get_analysis_details(self, uuid: str) -> Any:
         return await self.get_api().get_analysis_details(uuid)
 
+    async def get_analysis_details_bulk(self, uuids: list[str]) -> dict[str, Any]:
+        return await self.get_api().get_analysis_details_bulk(uuids)
+
     async def track_root_analysis(self, root: RootAnalysis) -> bool:
         raise NotImplementedError()
 
@@ -29,6 +32,9 @@ class RemoteAnalysisTrackingInterface(AnalysisTrackingBaseInterface):
     async def track_analysis_details(self, root: RootAnalysis, uuid: str, value: Any) -> bool:
         raise NotImplementedError()
 
+    async def track_analysis_details_bulk(self, root: RootAnalysis, details: dict[str, Any]) -> list[str]:
+        raise NotImplementedError()
+
     async def delete_analysis_details(self, uuid: str) -> bool:
         raise NotImplementedError()
 
@@ -6,6 +6,10 @@ from ace.system.base import AuthenticationBaseInterface
 
 
 class RemoteAuthenticationInterface(AuthenticationBaseInterface):
+
+    # api keys are verified by the core system
+    api_key_cache_ttl = 0
+
     async def create_api_key(
         self, name: str, description: Optional[str] = None, is_admin: Optional[bool] = False
     ) -> str:
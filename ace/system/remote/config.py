@@ -7,6 +7,10 @@ from ace.system.base import ConfigurationBaseInterface
 
 
 class RemoteConfigurationInterface(ConfigurationBaseInterface):
+
+    # changes made by other clients are not seen so nothing is cached
+    config_cache_ttl = 0
+
     async def i_get_config(self, key: str) -> ConfigurationSetting:
         # XXX this is kind of weird -- see if you can get rid of this
         from ace.system.database import CONFIG_DB_KWARGS, CONFIG_DB_URL
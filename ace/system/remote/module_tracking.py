@@ -10,7 +10,7 @@ class RemoteAnalysisModuleTrackingInterface(AnalysisModuleTrackingBaseInterface)
     async def register_analysis_module_type(self, amt: AnalysisModuleType) -> AnalysisModuleType:
         return await self.get_api().register_analysis_module_type(amt)
 
-    async def i_get_analysis_module_type(self, name: str) -> Union[AnalysisModuleType, None]:
+    async def get_analysis_module_type(self, name: str) -> Union[AnalysisModuleType, None]:
         return await self.get_api().get_analysis_module_type(name)
 
     async def track_analysis_module_type(self, amt: AnalysisModuleType):
@@ -3,7 +3,7 @@
 import os.path
 import io
 
-from typing import Union, AsyncGenerator, Iterator
+from typing import Union, AsyncGenerator, Iterator, Optional
 
 from ace.analysis import RootAnalysis
 from ace.data_model import ContentMetadata
@@ -20,8 +20,10 @@ class RemoteStorageInterface(StorageBaseInterface):
     async def get_content_bytes(self, sha256: str) -> Union[bytes, None]:
         return await self.get_api().get_content_bytes(sha256)
 
-    async def i_iter_content(self, sha256: str, buffer_size: int) -> Union[AsyncGenerator[bytes, None], None]:
-        async for data in self.get_api().iter_content(sha256, buffer_size):
+    async def i_iter_content(
+        self, sha256: str, buffer_size: int, offset: int = 0, length: Optional[int] = None
+    ) -> Union[AsyncGenerator[bytes, None], None]:
+        async for data in self.get_api().iter_content(sha256, buffer_size, offset, length):
             if data:
                 yield data
 
@@ -31,6 +33,9 @@ class RemoteStorageInterface(StorageBaseInterface):
     async def get_content_meta(self, sha256: str) -> Union[ContentMetadata, None]:
         return await self.get_api().get_content_meta(sha256)
 
+    async def content_exists(self, sha256: str) -> bool:
+        return await self.get_api().content_exists(sha256)
+
     async def iter_expired_content(self) -> Iterator[ContentMetadata]:
         raise NotImplementedError()
 
@@ -38,7 +43,7 @@ class RemoteStorageInterface(StorageBaseInterface):
         raise NotImplementedError()
 
     async def track_content_root(self, sha256: str, root: Union[RootAnalysis, str]):
-        raise NotImplementedError()
+        return await self.get_api().track_content_root(sha256, root)
 
     async def has_valid_root_reference(self, meta: ContentMetadata) -> bool:
         raise NotImplementedError()
@@ -18,6 +18,19 @@ class RemoteWorkQueueManagerInterface(WorkQueueBaseInterface):
     ) -> Union[AnalysisRequest, None]:
         return await self.get_api().get_next_analysis_request(owner_uuid, amt, timeout, version, extended_version)
 
+    async def get_next_analysis_requests(
+        self,
+        owner_uuid: str,
+        amt: Union[AnalysisModuleType, str],
+        count: int,
+        timeout: Optional[int] = 0,
+        version: Optional[str] = None,
+        extended_version: Optional[dict[str, str]] = [],
+    ) -> list[AnalysisRequest]:
+        return await self.get_api().get_next_analysis_requests(
+            owner_uuid, amt, count, timeout, version, extended_version
+        )
+
     async def delete_work_queue(self, amt: Union[AnalysisModuleType, str]) -> bool:
         raise NotImplementedError()
 
@@ -32,6 +32,24 @@ from ace.exceptions import (
 )
 
 
+def _observable_modified(before: Observable, after: Observable) -> bool:
+    """Returns True if the given observable is different after the analysis (not counting the analysis details.)"""
+    return (
+        before._tags != after._tags
+        or before.detections != after.detections
+        or before.context != after.context
+        or before._directives != after._directives
+        or before._redirection != after._redirection
+        or before._links != after._links
+        or before._limited_analysis != after._limited_analysis
+        or before._excluded_analysis != after._excluded_analysis
+        or before._requested_analysis != after._requested_analysis
+        or before._relationships != after._relationships
+        or before._grouping_target != after._grouping_target
+        or before._analysis.keys() != after._analysis.keys()
+    )
+
+
 class AnalysisRequest:
     """Represents a request to analyze a single observable or a new analysis."""
 
@@ -92,6 +110,8 @@ class AnalysisRequest:
         # the result of the analysis
         self.original_root = None
         self.modified_root = None
+        # the copy of root made by initialize_result()
+        self._root_snapshot = None
 
     def __eq__(self, other):
         if not isinstance(other, AnalysisRequest):
@@ -110,7 +130,12 @@ class AnalysisRequest:
 
         return f"AnalysisRequest({ar_type},id={self.id},root={self.root},observable={self.observable},type={self.type})"
 
-    def to_model(self, *args, **kwargs) -> AnalysisRequestModel:
+    def to_model(self, *args, compact: bool = False, **kwargs) -> AnalysisRequestModel:
+        """Returns the model of this request.
+        If compact is True then the roots only contain the observables needed to process this request."""
+        if compact and isinstance(self.root, RootAnalysis) and self.observable:
+            return self._to_compact_model(*args, **kwargs)
+
         return AnalysisRequestModel(
             id=self.id,
             root=self.root if isinstance(self.root, str) else self.root.to_model(*args, **kwargs),
@@ -122,6 +147,88 @@ class AnalysisRequest:
             modified_root=self.modified_root.to_model(*args, **kwargs) if self.modified_root else None,
         )
 
+    def _to_compact_model(self, *args, **kwargs) -> AnalysisRequestModel:
+        root, original_root, modified_root = self.get_compact_roots()
+        return AnalysisRequestModel(
+            id=self.id,
+            root=root.to_model(*args, **kwargs),
+            observable=root.get_observable(self.observable).to_model(*args, **kwargs),
+            type=self.type.to_model(*args, **kwargs) if self.type else None,
+            status=self.status,
+            owner=self.owner,
+            original_root=original_root.to_model(*args, **kwargs) if original_root else None,
+            modified_root=modified_root.to_model(*args, **kwargs) if modified_root else None,
+            compact=True,
+        )
+
+    def get_compact_roots(self) -> tuple[RootAnalysis, Optional[RootAnalysis], Optional[RootAnalysis]]:
+        """Returns the root, original_root and modified_root of the compact form of this request.
+        Each root only contains the observables needed to process this request."""
+        uuids = {_.uuid for _ in self._get_compact_scope()}
+
+        def _subset(root: RootAnalysis) -> RootAnalysis:
+            return root.copy_subset([_ for _ in root.observable_store.values() if _.uuid in uuids])
+
+        # if the original root is the unmodified copy of the root then we send it as the root
+        # and the receiver rebuilds the original root from that
+        root = self.root
+        original_root = None
+        if self.original_root is not None:
+            if self.original_root is self._root_snapshot:
+                root = self.original_root
+            else:
+                original_root = _subset(self.original_root)
+
+        modified_root = _subset(self.modified_root) if self.modified_root else None
+        return _subset(root), original_root, modified_root
+
+    def _get_compact_scope(self) -> list[Observable]:
+        """Returns the list of observables required to process this request."""
+        if self.modified_root is None:
+            return [self.observable]
+
+        # the observable, everything added by the analysis and anything those observables reference
+        scope = {}
+        analysis = self.modified_observable.get_analysis(self.type)
+        stack = [(self.modified_observable, [analysis] if analysis else [])]
+        while stack:
+            observable, analysis_list = stack.pop()
+            if observable.uuid in scope:
+                continue
+
+            scope[observable.uuid] = observable
+            for analysis in analysis_list:
+                for child in analysis.observables:
+                    # observables that existed before the analysis only have their own properties merged
+                    if self.original_root and self.original_root.get_observable(child):
+                        stack.append((child, []))
+                    else:
+                        stack.append((child, child.analysis.values()))
+
+        # and any other observable the analysis added or modified
+        # so that the compact roots carry the same diff as the full roots
+        if self.original_root is not None:
+            for observable in self.modified_root.observable_store.values():
+                if observable.uuid in scope:
+                    continue
+
+                original_observable = self.original_root.observable_store.get(observable.uuid)
+                if original_observable is None or _observable_modified(original_observable, observable):
+                    scope[observable.uuid] = observable
+
+        for observable in list(scope.values()):
+            references = observable.links[:]
+            if observable.redirection:
+                references.append(observable.redirection)
+
+            for targets in observable.relationships.values():
+                references.extend(targets)
+
+            for target in references:
+                scope.setdefault(target.uuid, target)
+
+        return list(scope.values())
+
     def to_dict(self, *args, **kwargs) -> dict:
         return self.to_model(*args, **kwargs).dict()
 
@@ -159,6 +266,10 @@ class AnalysisRequest:
         if data.modified_root:
             ar.modified_root = RootAnalysis.from_dict(data.modified_root.dict(), system)
 
+            # compact results send the original root as the root
+            if data.compact and not ar.original_root:
+                ar.original_root = root.copy()
+
         return ar
 
     @staticmethod
@@ -222,7 +333,7 @@ class AnalysisRequest:
 
     def initialize_result(self):
         """Initializes the results for this request."""
-        self.original_root = self.root.copy()
+        self.original_root = self._root_snapshot = self.root.copy()
         self.modified_root = self.root.copy()
         # self.original_root = copy.deepcopy(self.root)
         # self.modified_root = copy.deepcopy(self.root)
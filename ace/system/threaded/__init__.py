@@ -6,12 +6,14 @@
 from ace.system import ACESystem
 from ace.system.threaded.alerting import ThreadedAlertTrackingInterface
 from ace.system.threaded.events import ThreadedEventInterafce
+from ace.system.threaded.maintenance import ThreadedMaintenanceInterface
 from ace.system.threaded.work_queue import ThreadedWorkQueueManagerInterface
 
 
 class ThreadedACESystem(
     ThreadedAlertTrackingInterface,
     ThreadedEventInterafce,
+    ThreadedMaintenanceInterface,
     ThreadedWorkQueueManagerInterface,
     ACESystem,
 ):
@@ -0,0 +1,25 @@
+# vim: ts=4:sw=4:et:cc=120
+
+import threading
+import time
+
+from ace.system.base import MaintenanceBaseInterface
+
+
+class ThreadedMaintenanceInterface(MaintenanceBaseInterface):
+
+    maintenance_locks = {}  # key = lock name, value = time.monotonic() the lock expires
+    maintenance_sync_lock = threading.RLock()
+
+    async def i_acquire_maintenance_lock(self, name: str, timeout: float) -> bool:
+        with self.maintenance_sync_lock:
+            if self.maintenance_locks.get(name, 0) > time.monotonic():
+                return False
+
+            self.maintenance_locks[name] = time.monotonic() + timeout
+            return True
+
+    async def reset(self):
+        await super().reset()
+        self.maintenance_locks = {}
+        self.maintenance_schedule = None
@@ -40,6 +40,27 @@ class ThreadedWorkQueueManagerInterface(WorkQueueBaseInterface):
         except queue.Empty:
             return None
 
+    async def i_get_work_batch(self, amt: str, timeout: int, count: int) -> list[AnalysisRequest]:
+        assert isinstance(amt, str)
+        assert isinstance(timeout, int)
+        assert isinstance(count, int)
+
+        result = []
+        try:
+            work_queue = self.work_queues[amt]
+            result.append(work_queue.get(block=True, timeout=timeout))
+            while len(result) < count:
+                result.append(work_queue.get_nowait())
+        except KeyError:
+            raise UnknownAnalysisModuleTypeError()
+        except queue.Empty:
+            pass
+
+        for request in result:
+            request.system = self
+
+        return result
+
     async def i_put_work(self, amt: str, analysis_request: AnalysisRequest):
         assert isinstance(amt, str)
         assert isinstance(analysis_request, AnalysisRequest)
@@ -10,7 +10,9 @@ import shutil
 import ace.analysis
 
 from ace.analysis import RootAnalysis, Observable, AnalysisModuleType, Analysis
+from ace.data_model import ContentMetadata
 from ace.logging import get_logger
+from ace.time import utc_now
 from ace.constants import EVENT_ANALYSIS_ROOT_COMPLETED
 from ace.system.distributed import app
 from ace.system.events import EventHandler, Event
@@ -102,6 +104,26 @@ async def test_basic_analysis_sync(manager):
     assert analysis.observables[0] == ace.analysis.Observable("test", "hello")
 
 
+@pytest.mark.asyncio
+@pytest.mark.system
+async def test_preload_details(manager):
+    module = TestMultiProcessAnalysisModule()
+    await manager.system.register_analysis_module_type(module.type)
+
+    root = manager.system.new_root(details={"hello": "world"})
+    observable = root.add_observable("test", "test")
+    await root.submit()
+
+    manager.add_module(module)
+    await manager.run_once()
+
+    # all the details of the root are loaded from the core in a single call
+    root = await manager.system.get_root_analysis(root)
+    assert await root.preload_details() == 2
+    assert root._details == {"hello": "world"}
+    assert root.get_observable(observable).get_analysis(module.type)._details == {"test": "test"}
+
+
 @pytest.mark.asyncio
 @pytest.mark.integration
 async def test_force_stop_stuck_async_task(manager):
@@ -673,3 +695,69 @@ async def test_analyze_file_observable(manager, tmpdir):
     analysis = observable.get_analysis(module.type)
     assert analysis
     assert analysis.error_message == "unknown file"
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_store_existing_content(manager, tmpdir):
+    target_file = str(tmpdir / "test.txt")
+    with open(target_file, "w") as fp:
+        fp.write("test")
+
+    sha256 = await manager.system.save_file(target_file)
+    assert await manager.system.content_exists(sha256)
+
+    # storing it again with the known sha256 only registers the root reference
+    root = manager.system.new_root()
+    await root.submit()
+    assert await manager.system.save_file(target_file, sha256=sha256, roots=[root.uuid]) == sha256
+    assert (await app.state.system.get_content_meta(sha256)).roots == [root.uuid]
+
+    await app.state.system.delete_content(sha256)
+    assert not await manager.system.content_exists(sha256)
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+@pytest.mark.parametrize("encrypted", [False, True])
+async def test_get_content_range(manager, encrypted):
+    from ace.system.base.storage import CONFIG_STORAGE_ENCRYPTION_ENABLED
+
+    await app.state.system.set_config(CONFIG_STORAGE_ENCRYPTION_ENABLED, encrypted)
+    sha256 = await manager.system.store_content(b"hello world", ContentMetadata(name="test.txt"))
+
+    assert await manager.system.get_content_bytes(sha256) == b"hello world"
+    assert b"".join([_ async for _ in await manager.system.iter_content(sha256, length=5)]) == b"hello"
+    assert b"".join([_ async for _ in await manager.system.iter_content(sha256, offset=6)]) == b"world"
+    assert b"".join([_ async for _ in await manager.system.iter_content(sha256, offset=2, length=3)]) == b"llo"
+    assert b"".join([_ async for _ in await manager.system.iter_content(sha256, offset=100)]) == b""
+
+    async with manager.system.api.get_client() as client:
+        # unencrypted content is served directly from the file
+        response = await client.get(f"/storage/{sha256}")
+        assert response.content == b"hello world"
+        assert ("last-modified" in response.headers) != encrypted
+
+        response = await client.get(f"/storage/{sha256}", headers={"Range": "bytes=-5"})
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == "bytes 6-10/11"
+        assert response.content == b"world"
+
+        response = await client.get(f"/storage/{sha256}", headers={"Range": "bytes=11-"})
+        assert response.status_code == 416
+        assert response.headers["Content-Range"] == "bytes */11"
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_store_content_form_fields(manager):
+    expiration_date = utc_now()
+    sha256 = await manager.system.store_content(
+        b"test form fields", ContentMetadata(name="test.txt", expiration_date=expiration_date, custom="custom")
+    )
+
+    meta = await app.state.system.get_content_meta(sha256)
+    assert meta.name == "test.txt"
+    assert meta.expiration_date == expiration_date
+    assert meta.custom == "custom"
+    assert await app.state.system.get_content_bytes(sha256) == b"test form fields"
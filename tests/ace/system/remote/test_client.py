@@ -0,0 +1,45 @@
+# vim: ts=4:sw=4:et:cc=120
+
+import httpx
+import pytest
+
+from ace.system.remote import RemoteACESystem
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_pooled_client():
+    api_keys = []
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        api_keys.append(request.headers.get("X-API-Key"))
+        return httpx.Response(201)
+
+    limits = httpx.Limits(max_connections=1)
+    system = RemoteACESystem(
+        "http://test", "key_1", client_kwargs={"transport": httpx.MockTransport(_handler)}, limits=limits
+    )
+    assert system.api.client_kwargs["limits"] is limits
+
+    # the same client is used for all calls
+    assert await system.register_alert_system("test")
+    client = system.api.client
+    assert client is not None
+    assert await system.register_alert_system("test")
+    assert system.api.client is client
+
+    # changes to the api key are used by the existing client
+    system.api.api_key = "key_2"
+    assert await system.register_alert_system("test")
+    assert system.api.client is client
+    assert api_keys == ["key_1", "key_1", "key_2"]
+
+    # the client is closed when the system stops
+    await system.stop()
+    assert client.is_closed
+    assert system.api.client is None
+
+    # and a new one is created if it's used again
+    assert await system.register_alert_system("test")
+    assert system.api.client is not client
+    await system.stop()
@@ -0,0 +1,167 @@
+# vim: ts=4:sw=4:et:cc=120
+
+import hashlib
+import json
+
+import aiofiles
+import httpx
+import pytest
+
+from ace.data_model import ContentMetadata
+from ace.system.remote import RemoteACESystem
+
+TEST_BYTES = b"hello world"
+TEST_SHA256 = hashlib.sha256(TEST_BYTES).hexdigest()
+
+
+class MockStorage:
+    def __init__(self):
+        self.content = {}  # key = sha256, value = the uploaded request body
+        self.roots = []  # list of (sha256, uuid)
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "HEAD":
+            return httpx.Response(200 if request.url.path.split("/")[-1] in self.content else 404)
+
+        if request.url.path == "/storage":
+            body = request.read()
+            self.content[TEST_SHA256] = body
+            return httpx.Response(200, json=json.loads(ContentMetadata(name="test", sha256=TEST_SHA256).json()))
+
+        _, _, sha256, _, uuid = request.url.path.split("/")
+        if sha256 not in self.content:
+            return httpx.Response(404)
+
+        self.roots.append((sha256, uuid))
+        return httpx.Response(200)
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_store_existing_content(tmp_path):
+    storage = MockStorage()
+    system = RemoteACESystem("http://test", "test", client_kwargs={"transport": httpx.MockTransport(storage)})
+
+    assert not await system.content_exists(TEST_SHA256)
+    assert await system.store_content(TEST_BYTES, ContentMetadata(name="test")) == TEST_SHA256
+    assert await system.content_exists(TEST_SHA256)
+    assert TEST_BYTES in storage.content[TEST_SHA256]
+
+    # content is uploaded again if the sha256 is not known
+    storage.content[TEST_SHA256] = b""
+    assert await system.store_content(TEST_BYTES, ContentMetadata(name="test")) == TEST_SHA256
+    assert TEST_BYTES in storage.content[TEST_SHA256]
+
+    # otherwise the content is not uploaded again, only the root references are registered
+    storage.content[TEST_SHA256] = b""
+    meta = ContentMetadata(name="test", sha256=TEST_SHA256, roots=["root_1", "root_2"])
+    assert await system.store_content(TEST_BYTES, meta) == TEST_SHA256
+    assert storage.content[TEST_SHA256] == b""
+    assert storage.roots == [(TEST_SHA256, "root_1"), (TEST_SHA256, "root_2")]
+
+    # same for files
+    path = tmp_path / "test.txt"
+    path.write_bytes(TEST_BYTES)
+    assert await system.save_file(str(path), sha256=TEST_SHA256, roots=["root_3"]) == TEST_SHA256
+    async with aiofiles.open(path, "rb") as fp:
+        assert await system.store_content(fp, ContentMetadata(name="test", sha256=TEST_SHA256)) == TEST_SHA256
+        assert await fp.read() == TEST_BYTES
+
+    assert storage.content[TEST_SHA256] == b""
+    assert storage.roots[-1] == (TEST_SHA256, "root_3")
+    await system.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_store_content_stream_file(tmp_path):
+    storage = MockStorage()
+    system = RemoteACESystem("http://test", "test", client_kwargs={"transport": httpx.MockTransport(storage)})
+
+    path = tmp_path / "test.txt"
+    path.write_bytes(TEST_BYTES)
+    async with aiofiles.open(path, "rb") as fp:
+        assert await system.store_content(fp, ContentMetadata(name="test")) == TEST_SHA256
+        # the file handle belongs to the caller so it is left open
+        await fp.seek(0)
+        assert await fp.read() == TEST_BYTES
+
+    assert TEST_BYTES in storage.content[TEST_SHA256]
+    await system.stop()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "value,size,expected",
+    [
+        ("bytes=0-4", 11, (0, 4)),
+        ("bytes=6-", 11, (6, 10)),
+        ("bytes=-5", 11, (6, 10)),
+        ("bytes=-50", 11, (0, 10)),
+        ("bytes=0-100", 11, (0, 10)),
+        ("bytes=0-0", 11, (0, 0)),
+        # ignored
+        ("bytes=4-0", 11, None),
+        ("bytes=0-1,4-5", 11, None),
+        ("items=0-4", 11, None),
+        ("bytes=-", 11, None),
+        ("bytes=a-b", 11, None),
+        # not satisfiable
+        ("bytes=11-", 11, ValueError),
+        ("bytes=-0", 11, ValueError),
+        ("bytes=0-", 0, ValueError),
+    ],
+)
+def test_parse_range_header(value, size, expected):
+    from ace.system.distributed.storage import parse_range_header
+
+    if expected is ValueError:
+        with pytest.raises(ValueError):
+            parse_range_header(value, size)
+    else:
+        assert parse_range_header(value, size) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_store_content_stream_reader(tmp_path):
+    storage = MockStorage()
+    system = RemoteACESystem("http://test", "test", client_kwargs={"transport": httpx.MockTransport(storage)})
+
+    path = tmp_path / "test.txt"
+    path.write_bytes(TEST_BYTES)
+    with open(path, "rb") as fp:
+        assert await system.store_content(fp, ContentMetadata(name="test", custom="custom")) == TEST_SHA256
+        # file objects are closed once the content is stored
+        assert fp.closed
+
+    body = storage.content[TEST_SHA256]
+    assert b'name="name"\r\n\r\ntest\r\n' in body
+    assert b'name="custom"\r\n\r\ncustom\r\n' in body
+    assert TEST_BYTES in body
+    await system.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "offset,length,expected",
+    [
+        (0, 5, b"hello"),
+        (6, None, b"world"),
+        (2, 3, b"llo"),
+        (100, None, b""),
+    ],
+)
+async def test_iter_content_range_ignored(offset, length, expected):
+    # the server ignores the Range header and returns all of the content
+    system = RemoteACESystem(
+        "http://test",
+        "test",
+        client_kwargs={"transport": httpx.MockTransport(lambda _: httpx.Response(200, content=TEST_BYTES))},
+    )
+
+    assert (
+        b"".join([_ async for _ in await system.iter_content(TEST_SHA256, 2, offset=offset, length=length)]) == expected
+    )
+    await system.stop()
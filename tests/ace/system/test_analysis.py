@@ -483,6 +483,42 @@ async def test_analysis_load(system):
     assert analysis._details is not None
 
 
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_root_save_details_bulk(system, monkeypatch):
+    amt = AnalysisModuleType("test", "")
+    root = system.new_root(details=TEST_DETAILS)
+    analysis = [root.add_observable("test", f"test_{_}").add_analysis(type=amt, details={"index": _}) for _ in range(5)]
+
+    # all of the details are saved with a single call
+    track_analysis_details_bulk = system.track_analysis_details_bulk
+    calls = []
+
+    async def _track_analysis_details_bulk(*args, **kwargs):
+        calls.append(args)
+        return await track_analysis_details_bulk(*args, **kwargs)
+
+    monkeypatch.setattr(system, "track_analysis_details_bulk", _track_analysis_details_bulk)
+    await root.save()
+    assert len(calls) == 1
+    assert not root._details_modified
+    assert not any([_._details_modified for _ in analysis])
+
+    # nothing was modified so nothing is saved
+    await root.save()
+    assert len(calls) == 1
+
+    # load them all at once
+    root = await system.get_root_analysis(root.uuid)
+    assert await root.preload_details() == 6
+    assert root._details == TEST_DETAILS
+    for index, _ in enumerate(analysis):
+        assert root.get_observable(_.observable).get_analysis(amt)._details == {"index": index}
+
+    # already loaded
+    assert await root.preload_details() == 0
+
+
 @pytest.mark.asyncio
 @pytest.mark.unit
 async def test_analysis_completed(system):
@@ -689,6 +725,31 @@ def test_root_copy():
     assert not (analysis_copy is analysis)
 
 
+@pytest.mark.unit
+def test_root_copy_matches_serialization():
+    root = RootAnalysis(tool="tool", desc="description", analysis_mode="test", expires=True, details={"a": "b"})
+    root.add_tag("tag")
+    root.add_detection_point("detection", "details")
+    amt = AnalysisModuleType("test", "")
+    observable = root.add_observable("test", "test", time=utc_now())
+    observable.add_directive("directive")
+    observable.exclude_analysis("other")
+    analysis = observable.add_analysis(type=amt, details={"test": "test"}, summary="summary")
+    child = analysis.add_observable("file", "abcd")
+    child.add_relationship("related", observable)
+    child.add_detection_point("detection")
+
+    root_copy = root.copy()
+    assert root_copy.to_dict() == RootAnalysis.from_dict(root.to_dict()).to_dict()
+
+    # modifying the copy does not modify the original
+    root_copy.get_observable(observable).add_tag("tag")
+    assert not observable.has_tag("tag")
+    root_copy.get_observable(child).get_relationships_by_type("related")[0].add_directive("new")
+    assert not observable.has_directive("new")
+    assert root_copy.get_observable(child).root is root_copy
+
+
 @pytest.mark.asyncio
 @pytest.mark.unit
 async def test_storage_dir(tmpdir):
@@ -847,6 +908,28 @@ def test_root_get_observable():
     assert root.get_observable(RootAnalysis().add_observable("test", "blah")) is None
 
 
+@pytest.mark.unit
+def test_root_get_observable_index():
+    root = RootAnalysis()
+    event_time = utc_now()
+    observable = root.add_observable("test", "test", time=event_time)
+    assert root.add_observable("test", "test", time=event_time) is observable
+    assert root.get_observable(Observable("test", "test", time=event_time)) is observable
+    # time is part of the key
+    assert root.get_observable(Observable("test", "test")) is None
+
+    # modifying the observable updates the index
+    observable.value = "other"
+    assert root.get_observable(Observable("test", "test", time=event_time)) is None
+    assert root.get_observable(Observable("test", "other", time=event_time)) is observable
+
+    # the index is rebuilt when the root is loaded
+    root = RootAnalysis.from_dict(root.to_dict())
+    assert root.get_observable(Observable("test", "other", time=event_time)).uuid == observable.uuid
+    assert root.add_observable("test", "other", time=event_time).uuid == observable.uuid
+    assert len(root.all_observables) == 1
+
+
 #
 # Merging
 #
@@ -1,8 +1,12 @@
 # vim: ts=4:sw=4:et:cc=120
 
+import asyncio
+
 import pytest
 
 from ace.analysis import RootAnalysis, Observable, Analysis, AnalysisModuleType
+from ace.constants import EVENT_AMT_MODIFIED
+from ace.data_model import Event
 from ace.exceptions import (
     AnalysisModuleTypeVersionError,
     AnalysisModuleTypeExtendedVersionError,
@@ -101,6 +105,14 @@ async def test_delete_analysis_module_type(system):
     assert await system.get_analysis_module_type(amt.name) is None
 
 
+def _tagged_observable(*tags) -> Observable:
+    observable = RootAnalysis().add_observable("test", "test")
+    for tag in tags:
+        observable.add_tag(tag)
+
+    return observable
+
+
 class TempAnalysisModuleType(AnalysisModuleType):
     def __init__(self, *args, **kwargs):
         super().__init__(name="test", description="test", *args, **kwargs)
@@ -223,6 +235,32 @@ class TempAnalysisModuleType(AnalysisModuleType):
             RootAnalysis().add_observable("test", "test"),
             False,
         ),
+        (
+            TempAnalysisModuleType(conditions=["re_value:^te"]),
+            RootAnalysis().add_observable("test", "test"),
+            True,
+        ),
+        (
+            TempAnalysisModuleType(conditions=["re_value:^t3"]),
+            RootAnalysis().add_observable("test", "test"),
+            False,
+        ),
+        (
+            TempAnalysisModuleType(conditions=["re_tag:^mal"]),
+            _tagged_observable("other", "malicious"),
+            True,
+        ),
+        (
+            TempAnalysisModuleType(conditions=["re_tag:^mal"]),
+            _tagged_observable("other"),
+            False,
+        ),
+        # unknown condition type
+        (
+            TempAnalysisModuleType(conditions=["unknown:test"]),
+            RootAnalysis().add_observable("test", "test"),
+            False,
+        ),
         # valid dependency TODO
         # TODO need to start making modifications to RootAnalysis, Analysis and Observable to support this new system
         # (TempAnalysisModuleType(dependencies=['analysis_module']), RootAnalysis().add_observable("ipv4", '1.2.3.4'), True),
@@ -231,3 +269,178 @@ class TempAnalysisModuleType(AnalysisModuleType):
 @pytest.mark.integration
 async def test_accepts(amt: AnalysisModuleType, observable: Observable, expected_result: bool, system):
     assert await amt.accepts(observable, system) == expected_result
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_accepts_condition_buffers(system, monkeypatch):
+    import ace.analysis
+
+    rendered = []
+    render_condition_buffer = ace.analysis.render_condition_buffer
+
+    def _render_condition_buffer(root):
+        rendered.append(root)
+        return render_condition_buffer(root)
+
+    monkeypatch.setattr(ace.analysis, "render_condition_buffer", _render_condition_buffer)
+
+    root = RootAnalysis()
+    observable_1 = root.add_observable("test", "test")
+    observable_2 = root.add_observable("test", "other")
+    amt_1 = TempAnalysisModuleType(conditions=["re:test"])
+    amt_2 = TempAnalysisModuleType(conditions=["re:other"])
+
+    # the root is rendered once for all of the checks that share the buffers
+    condition_buffers = {}
+    for observable in (observable_1, observable_2):
+        assert await amt_1.accepts(observable, system, condition_buffers)
+        assert await amt_2.accepts(observable, system, condition_buffers)
+
+    assert len(rendered) == 1
+
+    # otherwise it is rendered every time
+    assert await amt_1.accepts(observable_1, system)
+    assert await amt_2.accepts(observable_1, system)
+    assert len(rendered) == 3
+
+    # narrower conditions do not render the root at all
+    assert await TempAnalysisModuleType(conditions=["re_value:test"]).accepts(observable_1, system)
+    assert len(rendered) == 3
+
+
+@pytest.mark.unit
+def test_analysis_module_type_index():
+    from ace.system.base.module_tracking import AnalysisModuleTypeIndex
+
+    amt_any = AnalysisModuleType("any", "")
+    amt_ipv4 = AnalysisModuleType("ipv4", "", observable_types=["ipv4"])
+    amt_mode = AnalysisModuleType("mode", "", modes=["correlation"])
+    amt_directives = AnalysisModuleType("directives", "", directives=["crawl", "sandbox"])
+    amt_tags = AnalysisModuleType("tags", "", tags=["test"])
+    amt_manual = AnalysisModuleType("manual", "", manual=True)
+    index = AnalysisModuleTypeIndex([amt_any, amt_ipv4, amt_mode, amt_directives, amt_tags, amt_manual])
+
+    root = RootAnalysis()
+    observable = root.add_observable("test", "test")
+    assert index.get_candidates(observable) == [amt_any]
+
+    observable = root.add_observable("ipv4", "1.2.3.4")
+    assert index.get_candidates(observable) == [amt_any, amt_ipv4]
+
+    observable.add_directive("crawl")
+    assert index.get_candidates(observable) == [amt_any, amt_ipv4]
+    observable.add_directive("sandbox")
+    assert index.get_candidates(observable) == [amt_any, amt_ipv4, amt_directives]
+
+    observable.add_tag("test")
+    assert index.get_candidates(observable) == [amt_any, amt_ipv4, amt_directives, amt_tags]
+
+    observable.request_analysis(amt_manual)
+    assert index.get_candidates(observable) == [amt_any, amt_ipv4, amt_directives, amt_tags, amt_manual]
+
+    root = RootAnalysis(analysis_mode="correlation")
+    observable = root.add_observable("test", "test")
+    assert index.get_candidates(observable) == [amt_any, amt_mode]
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_analysis_module_type_index_invalidation(system):
+    observable = RootAnalysis().add_observable("test", "test")
+    assert (await system.get_analysis_module_type_index()).get_candidates(observable) == []
+
+    amt = AnalysisModuleType("test", "")
+    await system.register_analysis_module_type(amt)
+    assert (await system.get_analysis_module_type_index()).get_candidates(observable) == [amt]
+
+    amt_modified = AnalysisModuleType("test", "", version="2.0.0", observable_types=["ipv4"])
+    await system.register_analysis_module_type(amt_modified)
+    assert (await system.get_analysis_module_type_index()).get_candidates(observable) == []
+
+    await system.delete_analysis_module_type(amt_modified)
+    assert not (await system.get_analysis_module_type_index()).amts
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_analysis_module_type_registry(system, monkeypatch):
+    amt = AnalysisModuleType("test", "")
+    await system.register_analysis_module_type(amt)
+    # let the system receive its own events
+    await asyncio.sleep(0.1)
+    assert await system.get_analysis_module_type("test") == amt
+    generation = system.amt_generation
+
+    # the registered types are served from memory
+    async def _fail(*args, **kwargs):
+        raise RuntimeError()
+
+    monkeypatch.setattr(system, "i_get_all_analysis_module_types", _fail)
+    assert await system.get_analysis_module_type("test") == amt
+    assert await system.get_analysis_module_type("unknown") is None
+    assert await system.get_all_analysis_module_types() == [amt]
+    assert system.amt_generation == generation
+    monkeypatch.undo()
+
+    # a change made by another system is picked up through the events
+    amt_modified = AnalysisModuleType("test", "", extended_version={"key": "value"})
+    await system.i_track_analysis_module_type(amt_modified)
+    assert await system.get_analysis_module_type("test") == amt
+    await system.amt_index_event_handler.handle_event(Event(name=EVENT_AMT_MODIFIED, args=amt_modified.to_dict()))
+    assert system.amt_generation > generation
+    assert await system.get_analysis_module_type("test") == amt_modified
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_analysis_module_type_registry_stale_build(system, monkeypatch):
+    amt = AnalysisModuleType("test", "")
+    await system.register_analysis_module_type(amt)
+    await system.get_analysis_module_type_index()
+    system.invalidate_analysis_module_type_index()
+
+    # the types change while the index is being built
+    i_get_all_analysis_module_types = system.i_get_all_analysis_module_types
+
+    async def _i_get_all_analysis_module_types():
+        result = await i_get_all_analysis_module_types()
+        system.invalidate_analysis_module_type_index()
+        return result
+
+    monkeypatch.setattr(system, "i_get_all_analysis_module_types", _i_get_all_analysis_module_types)
+    assert (await system.get_analysis_module_type_index()).amts == {"test": amt}
+    # so the index is not kept
+    assert system.amt_index is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_analysis_module_type_registry_ttl(system, monkeypatch):
+    amt = AnalysisModuleType("test", "")
+    await system.register_analysis_module_type(amt)
+    # let the system receive its own events
+    await asyncio.sleep(0.1)
+    assert await system.get_analysis_module_type("test") == amt
+
+    # a change made by another system where the event was missed
+    amt_modified = AnalysisModuleType("test", "", extended_version={"key": "value"})
+    await system.i_track_analysis_module_type(amt_modified)
+    assert await system.get_analysis_module_type("test") == amt
+
+    # is picked up once the index expires
+    monkeypatch.setattr(system, "amt_index_expires", 0)
+    assert await system.get_analysis_module_type("test") == amt_modified
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_analysis_module_type_registry_copies(system):
+    amt = AnalysisModuleType("test", "", observable_types=["test"])
+    await system.register_analysis_module_type(amt)
+
+    # modifying the returned types does not modify the registry
+    (await system.get_analysis_module_type("test")).observable_types.append("other")
+    (await system.get_all_analysis_module_types())[0].timeout = 1
+    assert await system.get_analysis_module_type("test") == amt
+    assert await system.get_all_analysis_module_types() == [amt]
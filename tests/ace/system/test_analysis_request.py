@@ -46,6 +46,57 @@ async def test_analysis_request_serialization(system):
     assert request.modified_root == other.modified_root
 
 
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_compact_analysis_request_serialization(system):
+    root = system.new_root()
+    observable = root.add_observable("test", "1.2.3.4")
+    unrelated = [root.add_observable("test", f"unrelated_{index}") for index in range(10)]
+
+    request = observable.create_analysis_request(amt)
+    other = AnalysisRequest.from_json(request.to_json(compact=True), system)
+    assert other == request
+    assert other.observable == observable
+    assert len(other.root.all_observables) == 1
+    assert other.original_root is None and other.modified_root is None
+
+    # only the observable and what the analysis added are included in the result
+    request.initialize_result()
+    analysis = request.modified_observable.add_analysis(type=amt, details={"Hello": "World"})
+    new_observable = analysis.add_observable("test", "new")
+    existing_observable = analysis.add_observable("test", "unrelated_0")
+    new_observable.add_relationship("test", request.modified_root.get_observable(unrelated[1]))
+
+    other = AnalysisRequest.from_json(request.to_json(compact=True), system)
+    assert other.original_root is not None
+    assert len(other.original_root.all_observables) == 3
+    assert other.original_root.get_observable(new_observable) is None
+    assert len(other.modified_root.all_observables) == 4
+    assert other.modified_observable.get_analysis(amt).observables == [new_observable, existing_observable]
+    assert other.modified_root.get_observable(new_observable).has_relationship("test", unrelated[1])
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_compact_analysis_request_modified_unrelated_observable(system):
+    root = system.new_root()
+    observable = root.add_observable("test", "1.2.3.4")
+    unrelated = root.add_observable("test", "unrelated")
+    untouched = root.add_observable("test", "untouched")
+
+    request = observable.create_analysis_request(amt)
+    request.initialize_result()
+    request.modified_observable.add_analysis(type=amt, details={"Hello": "World"})
+    # the module modifies an observable that is not part of the analysis
+    request.modified_root.get_observable(unrelated).add_tag("tagged")
+
+    # the compact roots carry the same diff as the full roots
+    other = AnalysisRequest.from_json(request.to_json(compact=True), system)
+    assert not other.original_root.get_observable(unrelated).has_tag("tagged")
+    assert other.modified_root.get_observable(unrelated).has_tag("tagged")
+    assert other.modified_root.get_observable(untouched) is None
+
+
 @pytest.mark.asyncio
 @pytest.mark.unit
 async def test_is_observable_analysis_request(system):
@@ -134,6 +185,43 @@ async def test_track_analysis_request(system):
     assert not await system.get_analysis_requests_by_root(root.uuid)
 
 
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_track_analysis_requests(system):
+    await system.register_analysis_module_type(amt)
+    root = system.new_root()
+    requests = [root.add_observable("test", f"test_{_}").create_analysis_request(amt) for _ in range(3)]
+    await system.track_analysis_requests(requests)
+    assert await system.get_analysis_requests_by_request_ids([_.id for _ in requests]) == requests
+
+    # tracking again updates the existing requests
+    requests[0].status = TRACKING_STATUS_QUEUED
+    await system.track_analysis_requests(requests)
+    assert (await system.get_analysis_request_by_request_id(requests[0].id)).status == TRACKING_STATUS_QUEUED
+
+    # unknown requests are ignored
+    assert await system.delete_analysis_requests([requests[0], requests[1].id, "unknown"]) == 2
+    assert await system.get_analysis_requests_by_root(root.uuid) == [requests[2]]
+    assert await system.delete_analysis_requests([requests[0]]) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_track_analysis_requests_session(system):
+    if not hasattr(system, "get_db"):
+        pytest.skip("requires a database")
+
+    root = system.new_root()
+    requests = [root.create_analysis_request(), root.create_analysis_request()]
+    async with system.get_db() as db:
+        await system.track_analysis_requests(requests, session=db)
+        assert await system.delete_analysis_requests([requests[0]], session=db) == 1
+        # the caller commits
+        await db.commit()
+
+    assert await system.get_analysis_requests_by_root(root.uuid) == [requests[1]]
+
+
 @pytest.mark.asyncio
 @pytest.mark.integration
 async def test_get_analysis_request_by_observable(system):
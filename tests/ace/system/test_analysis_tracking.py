@@ -5,6 +5,7 @@ import uuid
 import pytest
 
 from ace.analysis import RootAnalysis, Observable, Analysis, AnalysisModuleType
+from ace.compression import COMPRESSION_ZLIB, MARKER_ZLIB, CompressionSettings
 from ace.exceptions import UnknownRootAnalysisError
 from ace.system.base.analysis_tracking import CONFIG_ANALYSIS_ENCRYPTION_ENABLED
 
@@ -235,6 +236,72 @@ async def test_track_analysis_encrypted_details(system):
         assert await system.get_analysis_details(root.uuid) != TEST_DETAILS
 
 
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_track_analysis_compressed_details(system, monkeypatch):
+    large_details = {"hello": ["world"] * 1024}
+    monkeypatch.setattr(system, "compression_settings", CompressionSettings(algorithm=COMPRESSION_ZLIB, threshold=1024))
+    root = system.new_root(details=large_details)
+    await system.track_root_analysis(root)
+    await system.track_analysis_details(root, root.uuid, await root.get_details())
+    assert await system.get_analysis_details(root.uuid) == large_details
+    assert (await system.i_get_analysis_details(root.uuid)).startswith(MARKER_ZLIB)
+
+    # details below the threshold are stored as-is
+    _uuid = str(uuid.uuid4())
+    await system.track_analysis_details(root, _uuid, TEST_DETAILS)
+    assert await system.get_analysis_details(_uuid) == TEST_DETAILS
+    assert not (await system.i_get_analysis_details(_uuid)).startswith(MARKER_ZLIB)
+
+    # compression happens before encryption
+    await system.set_config(CONFIG_ANALYSIS_ENCRYPTION_ENABLED, True)
+    await system.track_analysis_details(root, root.uuid, await root.get_details())
+    assert await system.get_analysis_details(root.uuid) == large_details
+
+    # roots are compressed too
+    root = system.new_root()
+    for index in range(100):
+        root.add_observable("test", f"test_{index}")
+
+    await system.track_root_analysis(root)
+    assert (await system.get_root_analysis(root.uuid)).observables == root.observables
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_track_analysis_details_bulk(system):
+    root = system.new_root()
+    await system.track_root_analysis(root)
+
+    details = {str(uuid.uuid4()): {"index": _} for _ in range(5)}
+    # details that are None are not tracked
+    details[str(uuid.uuid4())] = None
+
+    tracked = await system.track_analysis_details_bulk(root, details)
+    assert sorted(tracked) == sorted([_ for _ in details if details[_] is not None])
+
+    # unknown uuids are not included
+    result = await system.get_analysis_details_bulk(list(details) + [str(uuid.uuid4())])
+    assert result == {key: value for key, value in details.items() if value is not None}
+
+    # update existing and add new
+    update = {tracked[0]: {"index": "updated"}, str(uuid.uuid4()): TEST_DETAILS}
+    assert sorted(await system.track_analysis_details_bulk(root, update)) == sorted(update)
+    assert await system.get_analysis_details_bulk(list(update)) == update
+    assert await system.get_analysis_details(tracked[1]) == {"index": 1}
+
+    assert await system.get_analysis_details_bulk([]) == {}
+    assert await system.track_analysis_details_bulk(root, {}) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_track_analysis_details_bulk_unknown_root(system):
+    root = system.new_root()
+    with pytest.raises(UnknownRootAnalysisError):
+        await system.track_analysis_details_bulk(root, {str(uuid.uuid4()): TEST_DETAILS})
+
+
 @pytest.mark.asyncio
 @pytest.mark.unit
 async def test_analysis_details_exists(system):
@@ -293,3 +360,38 @@ async def test_track_details_to_unknown_root(system):
 @pytest.mark.integration
 async def test_delete_unknown_analysis_details(system):
     assert not await system.delete_analysis_details(str(uuid.uuid4()))
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_observable_tracking(system, monkeypatch):
+    root = system.new_root()
+    root.add_observable("test", OBSERVABLE_VALUE)
+    await root.save()
+    other_root = system.new_root()
+    other_root.add_observable("test", OBSERVABLE_VALUE)
+    await other_root.save()
+
+    assert sorted(await system.get_root_analysis_uuids_by_observable("test", OBSERVABLE_VALUE)) == sorted(
+        [root.uuid, other_root.uuid]
+    )
+    assert await system.get_root_analysis_uuids_by_observable("test", OBSERVABLE_VALUE_2) == []
+    assert await system.get_root_analysis_uuids_by_observable("other", OBSERVABLE_VALUE) == []
+
+    # observables added later are tracked as well
+    root.add_observable("test", OBSERVABLE_VALUE_2)
+    await root.save()
+    assert await system.get_root_analysis_uuids_by_observable("test", OBSERVABLE_VALUE_2) == [root.uuid]
+    assert sorted(await system.get_root_observable_values(root, "test")) == [OBSERVABLE_VALUE, OBSERVABLE_VALUE_2]
+    assert await system.get_root_observable_values(other_root.uuid, "test") == [OBSERVABLE_VALUE]
+
+    # even when the root is saved without a known previous version
+    root.add_observable("other", OBSERVABLE_VALUE)
+    monkeypatch.setattr(system, "root_digest_cache", None)
+    await root.save()
+    assert await system.get_root_analysis_uuids_by_observable("other", OBSERVABLE_VALUE) == [root.uuid]
+    assert len(await system.get_root_observable_values(root, "test")) == 2
+
+    assert await system.delete_root_analysis(root)
+    assert await system.get_root_analysis_uuids_by_observable("test", OBSERVABLE_VALUE) == [other_root.uuid]
+    assert await system.get_root_observable_values(root, "test") == []
@@ -49,3 +49,59 @@ async def test_delete_api_key(system, monkeypatch):
         monkeypatch.setattr(system, "encryption_settings", None)
         with pytest.raises(MissingEncryptionSettingsError):
             api_key = await system.delete_api_key("api_key_1")
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_api_key_cache(system, monkeypatch):
+    api_key = await system.create_api_key("api_key_1")
+    admin_api_key = await system.create_api_key("admin_key", is_admin=True)
+    assert await system.verify_api_key(api_key)
+    assert not await system.verify_api_key(api_key, is_admin=True)
+    assert await system.verify_api_key(admin_api_key, is_admin=True)
+
+    calls = []
+    i_verify_api_key = system.i_verify_api_key
+
+    async def _i_verify_api_key(*args, **kwargs):
+        calls.append(args)
+        return await i_verify_api_key(*args, **kwargs)
+
+    # verified keys are served from the cache
+    monkeypatch.setattr(system, "i_verify_api_key", _i_verify_api_key)
+    assert await system.verify_api_key(api_key)
+    assert await system.verify_api_key(admin_api_key, is_admin=True)
+    assert not calls
+
+    # failed verifications are not cached
+    assert not await system.verify_api_key(api_key, is_admin=True)
+    assert len(calls) == 1
+
+    # the cache is bounded
+    monkeypatch.setattr(system, "api_key_cache_size", 1)
+    assert await system.verify_api_key(admin_api_key)
+    assert len(system.api_key_cache) == 1
+
+    # deleting a key clears the cache
+    assert await system.delete_api_key("api_key_1")
+    assert not await system.verify_api_key(api_key)
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_api_key_deleted_during_verification(system, monkeypatch):
+    api_key = await system.create_api_key("api_key_1")
+    i_verify_api_key = system.i_verify_api_key
+
+    # the key is deleted while it's being verified
+    async def _i_verify_api_key(*args, **kwargs):
+        result = await i_verify_api_key(*args, **kwargs)
+        await system.delete_api_key("api_key_1")
+        return result
+
+    monkeypatch.setattr(system, "i_verify_api_key", _i_verify_api_key)
+    assert await system.verify_api_key(api_key)
+    monkeypatch.undo()
+
+    # so the verified key is not cached
+    assert not await system.verify_api_key(api_key)
@@ -0,0 +1,75 @@
+# vim: ts=4:sw=4:et:cc=120
+
+import datetime
+
+import pytest
+
+from ace.analysis import RootAnalysis, AnalysisModuleType
+from ace.codec import FastCodec, PydanticCodec, get_codec, set_codec
+from ace.system.requests import AnalysisRequest
+
+amt = AnalysisModuleType("test", "test", cache_ttl=600, extended_version={"key": "value"})
+
+
+def _create_root(system) -> RootAnalysis:
+    root = system.new_root(
+        tool="test",
+        desc="test",
+        event_time=datetime.datetime.now(datetime.timezone.utc),
+        state={"key": "value"},
+        details={"hello": "world"},
+    )
+    root.add_tag("root_tag")
+    root.add_detection_point("root detection", "details")
+    observable = root.add_observable("test", "test", time=datetime.datetime.now(datetime.timezone.utc))
+    observable.add_tag("tag")
+    observable.add_directive("directive")
+    observable.exclude_analysis(amt)
+    analysis = observable.add_analysis(type=amt, details={"hello": "world"}, summary="summary")
+    analysis.add_detection_point("detection")
+    child = analysis.add_observable("test", "child")
+    child.add_relationship("test", observable)
+    return root
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "encoder,decoder", [(FastCodec(), FastCodec()), (FastCodec(), PydanticCodec()), (PydanticCodec(), FastCodec())]
+)
+async def test_codec_root(encoder, decoder, system):
+    root = _create_root(system)
+    result = decoder.decode_root(encoder.encode_root(root), system)
+    assert result.to_dict() == root.to_dict()
+
+    result = decoder.decode_root(encoder.encode_root(root, exclude_analysis_details=True), system)
+    assert result.to_dict() == root.to_dict(exclude_analysis_details=True)
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize(
+    "encoder,decoder", [(FastCodec(), FastCodec()), (FastCodec(), PydanticCodec()), (PydanticCodec(), FastCodec())]
+)
+async def test_codec_request(compact, encoder, decoder, system):
+    root = _create_root(system)
+    observable = root.get_observable(root.all_observables[0])
+    request = observable.create_analysis_request(amt)
+    request.initialize_result()
+    request.modified_observable.get_analysis(amt).add_observable("test", "new")
+
+    result = decoder.decode_request(encoder.encode_request(request, compact=compact), system)
+    expected = AnalysisRequest.from_json(request.to_json(compact=compact), system)
+    assert result.to_dict() == expected.to_dict()
+
+
+@pytest.mark.unit
+def test_set_codec():
+    codec = get_codec()
+    assert isinstance(codec, FastCodec)
+    try:
+        set_codec(PydanticCodec())
+        assert isinstance(get_codec(), PydanticCodec)
+    finally:
+        set_codec(codec)
@@ -66,3 +66,89 @@ async def test_config_env_value(system):
     # but when it gets set it should return that
     await system.set_config("/test", "that")
     assert await system.get_config_value("/test") == "that"
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_config_cache(system, monkeypatch):
+    await system.set_config("/test", "test")
+    assert await system.get_config_value("/test") == "test"
+
+    # the next lookups are served from the cache
+    calls = []
+    i_get_config = system.i_get_config
+
+    async def _i_get_config(key):
+        calls.append(key)
+        return await i_get_config(key)
+
+    monkeypatch.setattr(system, "i_get_config", _i_get_config)
+    assert await system.get_config_value("/test") == "test"
+    assert await system.get_config_value("/missing") is None
+    assert await system.get_config_value("/missing") is None
+    assert calls == ["/missing"]
+
+    # changes made by this system invalidate the cache
+    await system.set_config("/test", "changed")
+    assert await system.get_config_value("/test") == "changed"
+    assert await system.delete_config("/test")
+    assert await system.get_config_value("/test") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_config_cache_event(system):
+    from ace.constants import EVENT_CONFIG_SET, EVENT_CONFIG_DELETE
+    from ace.data_model import Event
+
+    await system.set_config("/test", "test")
+    assert await system.get_config_value("/test") == "test"
+
+    # simulate the change being made by some other system
+    await system.i_set_config("/test", "changed")
+    assert await system.get_config_value("/test") == "test"
+    handler = system.config_cache_event_handler
+    await handler.handle_event(Event(name=EVENT_CONFIG_SET, args=["/test", "changed", None]))
+    assert await system.get_config_value("/test") == "changed"
+
+    await system.i_delete_config("/test")
+    await handler.handle_event(Event(name=EVENT_CONFIG_DELETE, args="/test"))
+    assert await system.get_config_value("/test") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_config_cache_invalidated_during_fetch(system, monkeypatch):
+    await system.set_config("/test", "test")
+    system.invalidate_config_cache()
+    i_get_config = system.i_get_config
+
+    # the setting is changed (by some other system) while it's being fetched
+    async def _i_get_config(key):
+        result = await i_get_config(key)
+        await system.i_set_config("/test", "changed")
+        system.invalidate_config_cache("/test")
+        return result
+
+    monkeypatch.setattr(system, "i_get_config", _i_get_config)
+    assert await system.get_config_value("/test") == "test"
+    monkeypatch.undo()
+
+    # so the value that was fetched is not cached
+    assert await system.get_config_value("/test") == "changed"
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_load_config(system, monkeypatch):
+    await system.set_config("/test", "test", "test docs")
+    assert await system.load_config() >= 1
+
+    async def _i_get_config(key):
+        raise RuntimeError()
+
+    # everything is served from the cache after the bulk load
+    monkeypatch.setattr(system, "i_get_config", _i_get_config)
+    assert (await system.get_config("/test")).documentation == "test docs"
+    assert await system.get_config_value("/test") == "test"
+    assert await system.get_config_value("/missing") is None
@@ -1,14 +1,17 @@
 # vim: sw=4:ts=4:et:cc=120
 
+import json
 import uuid
 
 import ace
 
+from ace.analysis import AnalysisModuleType
+from ace.constants import EVENT_PROCESSING_REQUEST_RESULT
 from ace.system.database import DatabaseACESystem
-from ace.system.database.schema import Config
+from ace.system.database.schema import Config, ObservableTracking, RootAnalysisDelta
 
 import pytest
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.sql import select, insert, text
 
 
@@ -179,6 +182,282 @@ async def test_retry_multi_sql_on_deadlock(system):
     )
 
 
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_unit_of_work(system):
+    if not isinstance(system, DatabaseACESystem):
+        return
+
+    root = system.new_root()
+    request = root.create_analysis_request()
+    queued = []
+
+    async def _queue(value):
+        queued.append(value)
+
+    async def _work():
+        assert system.get_unit_of_work() is not None
+        await system.track_analysis_request(request)
+        # nested calls join the unit of work
+        await system.run_in_unit_of_work(system.after_unit_of_work, _queue, "test")
+        assert await system.get_analysis_request_by_request_id(request.id) == request
+        # deferred until the unit of work completes
+        assert not queued
+        return True
+
+    assert await system.run_in_unit_of_work(_work)
+    assert system.get_unit_of_work() is None
+    assert queued == ["test"]
+    assert await system.get_analysis_request_by_request_id(request.id) == request
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_unit_of_work_rollback(system):
+    if not isinstance(system, DatabaseACESystem):
+        return
+
+    root = system.new_root()
+    request = root.create_analysis_request()
+    queued = []
+
+    async def _queue(value):
+        queued.append(value)
+
+    async def _work():
+        await system.track_analysis_request(request)
+        await root.save()
+        await system.after_unit_of_work(_queue, "test")
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        await system.run_in_unit_of_work(_work)
+
+    # none of it happened
+    assert await system.get_analysis_request_by_request_id(request.id) is None
+    assert not await system.root_analysis_exists(root)
+    assert not queued
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_unit_of_work_integrity_error(system):
+    if not isinstance(system, DatabaseACESystem):
+        return
+
+    root = system.new_root()
+
+    async def _work():
+        assert await system.i_track_root_analysis(root)
+        # fails with an IntegrityError which only rolls back the failed operation
+        assert not await system.i_track_root_analysis(root)
+
+    await system.run_in_unit_of_work(_work)
+    assert await system.root_analysis_exists(root)
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_unit_of_work_deadlock(system):
+    if not isinstance(system, DatabaseACESystem):
+        return
+
+    attempts = 0
+
+    async def _work():
+        nonlocal attempts
+        attempts += 1
+        async with system.get_db() as db:
+            await db.execute(insert(Config).values(key=f"test_{attempts}", value="value"))
+
+        if attempts == 1:
+            raise DBAPIError("INSERT", {}, Exception("DEADLOCK"))
+
+    # the entire unit of work is tried again
+    await system.run_in_unit_of_work(_work)
+    assert attempts == 2
+    async with system.get_db() as db:
+        assert (await db.execute(select(Config).where(Config.key == "test_1"))).one_or_none() is None
+        assert (await db.execute(select(Config).where(Config.key == "test_2"))).one_or_none() is not None
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_process_analysis_request_deadlock(monkeypatch, system):
+    if not isinstance(system, DatabaseACESystem):
+        return
+
+    await system.register_alert_system("test")
+    amt = AnalysisModuleType("test", "")
+    await system.register_analysis_module_type(amt)
+    root = system.new_root()
+    root.add_observable("test", "test")
+    await system.process_analysis_request(root.create_analysis_request())
+
+    request = await system.get_next_analysis_request("test", amt, 0)
+    request.initialize_result()
+    request.modified_observable.add_analysis(type=amt, details={"test": "test"})
+    request.modified_observable.add_detection_point("test")
+
+    calls = []
+
+    def _count(name, function):
+        async def _wrapper(*args, **kwargs):
+            calls.append(name)
+            return await function(*args, **kwargs)
+
+        return _wrapper
+
+    monkeypatch.setattr(system, "submit_alert", _count("submit_alert", system.submit_alert))
+    monkeypatch.setattr(system, "ack_work", _count("ack_work", system.ack_work))
+
+    original_delete_analysis_request = system.delete_analysis_request
+    attempts = 0
+
+    async def _delete_analysis_request(*args, **kwargs):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise DBAPIError("DELETE", {}, Exception("DEADLOCK"))
+
+        return await original_delete_analysis_request(*args, **kwargs)
+
+    monkeypatch.setattr(system, "delete_analysis_request", _delete_analysis_request)
+
+    fired = []
+    original_i_fire_event = system.i_fire_event
+
+    async def _i_fire_event(event):
+        fired.append(event.name)
+        return await original_i_fire_event(event)
+
+    monkeypatch.setattr(system, "i_fire_event", _i_fire_event)
+
+    # the entire unit of work is tried again but the side effects only happen once
+    await system.process_analysis_request(request)
+    assert attempts == 2
+    assert calls.count("submit_alert") == 1
+    assert calls.count("ack_work") == 1
+    assert fired.count(EVENT_PROCESSING_REQUEST_RESULT) == 1
+    assert await system.get_alerts("test") == [root.uuid]
+    assert await system.get_analysis_request(request.id) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_process_root_analysis_request_deadlock(monkeypatch, system):
+    if not isinstance(system, DatabaseACESystem):
+        return
+
+    amt = AnalysisModuleType("test", "")
+    await system.register_analysis_module_type(amt)
+    root = system.new_root()
+    observable = root.add_observable("test", "test")
+
+    original_delete_analysis_request = system.delete_analysis_request
+    attempts = 0
+
+    async def _delete_analysis_request(*args, **kwargs):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise DBAPIError("DELETE", {}, Exception("DEADLOCK"))
+
+        return await original_delete_analysis_request(*args, **kwargs)
+
+    monkeypatch.setattr(system, "delete_analysis_request", _delete_analysis_request)
+
+    # the second attempt starts from the request as it was before the first attempt
+    await system.process_analysis_request(root.create_analysis_request())
+    assert attempts == 2
+    assert await system.get_queue_size(amt) == 1
+
+    request_id = (await system.get_root_analysis(root)).get_observable(observable).request_tracking[amt.name]
+    assert await system.get_analysis_request(request_id)
+    assert (await system.get_next_analysis_request("test", amt, 0)).id == request_id
+
+
+async def _get_root_deltas(system, root) -> list[dict]:
+    async with system.get_db() as db:
+        query = select(RootAnalysisDelta.json_data).where(RootAnalysisDelta.root_uuid == root.uuid)
+        return [json.loads(_) for _ in (await db.execute(query.order_by(RootAnalysisDelta.id))).scalars().all()]
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_root_analysis_delta(system):
+    if not isinstance(system, DatabaseACESystem):
+        return
+
+    root = system.new_root()
+    observable = root.add_observable("test", "test_1")
+    await root.save()
+
+    # only the new observable is stored
+    new_observable = root.add_observable("test", "test_2")
+    await root.save()
+    deltas = await _get_root_deltas(system, root)
+    assert len(deltas) == 1
+    assert list(deltas[0]["observables"]) == [new_observable.uuid]
+    assert list(deltas[0]["root"]) == ["observable_ids"]
+    assert not deltas[0]["removed"]
+
+    # changes to the root itself
+    root.description = "test"
+    new_observable.add_tag("test")
+    await root.save()
+    deltas = await _get_root_deltas(system, root)
+    assert len(deltas) == 2
+    assert list(deltas[1]["observables"]) == [new_observable.uuid]
+    assert deltas[1]["root"]["description"] == "test"
+    assert "observable_ids" not in deltas[1]["root"]
+
+    # the root is the snapshot plus the deltas
+    loaded_root = await system.get_root_analysis(root)
+    assert loaded_root.version == root.version
+    assert loaded_root.description == "test"
+    assert loaded_root.get_observable(observable) == observable
+    assert loaded_root.get_observable(new_observable).has_tag("test")
+
+    # and can be updated from the loaded version
+    loaded_root.add_observable("test", "test_3")
+    await loaded_root.save()
+    assert len(await _get_root_deltas(system, root)) == 3
+    assert len((await system.get_root_analysis(root)).all_observables) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_root_analysis_delta_compaction(system, monkeypatch):
+    if not isinstance(system, DatabaseACESystem):
+        return
+
+    monkeypatch.setattr(system, "root_delta_compaction_threshold", 3)
+    root = system.new_root()
+    await root.save()
+    for index in range(2):
+        root.add_observable("test", f"test_{index}")
+        await root.save()
+
+    assert len(await _get_root_deltas(system, root)) == 2
+
+    # the snapshot is rewritten when the threshold is reached
+    root.add_observable("test", "test_2")
+    await root.save()
+    assert not await _get_root_deltas(system, root)
+    assert len((await system.get_root_analysis(root)).all_observables) == 3
+
+    # or when the previous version of the root is not known
+    root.add_observable("test", "test_3")
+    await root.save()
+    assert len(await _get_root_deltas(system, root)) == 1
+    monkeypatch.setattr(system, "root_digest_cache", None)
+    root.add_observable("test", "test_4")
+    await root.save()
+    assert not await _get_root_deltas(system, root)
+    assert len((await system.get_root_analysis(root)).all_observables) == 5
+
+
 # @pytest.mark.unit
 # def test_retry_decorator():
 # @retry
@@ -186,3 +465,11 @@ async def test_retry_multi_sql_on_deadlock(system):
 # pass
 
 # my_func()
+
+
+@pytest.mark.unit
+def test_observable_tracking_index_lengths():
+    # MySQL cannot index columns without a length
+    for index in ObservableTracking.__table__.indexes:
+        for column in index.columns:
+            assert getattr(column.type, "length", None), f"{index.name} column {column.name}"
@@ -0,0 +1,133 @@
+# vim: ts=4:sw=4:et:cc=120
+
+import asyncio
+
+import pytest
+
+from ace.analysis import AnalysisModuleType
+from ace.constants import *
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_acquire_maintenance_lock(system):
+    assert await system.acquire_maintenance_lock("test", 60)
+    # already locked
+    assert not await system.acquire_maintenance_lock("test", 60)
+    # different lock
+    assert await system.acquire_maintenance_lock("other", 60)
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_acquire_expired_maintenance_lock(system):
+    assert await system.acquire_maintenance_lock("test", 0.01)
+    await asyncio.sleep(0.05)
+    assert await system.acquire_maintenance_lock("test", 60)
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_delete_expired_root_analysis(system):
+    expiring_root = system.new_root(expires=True)
+    await system.track_root_analysis(expiring_root)
+    root = system.new_root()
+    await system.track_root_analysis(root)
+
+    assert await system.delete_expired_root_analysis() == 1
+    assert not await system.root_analysis_exists(expiring_root)
+    assert await system.root_analysis_exists(root)
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_delete_expired_root_analysis_batches(monkeypatch, system):
+    monkeypatch.setattr(system, "expired_root_batch_size", 2)
+    expiring_roots = [system.new_root(expires=True) for _ in range(5)]
+    for root in expiring_roots:
+        await system.track_root_analysis(root)
+
+    assert await system.delete_expired_root_analysis() == 5
+    assert not any([await system.root_analysis_exists(root) for root in expiring_roots])
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_delete_expired_root_analysis_not_loaded(monkeypatch, system):
+    # roots with detection points
+    detection_root = system.new_root(expires=True)
+    detection_root.add_detection_point("test")
+    await system.track_root_analysis(detection_root)
+
+    # and roots with outstanding analysis requests are not even loaded
+    requested_root = system.new_root(expires=True)
+    await system.track_root_analysis(requested_root)
+    await system.track_analysis_request(requested_root.create_analysis_request())
+
+    async def _get_root_analysis(root):
+        raise AssertionError(f"loaded {root}")
+
+    monkeypatch.setattr(system, "get_root_analysis", _get_root_analysis)
+    assert await system.delete_expired_root_analysis() == 0
+    assert await system.root_analysis_exists(detection_root)
+    assert await system.root_analysis_exists(requested_root)
+
+
+async def _create_expired_request(system):
+    amt = await system.register_analysis_module_type(
+        AnalysisModuleType(name="test", description="test", timeout=0, cache_ttl=600)  # immediately expire
+    )
+    root = system.new_root()
+    root.add_observable("test", "test")
+    await root.submit()
+
+    request = await system.get_next_analysis_request("owner", amt, 0)
+    assert request.status == TRACKING_STATUS_ANALYZING
+    return request
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_run_maintenance(system):
+    request = await _create_expired_request(system)
+
+    result = await system.run_maintenance()
+    assert result == {
+        SYSTEM_LOCK_EXPIRED_ANALYSIS_REQUESTS: 1,
+        SYSTEM_LOCK_EXPIRED_CACHED_ANALYSIS_RESULTS: None,
+        SYSTEM_LOCK_EXPIRED_CONTENT: 0,
+        SYSTEM_LOCK_EXPIRED_ROOT_ANALYSIS: 0,
+    }
+
+    # should be back in the queue
+    request = await system.get_analysis_request_by_request_id(request.id)
+    assert request.status == TRACKING_STATUS_QUEUED
+    assert request.owner is None
+
+    # nothing is due yet
+    assert await system.run_maintenance() == {}
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_maintenance_task(system):
+    request = await _create_expired_request(system)
+
+    system.maintenance_enabled = True
+    try:
+        await system.start_maintenance()
+        assert system.maintenance_task is not None
+
+        # the first pass runs right away
+        for _ in range(100):
+            if (await system.get_analysis_request_by_request_id(request.id)).status == TRACKING_STATUS_QUEUED:
+                break
+
+            await asyncio.sleep(0.01)
+
+        assert (await system.get_analysis_request_by_request_id(request.id)).status == TRACKING_STATUS_QUEUED
+    finally:
+        await system.stop_maintenance()
+        del system.maintenance_enabled
+
+    assert system.maintenance_task is None
@@ -73,6 +73,34 @@ async def test_process_root_analysis_request(system):
     assert await system.get_analysis_request(root_request.id) is None
 
 
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_process_root_analysis_request_single_write(monkeypatch, system):
+    amt = AnalysisModuleType(name=ANALYSIS_TYPE_TEST, description="blah")
+    assert await system.register_analysis_module_type(amt) == amt
+
+    root = system.new_root()
+    for index in range(5):
+        root.add_observable("test", f"test_{index}")
+
+    original_track_root_analysis = system.track_root_analysis
+    write_count = 0
+
+    async def counting_track_root_analysis(_root):
+        nonlocal write_count
+        write_count += 1
+        return await original_track_root_analysis(_root)
+
+    monkeypatch.setattr(system, "track_root_analysis", counting_track_root_analysis)
+    await system.process_analysis_request(root.create_analysis_request())
+
+    # all five requests are tracked with a single write of the root
+    assert write_count == 1
+    assert await system.get_queue_size(amt) == 5
+    root = await system.get_root_analysis(root)
+    assert all(root.analysis_tracked(observable, amt) for observable in root.observables)
+
+
 @pytest.mark.asyncio
 @pytest.mark.integration
 async def test_process_parallel_root_analysis_request(monkeypatch, system):
@@ -254,6 +282,44 @@ async def test_process_analysis_result(cache_ttl, system):
     assert await system.get_analysis_request(request.id) is None
 
 
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_process_compact_analysis_result(system):
+    amt = AnalysisModuleType(ANALYSIS_TYPE_TEST, "blah", observable_types=["test"])
+    assert await system.register_analysis_module_type(amt) == amt
+
+    root = system.new_root()
+    test_observable = root.add_observable("test", "test")
+    unrelated_observable = root.add_observable("other", "unrelated")
+    await root.submit()
+
+    request = await system.get_next_analysis_request(OWNER_UUID, amt, 0)
+    assert request.observable == test_observable
+    request.initialize_result()
+    request.modified_root.add_tag("root_tag")
+    analysis = request.modified_observable.add_analysis(type=amt, details={"Hello": "World"})
+    new_observable = analysis.add_observable("test", "new")
+    new_observable.add_tag("new_tag")
+
+    # submit the result in the compact format
+    compact_request = AnalysisRequest.from_json(request.to_json(compact=True), system)
+    assert compact_request.modified_root.get_observable(unrelated_observable) is None
+    await system.process_analysis_request(compact_request)
+
+    root = await system.get_root_analysis(root.uuid)
+    assert root.has_tag("root_tag")
+    assert root.get_observable(unrelated_observable)
+    analysis = root.get_observable(test_observable).get_analysis(amt)
+    assert await analysis.get_details() == {"Hello": "World"}
+    assert analysis.observables == [new_observable]
+    assert root.get_observable(new_observable).has_tag("new_tag")
+
+    # the new observable is analyzed with the full root
+    request = await system.get_next_analysis_request(OWNER_UUID, amt, 0)
+    assert request.observable == new_observable
+    assert request.root.get_observable(unrelated_observable)
+
+
 @pytest.mark.asyncio
 @pytest.mark.integration
 async def test_process_analysis_result_modified_root(monkeypatch, system):
@@ -1,16 +1,20 @@
 import datetime
 import filecmp
+import hashlib
 import io
 import os.path
-
-import pytest
+import time
 
 from ace.analysis import RootAnalysis
 from ace.data_model import ContentMetadata
 from ace.exceptions import UnknownFileError
 from ace.system.base.storage import CONFIG_STORAGE_ENCRYPTION_ENABLED
+from ace.system.database.schema import Storage
 from ace.time import utc_now
 
+import pytest
+from sqlalchemy.sql import update
+
 TEST_STRING = lambda: "hello world"
 TEST_BYTES = lambda: b"hello world"
 TEST_IO = lambda: io.BytesIO(b"hello world")
@@ -118,6 +122,32 @@ async def test_iter_content(generate_input_data, name, meta, tmpdir, system):
             pass
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "offset,length,buffer_size",
+    [
+        (0, None, None),
+        (0, None, 3),
+        (0, 5, None),
+        (6, None, None),
+        (6, None, 2),
+        (3, 4, 2),
+        (10, 100, None),
+        (11, None, None),
+        (100, None, None),
+        (3, 0, None),
+    ],
+)
+@pytest.mark.integration
+async def test_iter_content_range(set_storage_encryption, offset, length, buffer_size, system):
+    sha256 = await system.store_content(TEST_BYTES(), ContentMetadata(name=TEST_NAME))
+    chunks = [_ async for _ in await system.iter_content(sha256, buffer_size, offset=offset, length=length)]
+    expected = TEST_BYTES()[offset:] if length is None else TEST_BYTES()[offset : offset + length]
+    assert b"".join(chunks) == expected
+    if buffer_size is not None and not await system.storage_encryption_enabled():
+        assert all([len(_) <= buffer_size for _ in chunks])
+
+
 @pytest.mark.asyncio
 @pytest.mark.integration
 async def test_store_duplicate(tmpdir, system):
@@ -144,6 +174,96 @@ async def test_store_duplicate(tmpdir, system):
     # assert current_meta.custom == "2"
 
 
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_store_content_addressed(set_storage_encryption, system):
+    sha256 = await system.store_content(TEST_BYTES(), ContentMetadata(name=TEST_NAME))
+    meta = await system.get_content_meta(sha256)
+
+    # content is stored in a file named after the hash
+    assert os.path.basename(meta.location) == sha256
+    # and no temporary files are left behind
+    assert not os.listdir(os.path.join(system.storage_root, ".tmp"))
+
+    # storing it again uses the same file (which is not written again)
+    stat = os.stat(meta.location)
+    assert await system.store_content(TEST_BYTES(), ContentMetadata(name="other.txt")) == sha256
+    assert os.path.exists(meta.location)
+    assert os.stat(meta.location).st_ino == stat.st_ino
+    assert await system.get_content_bytes(sha256) == TEST_BYTES()
+    assert not os.listdir(os.path.join(system.storage_root, ".tmp"))
+
+    # the file is removed with the content
+    assert await system.delete_content(sha256)
+    assert not os.path.exists(meta.location)
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_store_content_stored_concurrently(system, monkeypatch):
+    sha256 = await system.store_content(TEST_BYTES(), ContentMetadata(name=TEST_NAME))
+    meta = await system.get_content_meta(sha256)
+
+    # the existing content is stored in a legacy (uuid named) file
+    legacy_path = await system.initialize_file_path()
+    os.rename(meta.location, legacy_path)
+    async with system.get_db() as db:
+        await db.execute(update(Storage).where(Storage.sha256 == sha256).values(location=legacy_path))
+        await db.commit()
+
+    # and the same content is stored at the same time
+    get_content_meta = system.get_content_meta
+    calls = 0
+
+    async def _get_content_meta(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            return None
+
+        return await get_content_meta(*args, **kwargs)
+
+    monkeypatch.setattr(system, "get_content_meta", _get_content_meta)
+    assert await system.store_content(TEST_BYTES(), ContentMetadata(name=TEST_NAME)) == sha256
+    monkeypatch.undo()
+
+    # the file that was just written is not left behind
+    assert not os.path.exists(meta.location)
+    assert (await system.get_content_meta(sha256)).location == legacy_path
+    assert await system.get_content_bytes(sha256) == TEST_BYTES()
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+async def test_delete_stale_temp_files(system):
+    temp_dir = os.path.dirname(await system.initialize_temp_file_path())
+    stale_path = os.path.join(temp_dir, "stale")
+    recent_path = os.path.join(temp_dir, "recent")
+    for path in (stale_path, recent_path):
+        with open(path, "wb") as fp:
+            fp.write(TEST_BYTES())
+
+    stale_time = time.time() - system.storage_temp_file_max_age - 1
+    os.utime(stale_path, (stale_time, stale_time))
+
+    # only the temporary files that are too old to still be in use are deleted
+    assert await system.delete_stale_temp_files() == 1
+    assert not os.path.exists(stale_path)
+    assert os.path.exists(recent_path)
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_content_exists(system):
+    sha256 = hashlib.sha256(TEST_BYTES()).hexdigest()
+    assert not await system.content_exists(sha256)
+    assert await system.store_content(TEST_BYTES(), ContentMetadata(name=TEST_NAME)) == sha256
+    assert await system.content_exists(sha256)
+    assert await system.content_exists(sha256.upper())
+    assert await system.delete_content(sha256)
+    assert not await system.content_exists(sha256)
+
+
 @pytest.mark.asyncio
 @pytest.mark.unit
 async def test_store_get_file(tmpdir, system):
@@ -343,3 +463,61 @@ async def test_root_analysis_association(tmp_path, system):
 
     # should be gone
     assert await system.get_content_meta(sha256) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_storage_chunk_size(set_storage_encryption, monkeypatch, system):
+    data = os.urandom(256 * 1024 + 1)
+
+    # content stored with one chunk size can be read with another
+    monkeypatch.setattr(system, "storage_chunk_size", 64 * 1024)
+    sha256 = await system.store_content(data, ContentMetadata(name=TEST_NAME))
+    monkeypatch.setattr(system, "storage_chunk_size", 1024 * 1024)
+    assert await system.get_content_bytes(sha256) == data
+
+    # content is read in chunks of storage_chunk_size by default
+    # encrypted content is decrypted in the chunks it was encrypted in when it was stored
+    monkeypatch.setattr(system, "storage_chunk_size", 128 * 1024)
+    chunks = [_ async for _ in await system.iter_content(sha256)]
+    assert b"".join(chunks) == data
+    if await system.storage_encryption_enabled():
+        assert [len(_) for _ in chunks] == [64 * 1024] * 4 + [1]
+    else:
+        assert [len(_) for _ in chunks] == [128 * 1024] * 2 + [1]
+
+
+@pytest.mark.asyncio
+@pytest.mark.slow
+@pytest.mark.parametrize("encrypted", [False, True])
+async def test_storage_throughput(encrypted, monkeypatch, system):
+    # benchmark, use pytest -m slow -s tests/ace/system/test_storage.py -k throughput
+    await system.set_config(CONFIG_STORAGE_ENCRYPTION_ENABLED, encrypted)
+    data = os.urandom(64 * 1024 * 1024)
+    size_mb = len(data) / (1024 * 1024)
+
+    results = {}
+    for chunk_size in [io.DEFAULT_BUFFER_SIZE, 64 * 1024, 1024 * 1024]:
+        monkeypatch.setattr(system, "storage_chunk_size", chunk_size)
+
+        start = time.perf_counter()
+        sha256 = await system.store_content(io.BytesIO(data), ContentMetadata(name=TEST_NAME))
+        store = time.perf_counter() - start
+
+        start = time.perf_counter()
+        size = 0
+        async for chunk in await system.iter_content(sha256):
+            size += len(chunk)
+
+        retrieve = time.perf_counter() - start
+
+        assert size == len(data)
+        assert await system.delete_content(sha256)
+        results[chunk_size] = (store, retrieve)
+        print(
+            f"\nstorage {'encrypted' if encrypted else 'plain'} chunk size {chunk_size}: "
+            f"store {size_mb / store:.1f} MB/s retrieve {size_mb / retrieve:.1f} MB/s"
+        )
+
+    # larger chunks should never be slower than the default buffer size
+    assert sum(results[1024 * 1024]) < sum(results[io.DEFAULT_BUFFER_SIZE])
@@ -7,7 +7,8 @@ import pytest
 from ace.analysis import RootAnalysis, AnalysisModuleType
 from ace.system.requests import AnalysisRequest
 from ace.constants import *
-from ace.exceptions import UnknownAnalysisModuleTypeError
+from ace.exceptions import UnknownAnalysisModuleTypeError, ExpiredAnalysisRequestError
+from ace.system.redis import RedisACESystem
 
 amt_1 = AnalysisModuleType(name="test", description="test", version="1.0.0", timeout=30, cache_ttl=600)
 
@@ -127,3 +128,121 @@ async def test_get_next_analysis_request_deleted(system):
 
     # should be nothing there to get since the request was deleted
     assert await system.get_next_analysis_request("owner", amt, 0) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+@pytest.mark.parametrize("timeout", [0, 1])
+async def test_get_work_batch(timeout, system):
+    await system.add_work_queue(amt_1)
+    assert await system.get_work_batch(amt_1, 0, 3) == []
+
+    root = system.new_root()
+    requests = [AnalysisRequest(system, root, root.add_observable("test", str(_)), amt_1) for _ in range(5)]
+    for request in requests:
+        await system.put_work(amt_1, request)
+
+    # requests come out in order
+    assert await system.get_work_batch(amt_1, timeout, 3) == requests[:3]
+    assert await system.get_work_batch(amt_1, timeout, 3) == requests[3:]
+    assert await system.get_queue_size(amt_1) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_get_next_analysis_requests(system):
+    await system.register_analysis_module_type(amt_1)
+    root = system.new_root()
+    requests = [AnalysisRequest(system, root, root.add_observable("test", str(_)), amt_1) for _ in range(3)]
+    for request in requests:
+        await system.queue_analysis_request(request)
+
+    # one of these gets deleted while it is in the queue
+    await system.delete_analysis_request(requests[1])
+
+    result = await system.get_next_analysis_requests(TEST_OWNER, amt_1, 5, 0)
+    assert result == [requests[0], requests[2]]
+    for request in result:
+        assert request.status == TRACKING_STATUS_ANALYZING
+        assert request.owner == TEST_OWNER
+        assert (await system.get_analysis_request_by_request_id(request.id)).owner == TEST_OWNER
+
+    assert await system.get_next_analysis_requests(TEST_OWNER, amt_1, 5, 0) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_redis_script_reload(system):
+    if not isinstance(system, RedisACESystem):
+        return
+
+    await system.register_analysis_module_type(amt_1)
+    root = system.new_root()
+    request = AnalysisRequest(system, root, root.add_observable("test", "test"), amt_1)
+
+    # the lua scripts are loaded again if the script cache of the server is cleared
+    async with system.get_redis_connection() as rc:
+        await rc.script_flush()
+
+    await system.put_work(amt_1.name, request)
+    assert (await system.get_work(amt_1, 0)).id == request.id
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_reliable_work_queue(system):
+    if not isinstance(system, RedisACESystem):
+        return
+
+    from ace.system.redis.work_queue import (
+        get_lease_set_name,
+        get_processing_list_name,
+        get_request_hash_name,
+        get_timeout_hash_name,
+    )
+
+    system.reliable_work_queue = True
+    try:
+        amt = await system.register_analysis_module_type(
+            AnalysisModuleType(name="test", description="test", timeout=0, cache_ttl=600)  # immediately expire
+        )
+        root = system.new_root()
+        observable = root.add_observable("test", TEST_1)
+        await root.submit()
+
+        # the request is moved into the processing list and leased
+        request = await system.get_next_analysis_request(TEST_OWNER, amt, 0)
+        assert request
+        assert await system.get_queue_size(amt) == 0
+        async with system.get_redis_connection() as rc:
+            assert await rc.llen(get_processing_list_name(amt.name)) == 1
+            assert await rc.zcard(get_lease_set_name(amt.name)) == 1
+            assert await rc.hlen(get_request_hash_name(amt.name)) == 1
+            assert await rc.hlen(get_timeout_hash_name(amt.name)) == 1
+
+        # the lease expires right away so the request goes back into the queue and we get it again
+        next_ar = await system.get_next_analysis_request("other_owner", amt, 1)
+        assert next_ar == request
+        assert next_ar.owner == "other_owner"
+
+        # the previous owner can no longer submit the result
+        request.initialize_result()
+        request.modified_observable.add_analysis(type=amt)
+        with pytest.raises(ExpiredAnalysisRequestError):
+            await system.process_analysis_request(request)
+
+        # processing the result acknowledges the work
+        next_ar.initialize_result()
+        next_ar.modified_observable.add_analysis(type=amt)
+        await system.process_analysis_request(next_ar)
+        async with system.get_redis_connection() as rc:
+            assert await rc.llen(get_processing_list_name(amt.name)) == 0
+            assert await rc.zcard(get_lease_set_name(amt.name)) == 0
+            assert await rc.hlen(get_request_hash_name(amt.name)) == 0
+            assert await rc.hlen(get_timeout_hash_name(amt.name)) == 0
+
+        assert await system.requeue_expired_work(amt) == 0
+        assert await system.get_queue_size(amt) == 0
+        assert await system.get_work_batch(amt, 1, 2) == []
+    finally:
+        system.reliable_work_queue = False
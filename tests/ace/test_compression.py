@@ -0,0 +1,82 @@
+# vim: sw=4:ts=4:et:cc=120
+
+import json
+import os
+
+import pytest
+
+from ace.compression import (
+    COMPRESSION_NONE,
+    COMPRESSION_ZLIB,
+    ENV_COMPRESSION_ALGORITHM,
+    ENV_COMPRESSION_LEVEL,
+    ENV_COMPRESSION_THRESHOLD,
+    MARKER_ZLIB,
+    CompressionSettings,
+    compress,
+    compress_text,
+    decompress,
+    decompress_text,
+)
+
+TEST_DATA = json.dumps({"hello": ["world"] * 1024}).encode()
+
+
+@pytest.mark.unit
+def test_compress():
+    compressed = compress(TEST_DATA)
+    assert compressed != TEST_DATA
+    assert len(compressed) < len(TEST_DATA)
+    assert decompress(compressed) == TEST_DATA
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("level", [None, 1, 9])
+def test_compress_zlib(level):
+    compressed = compress(TEST_DATA, CompressionSettings(algorithm=COMPRESSION_ZLIB, level=level))
+    assert compressed.startswith(MARKER_ZLIB)
+    assert decompress(compressed) == TEST_DATA
+
+
+@pytest.mark.unit
+def test_compress_threshold():
+    # data smaller than the threshold is left as-is
+    assert compress(TEST_DATA, CompressionSettings(threshold=len(TEST_DATA) + 1)) is TEST_DATA
+    assert compress(b'{"hello": "world"}') == b'{"hello": "world"}'
+
+
+@pytest.mark.unit
+def test_compress_disabled():
+    assert compress(TEST_DATA, CompressionSettings(algorithm=COMPRESSION_NONE)) is TEST_DATA
+
+
+@pytest.mark.unit
+def test_compress_incompressible():
+    data = os.urandom(4096)
+    assert compress(data) is data
+
+
+@pytest.mark.unit
+def test_decompress_uncompressed():
+    # data stored before compression was enabled can still be read
+    assert decompress(TEST_DATA) == TEST_DATA
+    assert decompress_text(TEST_DATA.decode()) == TEST_DATA.decode()
+
+
+@pytest.mark.unit
+def test_compress_text():
+    compressed = compress_text(TEST_DATA.decode())
+    assert isinstance(compressed, str)
+    assert compressed != TEST_DATA.decode()
+    assert decompress_text(compressed) == TEST_DATA.decode()
+    assert compress_text('{"hello": "world"}') == '{"hello": "world"}'
+
+
+@pytest.mark.unit
+def test_load_from_env(monkeypatch):
+    monkeypatch.setenv(ENV_COMPRESSION_ALGORITHM, COMPRESSION_ZLIB)
+    monkeypatch.setenv(ENV_COMPRESSION_LEVEL, "9")
+    monkeypatch.setenv(ENV_COMPRESSION_THRESHOLD, "100")
+    settings = CompressionSettings()
+    settings.load_from_env()
+    assert settings == CompressionSettings(algorithm=COMPRESSION_ZLIB, level=9, threshold=100)
@@ -8,6 +8,7 @@ import os.path
 import aiofiles
 
 from ace.crypto import (
+    CHUNK_SIZE,
     ENV_CRYPTO_ENCRYPTED_KEY,
     ENV_CRYPTO_ITERATIONS,
     ENV_CRYPTO_SALT,
@@ -199,3 +200,30 @@ async def test_iter_stream_crypto_AsyncGenerator(tmp_path, settings):
         decrypted_target.write(_buffer)
 
     assert decrypted_target.getvalue() == b"test"
+
+
+@pytest.mark.asyncio
+@pytest.mark.unit
+@pytest.mark.parametrize("chunk_size", [16, 1000, CHUNK_SIZE, 1024 * 1024])
+async def test_iter_stream_crypto_chunk_size(settings, chunk_size):
+    data = os.urandom(CHUNK_SIZE * 3 + 1)
+
+    async def _reader():
+        # deliberately does not line up with the chunk size
+        for index in range(0, len(data), 10000):
+            yield data[index : index + 10000]
+
+    encrypted_target = io.BytesIO()
+    async for _buffer in iter_encrypt_stream("test", _reader(), settings, chunk_size=chunk_size):
+        encrypted_target.write(_buffer)
+
+    # the data is encrypted in chunks of chunk_size bytes (plus the two sizes and padding)
+    chunk_sizes = [len(data[index : index + chunk_size]) for index in range(0, len(data), chunk_size)]
+    assert len(encrypted_target.getvalue()) == 16 + sum([16 + _ + (-_ % 16) for _ in chunk_sizes])
+
+    encrypted_target = io.BytesIO(encrypted_target.getvalue())
+    decrypted_target = io.BytesIO()
+    async for _buffer in iter_decrypt_stream("test", encrypted_target, settings):
+        decrypted_target.write(_buffer)
+
+    assert decrypted_target.getvalue() == data
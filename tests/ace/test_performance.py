@@ -0,0 +1,90 @@
+# vim: ts=4:sw=4:et:cc=120
+#
+# performance benchmarks
+# these are not executed by default, use pytest -m slow -s tests/ace/test_performance.py
+#
+
+import time
+
+from ace.analysis import RootAnalysis, AnalysisModuleType
+
+import pytest
+
+
+def _benchmark(func, iterations: int) -> float:
+    """Returns the average time (in seconds) it takes to call func."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+
+    return (time.perf_counter() - start) / iterations
+
+
+def _create_root(observable_count: int) -> RootAnalysis:
+    root = RootAnalysis(desc="benchmark")
+    amt = AnalysisModuleType("benchmark", "")
+    for i in range(observable_count):
+        observable = root.add_observable("test", f"value_{i}")
+        observable.add_tag("tag")
+        if i % 10 == 0:
+            analysis = observable.add_analysis(type=amt, details={"index": i})
+            analysis.add_observable("test", f"child_{i}")
+
+    return root
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("observable_count", [1000, 10000])
+def test_root_copy_performance(observable_count):
+    root = _create_root(observable_count)
+    iterations = 3
+
+    serialized = _benchmark(lambda: RootAnalysis.from_dict(root.to_dict()), iterations)
+    structural = _benchmark(root.copy, iterations)
+
+    print(
+        f"\nRootAnalysis.copy {observable_count} observables: "
+        f"serialized {serialized:.4f}s structural {structural:.4f}s ({serialized / structural:.1f}x)"
+    )
+
+    assert structural < serialized
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("observable_count", [1000, 10000])
+def test_codec_performance(observable_count):
+    from ace.codec import FastCodec, PydanticCodec
+    from ace.system import ACESystem
+
+    system = ACESystem()
+    root = _create_root(observable_count)
+    root.system = system
+    request = root.all_observables[0].create_analysis_request(AnalysisModuleType("benchmark", ""))
+    request.initialize_result()
+    iterations = 3
+
+    for name, encode, decode in [
+        ("RootAnalysis", lambda codec: codec.encode_root(root), lambda codec, value: codec.decode_root(value)),
+        (
+            "AnalysisRequest",
+            lambda codec: codec.encode_request(request),
+            lambda codec, value: codec.decode_request(value, system),
+        ),
+    ]:
+        results = {}
+        for codec in [PydanticCodec(), FastCodec()]:
+            value = encode(codec)
+            results[codec] = (
+                _benchmark(lambda: encode(codec), iterations),
+                _benchmark(lambda: decode(codec, value), iterations),
+            )
+
+        (pydantic_encode, pydantic_decode), (fast_encode, fast_decode) = results.values()
+        print(
+            f"\n{name} codec {observable_count} observables: "
+            f"encode pydantic {pydantic_encode:.4f}s fast {fast_encode:.4f}s ({pydantic_encode / fast_encode:.1f}x) "
+            f"decode pydantic {pydantic_decode:.4f}s fast {fast_decode:.4f}s ({pydantic_decode / fast_decode:.1f}x)"
+        )
+
+        assert fast_encode < pydantic_encode
+        assert fast_decode < pydantic_decode
@@ -25,11 +25,15 @@ import redislite
 
 
 class ThreadedACETestSystem(ThreadedACESystem):
-    pass
+    # the tests run maintenance explicitly
+    maintenance_enabled = False
 
 
 class DatabaseACETestSystem(DatabaseACESystem, ThreadedACESystem):
 
+    # the tests run maintenance explicitly
+    maintenance_enabled = False
+
     # running the tests in memory works as long as the same db connection is
     # always used
 